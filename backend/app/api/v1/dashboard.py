@@ -2,13 +2,14 @@ from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
 from typing import List
-import random
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from http import HTTPStatus
 
 from app.core.database import get_db
-from app.models.workflow import Workflow, DatabaseConnection
+from app.models.workflow import Workflow, DatabaseConnection, RequestLog, RequestLogBucket
 from app.schemas.dashboard import DashboardStats, ActivityItem
 from app.core.auth import get_current_user
+from app.services.request_log import LATENCY_BUCKETS_MS, histogram_percentile
 
 router = APIRouter()
 
@@ -29,28 +30,69 @@ async def get_dashboard_stats(db: AsyncSession = Depends(get_db), current_user:
     )
     db_connections_count = result_db.scalar() or 0
 
-    # Mock avg latency and activities for now
-    # TODO: Implement real request logging middleware to populate a 'RequestLog' table
-    mock_activities = []
-    methods = ["GET", "POST", "PUT", "DELETE"]
-    endpoints_list = ["/api/v1/users", "/api/v1/products", "/api/v1/auth/login", "/api/v1/orders"]
-    
-    for i in range(5):
-        mock_activities.append(
+    # Traffic aggregates come from the per-minute rollups, never from raw request rows
+    now = datetime.now(timezone.utc)
+    since = now - timedelta(hours=24)
+    result_buckets = await db.execute(
+        select(RequestLogBucket.minute, RequestLogBucket.count, RequestLogBucket.error_count,
+               RequestLogBucket.total_ms, RequestLogBucket.histogram)
+        .filter(RequestLogBucket.user_id == current_user)
+        .filter(RequestLogBucket.minute >= since)
+    )
+    total = errors = last_hour = 0
+    total_ms = 0.0
+    histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+    for minute, count, error_count, bucket_ms, bucket_histogram in result_buckets.all():
+        total += count
+        errors += error_count
+        total_ms += bucket_ms
+        for i, c in enumerate(bucket_histogram or []):
+            histogram[i] += c
+        if _aware(minute) >= now - timedelta(hours=1):
+            last_hour += count
+
+    def fmt_ms(value):
+        return f"{round(value)}ms" if value is not None else "-"
+
+    # Latest calls: an indexed LIMIT query on (user_id, created_at)
+    result_recent = await db.execute(
+        select(RequestLog)
+        .filter(RequestLog.user_id == current_user)
+        .order_by(RequestLog.created_at.desc())
+        .limit(5)
+    )
+    activities = []
+    for i, log in enumerate(result_recent.scalars().all()):
+        try:
+            phrase = HTTPStatus(log.status_code).phrase
+        except ValueError:
+            phrase = ""
+        minutes_ago = int((now - _aware(log.created_at)).total_seconds() // 60)
+        activities.append(
             ActivityItem(
                 id=i,
-                method=random.choice(methods),
-                endpoint=random.choice(endpoints_list),
-                status="200 OK",
-                status_code=200,
-                time=f"{random.randint(1, 10)} mins ago",
-                duration=f"{random.randint(50, 200)}ms"
+                method=log.method,
+                endpoint=log.path,
+                status=f"{log.status_code} {phrase}".strip(),
+                status_code=log.status_code,
+                time=f"{minutes_ago} mins ago" if minutes_ago else "just now",
+                duration=f"{round(log.duration_ms)}ms"
             )
         )
 
     return DashboardStats(
         active_endpoints=active_endpoints_count,
         db_connections=db_connections_count,
-        avg_latency=f"{random.randint(40, 60)}ms",
-        recent_activities=mock_activities
+        avg_latency=fmt_ms(total_ms / total if total else None),
+        recent_activities=activities,
+        total_requests=total,
+        requests_per_minute=round(last_hour / 60, 2),
+        error_rate=round(errors / total, 4) if total else 0.0,
+        p50_latency=fmt_ms(histogram_percentile(histogram, 50)),
+        p95_latency=fmt_ms(histogram_percentile(histogram, 95)),
+        p99_latency=fmt_ms(histogram_percentile(histogram, 99)),
     )
+
+def _aware(value: datetime) -> datetime:
+    # SQLite hands back naive timestamps; they were written in UTC
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
@@ -1,6 +1,10 @@
-from fastapi import APIRouter, HTTPException, Body, Depends
+import csv
+import io
+import json
+from fastapi import APIRouter, HTTPException, Body, Depends, Query, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Any, List
+from typing import Any, AsyncIterator, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.services.external_db import ExternalDbService
@@ -17,6 +21,40 @@ class ConnectionRequest(BaseModel):
 class QueryRequest(BaseModel):
     query: str
 
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def _encode_chunk(fmt: str, columns: List[str], rows: List[tuple], header: bool) -> str:
+    if fmt == "csv":
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        if header:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        return buf.getvalue()
+    return "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+async def _export_response(chunks: AsyncIterator[Tuple[List[str], List[tuple]]], fmt: str, filename: str) -> StreamingResponse:
+    # Open the cursor before answering, so connection and SQL errors still get a proper status code
+    try:
+        columns, _ = await chunks.__anext__()
+    except Exception as e:
+        await chunks.aclose()
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def body():
+        try:
+            yield _encode_chunk(fmt, columns, [], header=True)
+            async for cols, rows in chunks:
+                yield _encode_chunk(fmt, cols, rows, header=False)
+        finally:
+            await chunks.aclose()
+
+    return StreamingResponse(
+        body(),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
+
 @router.post("/connect")
 async def connect_database(request: ConnectionRequest, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
     # Validate
@@ -30,8 +68,11 @@ async def connect_database(request: ConnectionRequest, db: AsyncSession = Depend
     existing = result_db.scalars().first()
     
     if existing:
+        ExternalDbService.invalidate_schema(existing.connection_string)
         existing.connection_string = request.url
         existing.type = request.type
+        # Database nodes resolve the id to a URL through a short-lived cache
+        ExternalDbService.invalidate_connection(existing.id)
     else:
         new_conn = DatabaseConnection(
             name="My Database", 
@@ -50,7 +91,7 @@ async def get_config(db: AsyncSession = Depends(get_db), user_id: str = Depends(
     conn = result.scalars().first()
     
     if conn:
-        return {"url": conn.connection_string}
+        return {"url": conn.connection_string, "id": str(conn.id)}
     return {"url": ""}
 
 @router.get("/tables")
@@ -66,6 +107,34 @@ async def get_tables(db: AsyncSession = Depends(get_db), user_id: str = Depends(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/tables/{table_name}/columns")
+async def get_table_columns(table_name: str, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+    result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
+    conn = result.scalars().first()
+
+    if not conn:
+        raise HTTPException(status_code=400, detail="Database not configured")
+    try:
+        table = await ExternalDbService.get_columns(conn.connection_string, table_name)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if table is None:
+        raise HTTPException(status_code=404, detail="Table not found")
+    return table
+
+@router.post("/schema/refresh")
+async def refresh_schema(db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+    result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
+    conn = result.scalars().first()
+
+    if not conn:
+        raise HTTPException(status_code=400, detail="Database not configured")
+    try:
+        schema = await ExternalDbService.get_schema(conn.connection_string, refresh=True)
+        return sorted(schema)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.post("/query")
 async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
     result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
@@ -76,23 +145,78 @@ async def run_query(request: QueryRequest, db: AsyncSession = Depends(get_db), u
     
     try:
         rows = await ExternalDbService.execute_query(request.query, url=conn.connection_string)
+        if not isinstance(rows, list):
+            # Statements without a result set may be DDL; reflect again on next use
+            ExternalDbService.invalidate_schema(conn.connection_string)
         return rows
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
         
 @router.get("/table/{table_name}")
-async def get_table_data(table_name: str, limit: int = 100, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+async def get_table_data(
+    table_name: str,
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    columns: Optional[str] = None,
+    order_by: Optional[str] = None,
+    after: Optional[str] = None,
+    filter: List[str] = Query([]),
+    db: AsyncSession = Depends(get_db),
+    user_id: str = Depends(get_current_user),
+):
+    """Keyset-paginated rows; pass the X-Next-Cursor header back as `after` for the next page."""
     result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
     conn = result.scalars().first()
     
     if not conn:
         raise HTTPException(status_code=400, detail="Database not configured")
 
+    filters = {}
+    for item in filter:
+        name, sep, value = item.partition("=")
+        if not sep:
+            raise HTTPException(status_code=400, detail=f"Filter must look like column=value: {item}")
+        filters[name] = value
+
     try:
-        # Sanitize table name (basic)
-        safe_name = "".join(c for c in table_name if c.isalnum() or c == '_')
-        query = f"SELECT * FROM {safe_name} LIMIT {limit}"
-        rows = await ExternalDbService.execute_query(query, url=conn.connection_string)
-        return rows
+        rows, next_cursor = await ExternalDbService.fetch_page(
+            conn.connection_string,
+            table_name,
+            limit,
+            columns=[c.strip() for c in columns.split(",") if c.strip()] if columns else None,
+            order_by=order_by,
+            filters=filters,
+            after=after,
+        )
+    except LookupError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
+
+@router.post("/query/export")
+async def export_query(request: QueryRequest, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), fetch_size: Optional[int] = Query(None, ge=1), db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+    result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
+    conn = result.scalars().first()
+
+    if not conn:
+        raise HTTPException(status_code=400, detail="Database not configured")
+
+    chunks = ExternalDbService.stream_query(request.query, url=conn.connection_string, fetch_size=fetch_size)
+    return await _export_response(chunks, format, "query")
+
+@router.get("/table/{table_name}/export")
+async def export_table(table_name: str, format: str = Query("ndjson", pattern="^(ndjson|csv)$"), fetch_size: Optional[int] = Query(None, ge=1), db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+    result = await db.execute(select(DatabaseConnection).filter(DatabaseConnection.user_id == user_id))
+    conn = result.scalars().first()
+
+    if not conn:
+        raise HTTPException(status_code=400, detail="Database not configured")
+
+    safe_name = "".join(c for c in table_name if c.isalnum() or c == '_')
+    chunks = ExternalDbService.stream_query(f"SELECT * FROM {safe_name}", url=conn.connection_string, fetch_size=fetch_size)
+    return await _export_response(chunks, format, safe_name)
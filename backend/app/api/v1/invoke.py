@@ -1,76 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.future import select
-from app.core.database import get_db
-from app.models.workflow import Workflow
+import time
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, Response
+from app.core.auth import verified_user_id
+from app.core.database import settings
+from app.services.execution_plan import PlanCache
+from app.services.metrics import Metrics
+from app.services.response_cache import ResponseCache, etag_for, etag_matches
+from app.services.route_registry import RouteRegistry
+from app.services.tracing import TraceLevel, TraceRecorder
 from app.services.workflow_runner import WorkflowExecutor
-import re
 
 router = APIRouter()
 
-def match_path(node_path: str, request_path: str) -> tuple[bool, dict]:
-    """
-    Matches generic path (e.g. users/:id) with request path (e.g. users/123).
-    Returns (True, {id: 123}) if matched.
-    """
-    # Normalize
-    n_parts = [p for p in node_path.strip('/').split('/') if p]
-    r_parts = [p for p in request_path.strip('/').split('/') if p]
-    
-    if len(n_parts) != len(r_parts):
-        return False, {}
-    
-    params = {}
-    
-    for n, r in zip(n_parts, r_parts):
-        if n.startswith(':'):
-            # Param
-            key = n[1:]
-            params[key] = r
-        elif n != r:
-            return False, {}
-            
-    return True, params
-
 @router.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
-async def invoke_workflow(path: str, request: Request, db: AsyncSession = Depends(get_db)):
-    # 1. Fetch all workflows
-    result = await db.execute(select(Workflow))
-    workflows = result.scalars().all()
-    
-    matched_workflow = None
-    extracted_params = {}
-    
-    # 2. Find matching workflow
-    for workflow in workflows:
-        if not workflow.nodes:
-            continue
-            
-        # Look for API node
-        for node in workflow.nodes:
-            if node.get('type') == 'api':
-                data = node.get('data', {})
-                node_path = data.get('path', '/').strip('/')
-                node_method = data.get('method', 'GET').upper()
-                request_method = request.method.upper()
-                
-                # Method Check
-                if node_method != request_method:
-                    continue
-                
-                # Path Check
-                is_match, params = match_path(node_path, path)
-                if is_match:
-                    matched_workflow = workflow
-                    extracted_params = params
-                    break
-        if matched_workflow:
-            break
-            
-    if not matched_workflow:
+async def invoke_workflow(path: str, request: Request):
+    started = time.perf_counter()
+    # 1. Resolve route from the in-memory table (no DB round trip)
+    await RouteRegistry.ensure_loaded()
+    match = RouteRegistry.match(request.method, path)
+    if not match:
         raise HTTPException(status_code=404, detail=f"No workflow found for {request.method} /{path}")
+    route, extracted_params = match
+    request.state.workflow_id = route.workflow_id
+    request.state.workflow_owner = route.user_id
 
-    # 3. Parse Body
+    # 2. Parse Body
     body_data = {}
     if request.method in ["POST", "PUT", "PATCH"]:
         try:
@@ -78,10 +33,20 @@ async def invoke_workflow(path: str, request: Request, db: AsyncSession = Depend
         except:
             body_data = {}
             
+    # Opt-in full trace: the response becomes the whole run result (status, response, logs, context).
+    # It exposes rows and variables, so only the workflow's owner gets it.
+    query = dict(request.query_params)
+    debug_flag = query.pop("_debug", None) or request.headers.get("x-workflow-debug", "")
+    debug = (
+        settings.WORKFLOW_DEBUG_TRACES
+        and debug_flag.lower() in ("1", "true")
+        and verified_user_id(request.headers.get("authorization")) == route.user_id
+    )
+
     # Prepare input data
     input_data = {
         "body": body_data,
-        "query": dict(request.query_params),
+        "query": query,
         "params": {**dict(request.path_params), **extracted_params}, # Merge FastAPI params with our extracted params
         "headers": dict(request.headers),
         "method": request.method,
@@ -89,22 +54,70 @@ async def invoke_workflow(path: str, request: Request, db: AsyncSession = Depend
         "user": None # Auth not yet implemented in node context, but good placeholder
     }
 
-    # 4. Run Workflow
+    # 3. Run Workflow from the cached plan
     workflow_data = {
-        "nodes": [n for n in matched_workflow.nodes if n],
-        "edges": [e for e in matched_workflow.edges if e]
+        "nodes": route.nodes,
+        "edges": route.edges
     }
+    plan = PlanCache.get(route.workflow_id, route.version, workflow_data)
+
+    # Interface nodes every run passes through reject bad input before any node runs or a session opens
+    for node_id in plan.entry_validators:
+        error = plan.nodes[node_id].compiled['validator'].validate_request(input_data)
+        if error:
+            Metrics.observe_route(route.method, f"/{route.path}", (time.perf_counter() - started) * 1000)
+            return JSONResponse(status_code=422, content=error)
     
-    # Pass DB Session!
-    executor = WorkflowExecutor(workflow_data, db_session=db)
+    # Idempotent routes can opt into the response cache on their api node
+    start = plan.nodes.get(plan.start_id) if plan.start_id else None
+    cache_ttl = float(start.data.get('cacheTtl') or 0) if start is not None and start.type == 'api' else 0
+    cache_key = None
+    if cache_ttl > 0 and request.method == "GET" and not debug:
+        cache_key = ResponseCache.key(
+            route.workflow_id, route.version, request.method, path, query, start.data,
+            request.headers.get("authorization"),
+        )
+        cached = ResponseCache.get(cache_key)
+        if cached is not None:
+            Metrics.observe_route(route.method, f"/{route.path}", (time.perf_counter() - started) * 1000)
+            return _conditional(request, cached.body, cached.etag, _cache_headers(start.data, cache_ttl, hit=True))
+
+    # The executor opens a DB session only if a node needs one
+    trace = TraceRecorder(TraceLevel.DEBUG if debug else settings.WORKFLOW_TRACE_LEVEL, settings.WORKFLOW_TRACE_BUFFER)
+    executor = WorkflowExecutor(plan=plan, project_id=route.project_id, trace=trace, owner_id=route.user_id)
     result = await executor.run(input_data)
+    Metrics.observe_route(route.method, f"/{route.path}", (time.perf_counter() - started) * 1000)
     
-    # 5. Return Result
+    # 4. Return Result
+    if debug:
+        return result
+
     if result.get('status') == 'success' and 'response' in result:
-        return result['response']
+        if result.get('status_code'):
+            # An interface node rejected the input mid-run; never cached
+            return JSONResponse(status_code=result['status_code'], content=jsonable_encoder(result['response']))
+        if request.method != "GET":
+            return result['response']
+        body = JSONResponse(jsonable_encoder(result['response'])).body
+        etag = etag_for(body)
+        if cache_key is not None:
+            ResponseCache.put(cache_key, body, etag, cache_ttl)
+            return _conditional(request, body, etag, _cache_headers(start.data, cache_ttl, hit=False))
+        return _conditional(request, body, etag, {})
 
     # If error or no specific response, return result (for debug) or error
     if result.get('status') == 'error':
          raise HTTPException(status_code=500, detail=result.get('error'))
          
     return result
+
+def _cache_headers(options, ttl: float, hit: bool) -> dict:
+    scope = "private" if options.get('cacheVaryUser') else "public"
+    return {"Cache-Control": f"{scope}, max-age={int(ttl)}", "X-Cache": "HIT" if hit else "MISS"}
+
+def _conditional(request: Request, body: bytes, etag: str, headers: dict) -> Response:
+    # Clients revalidating with the current ETag get an empty 304
+    headers = {**headers, "ETag": etag}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
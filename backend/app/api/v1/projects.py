@@ -7,6 +7,9 @@ from app.core.database import get_db
 from app.models.workflow import Project, Workflow
 from app.schemas.project import ProjectCreate, ProjectResponse, ProjectDetailResponse, WorkflowSummary
 from app.core.auth import get_current_user
+from app.services.route_registry import RouteRegistry
+from app.services.function_registry import FunctionRegistry
+from app.services.response_cache import ResponseCache
 
 router = APIRouter()
 
@@ -105,15 +108,22 @@ async def delete_project(
 ):
     """Delete a project and all its workflows"""
     result = await db.execute(
-        select(Project).filter(Project.id == project_id, Project.user_id == user_id)
+        select(Project)
+        .filter(Project.id == project_id, Project.user_id == user_id)
+        .options(selectinload(Project.workflows))
     )
     project = result.scalars().first()
     
     if not project:
         raise HTTPException(status_code=404, detail="Project not found")
     
+    workflow_ids = [str(w.id) for w in project.workflows]
     await db.delete(project)
     await db.commit()
+    for workflow_id in workflow_ids:
+        RouteRegistry.unregister(workflow_id)
+        FunctionRegistry.invalidate(workflow_id)
+        ResponseCache.invalidate(workflow_id)
     return {"message": "Project deleted successfully"}
 
 @router.post("/{project_id}/workflows")
@@ -143,6 +153,7 @@ async def create_workflow_in_project(
     db.add(new_workflow)
     await db.commit()
     await db.refresh(new_workflow)
+    RouteRegistry.register(new_workflow)
     
     return {
         "id": str(new_workflow.id),
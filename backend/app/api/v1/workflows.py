@@ -1,4 +1,7 @@
+import time
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from typing import List
@@ -6,6 +9,12 @@ from app.core.database import get_db
 from app.models.workflow import Workflow
 from app.schemas.workflow import WorkflowCreate, WorkflowResponse, WorkflowBase
 from app.core.auth import get_current_user
+from app.services.route_registry import RouteRegistry
+from app.services.execution_plan import PlanCache, workflow_version
+from app.services.external_db import ExternalDbService
+from app.services.function_registry import FunctionRegistry, PureFunctionCache
+from app.services.response_cache import ResponseCache
+from app.services.tracing import SpanRecorder, TraceLevel, TraceRecorder
 
 router = APIRouter()
 
@@ -15,6 +24,7 @@ async def create_workflow(workflow: WorkflowCreate, db: AsyncSession = Depends(g
     db.add(new_workflow)
     await db.commit()
     await db.refresh(new_workflow)
+    RouteRegistry.register(new_workflow)
     return new_workflow
 
 @router.get("/", response_model=List[WorkflowResponse])
@@ -59,6 +69,23 @@ async def validate_path_availability(
                     
     return {"valid": True, "message": "Path available"}
 
+@router.get("/cache/stats")
+async def get_cache_stats(user_id: str = Depends(get_current_user)):
+    # Hit/miss counters of this worker's execution caches
+    return {
+        "plans": PlanCache.stats(),
+        "functions": FunctionRegistry.stats(),
+        "pure_functions": PureFunctionCache.stats(),
+        "responses": ResponseCache.stats(),
+    }
+
+def _invalidate_responses(workflow_id, category: str):
+    # Any cached route may call an edited function, so those edits drop every response
+    if category == 'function':
+        ResponseCache.clear()
+    else:
+        ResponseCache.invalidate(workflow_id)
+
 @router.get("/{workflow_id}", response_model=WorkflowResponse)
 async def get_workflow(workflow_id: str, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
     result = await db.execute(select(Workflow).filter(Workflow.id == workflow_id, Workflow.user_id == user_id))
@@ -87,6 +114,10 @@ async def update_workflow(workflow_id: str, workflow_update: WorkflowBase, db: A
 
     await db.commit()
     await db.refresh(workflow)
+    RouteRegistry.register(workflow)
+    PlanCache.invalidate(workflow.id)
+    FunctionRegistry.invalidate(workflow.id)
+    _invalidate_responses(workflow.id, workflow.category)
     return workflow
 
 @router.delete("/{workflow_id}")
@@ -96,8 +127,13 @@ async def delete_workflow(workflow_id: str, db: AsyncSession = Depends(get_db),
     if not workflow:
         raise HTTPException(status_code=404, detail="Workflow not found")
     
+    category = workflow.category
     await db.delete(workflow)
     await db.commit()
+    RouteRegistry.unregister(workflow_id)
+    PlanCache.invalidate(workflow_id)
+    FunctionRegistry.invalidate(workflow_id)
+    _invalidate_responses(workflow_id, category)
     return {"message": "Workflow deleted successfully"}
 
 @router.post("/{workflow_id}/run")
@@ -114,12 +150,85 @@ async def run_workflow(workflow_id: str, input_data: dict, db: AsyncSession = De
         "nodes": [n for n in workflow.nodes if n], # Ensure valid list
         "edges": [e for e in workflow.edges if e]
     }
+    plan = PlanCache.get(workflow.id, workflow_version(workflow), workflow_data)
     
     # Inject user info into input data
     input_data['user'] = {'id': user_id}
     
     from app.services.workflow_runner import WorkflowExecutor
-    executor = WorkflowExecutor(workflow_data, db_session=db)
+    executor = WorkflowExecutor(db_session=db, plan=plan, project_id=str(workflow.project_id) if workflow.project_id else None, owner_id=user_id)
     result = await executor.run(input_data)
     
     return result
+
+def _explain(statement) -> TextClause:
+    # Keep the statement's own bind parameters, so the typed binds the query ran with are planned too
+    explain = text(f"EXPLAIN {statement}")
+    if isinstance(statement, TextClause):
+        explain = explain.bindparams(*statement._bindparams.values())
+    return explain
+
+@router.post("/{workflow_id}/profile")
+async def profile_workflow(workflow_id: str, input_data: dict, db: AsyncSession = Depends(get_db), user_id: str = Depends(get_current_user)):
+    """
+    Run the workflow with a span per node and return a timing breakdown plus EXPLAIN output for its queries.
+    This is a real run: the workflow's database writes are committed and its file nodes write files,
+    exactly as when it is invoked, so profile against test data.
+    """
+    result = await db.execute(select(Workflow).filter(Workflow.id == workflow_id, Workflow.user_id == user_id))
+    workflow = result.scalars().first()
+    if not workflow:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+
+    workflow_data = {
+        "nodes": [n for n in workflow.nodes if n],
+        "edges": [e for e in workflow.edges if e]
+    }
+    plan = PlanCache.get(workflow.id, workflow_version(workflow), workflow_data)
+    input_data['user'] = {'id': user_id}
+
+    from app.services.workflow_runner import WorkflowExecutor
+    spans = SpanRecorder()
+    executor = WorkflowExecutor(
+        db_session=db,
+        plan=plan,
+        project_id=str(workflow.project_id) if workflow.project_id else None,
+        trace=TraceRecorder(TraceLevel.SUMMARY),
+        hooks=(spans,),
+        owner_id=user_id,
+    )
+    started = time.perf_counter()
+    run_result = await executor.run(input_data)
+    total_ms = (time.perf_counter() - started) * 1000
+
+    # EXPLAIN (without ANALYZE) plans each query again without running it, on the database it ran on
+    explain = {}
+    for span in spans.spans:
+        for statement, params, connection_id in span.queries:
+            query = str(statement)
+            try:
+                if connection_id is None:
+                    rows = (await db.execute(_explain(statement), params)).all()
+                else:
+                    engine = await ExternalDbService.engine_for_connection(connection_id, user_id)
+                    async with engine.connect() as conn:
+                        rows = (await conn.execute(_explain(statement), params)).all()
+                plan_lines = [" ".join(str(col) for col in row) for row in rows]
+            except Exception as e:
+                if connection_id is None:
+                    await db.rollback()
+                plan_lines = [f"EXPLAIN failed: {e}"]
+            explain.setdefault(span.node_id, []).append(
+                {"query": query, "params": params, "connection_id": connection_id, "plan": plan_lines}
+            )
+
+    return {
+        "status": run_result.get("status"),
+        "response": run_result.get("response"),
+        "error": run_result.get("error"),
+        "total_ms": round(total_ms, 3),
+        "spans": [span.to_dict() for span in spans.spans],
+        "folded": spans.folded(),
+        "explain": explain,
+        "logs": run_result.get("logs", []),
+    }
@@ -3,6 +3,7 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 import firebase_admin
 from firebase_admin import auth, credentials
 import os
+from typing import Optional
 
 from app.core.database import settings
 
@@ -48,6 +49,16 @@ except Exception as e:
 
 security = HTTPBearer(auto_error=False)
 
+def verified_user_id(authorization: Optional[str]) -> Optional[str]:
+    """The uid of a valid `Bearer` ID token, or None. Unlike get_current_user there is no dev fallback."""
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        return auth.verify_id_token(token.strip())['uid']
+    except Exception:
+        return None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     if not credentials:
         print("No credentials provided, using 'dev_user' for local development.")
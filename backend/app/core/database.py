@@ -7,6 +7,53 @@ class Settings(BaseSettings):
     SECRET_KEY: str = "supersecretkey"
     FRONTEND_URL: str = "http://localhost:5173"
     FIREBASE_SERVICE_ACCOUNT_PATH: str = "firebase-service-account.json"
+
+    # Workflow execution
+    ROUTE_TABLE_REFRESH_SECONDS: float = 5.0
+    PLAN_CACHE_SIZE: int = 256
+    WORKFLOW_MAX_STEPS: int = 1000
+    WORKFLOW_MAX_CONCURRENCY: int = 8
+    PURE_FUNCTION_CACHE_SIZE: int = 1024
+    PURE_FUNCTION_CACHE_TTL: float = 300.0
+    WORKFLOW_TRACE_LEVEL: str = "off"  # invoked routes: off, summary or debug
+    WORKFLOW_TRACE_BUFFER: int = 200  # entries kept by summary traces
+    WORKFLOW_DEBUG_TRACES: bool = False  # honour X-Workflow-Debug / ?_debug=1 from the workflow owner
+    CODE_NODE_TIMEOUT: float = 10.0
+    CODE_THREAD_WORKERS: int = 4
+    CODE_PROCESS_WORKERS: int = 0  # >0 keeps a warm process pool for `executionMode: process`
+
+    # Request logging for invoked routes
+    REQUEST_LOG_ENABLED: bool = True
+    REQUEST_LOG_FLUSH_SECONDS: float = 2.0
+    REQUEST_LOG_BATCH_SIZE: int = 500
+    REQUEST_LOG_QUEUE_SIZE: int = 10000
+    REQUEST_LOG_RETENTION_DAYS: float = 7.0  # raw request_logs rows
+    REQUEST_LOG_ROLLUP_RETENTION_DAYS: float = 30.0  # per-minute request_log_buckets rows
+    REQUEST_LOG_PRUNE_SECONDS: float = 3600.0
+
+    # asyncpg keeps a per-connection LRU of prepared statements keyed by SQL text
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 500
+    DB_STREAM_FETCH_SIZE: int = 500  # rows per fetch for `stream` database reads
+    DB_WRITE_BATCH_SIZE: int = 500  # parameter sets per executemany for `batch` database writes
+
+    # Engines for user-configured databases (DatabaseConnection)
+    EXTERNAL_DB_POOL_SIZE: int = 5
+    EXTERNAL_DB_MAX_OVERFLOW: int = 5
+    EXTERNAL_DB_POOL_PRE_PING: bool = True
+    EXTERNAL_DB_POOL_RECYCLE: int = 1800  # seconds
+    EXTERNAL_DB_MAX_ENGINES: int = 50
+    EXTERNAL_DB_IDLE_SECONDS: float = 600.0
+    EXTERNAL_DB_CONNECTION_TTL: float = 60.0  # seconds a resolved connection string is trusted
+    SCHEMA_CACHE_TTL: float = 300.0  # reflected schema is served from memory, then revalidated in the background
+
+    # Response cache for api nodes with cacheTtl set
+    RESPONSE_CACHE_SIZE: int = 1024
+    RESPONSE_CACHE_MAX_BYTES: int = 64 * 1024 * 1024
+    RESPONSE_CACHE_MAX_ENTRY_BYTES: int = 1024 * 1024
+
+    # Prometheus /metrics: a bearer token, or else only these client addresses
+    METRICS_TOKEN: str | None = None
+    METRICS_ALLOWED_IPS: str = "127.0.0.1,::1"
     
     # Firebase Creds from Env
     FIREBASE_TYPE: str | None = None
@@ -25,7 +72,13 @@ class Settings(BaseSettings):
 
 settings = Settings()
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
+def driver_connect_args(url: str) -> dict:
+    # Database nodes send constant SQL with bind parameters, so a bigger statement cache pays off
+    if "+asyncpg" in url:
+        return {"prepared_statement_cache_size": settings.DB_PREPARED_STATEMENT_CACHE_SIZE}
+    return {}
+
+engine = create_async_engine(settings.DATABASE_URL, echo=True, connect_args=driver_connect_args(settings.DATABASE_URL))
 
 SessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=AsyncSession)
 
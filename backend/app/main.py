@@ -1,7 +1,19 @@
-from fastapi import FastAPI
+import asyncio
+import hmac
+from fastapi import Depends, FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.v1 import workflows
 from app.core.database import engine, Base, settings
+from app.services.route_registry import RouteRegistry
+from app.services.code_runner import CodeExecutionPool
+from app.services.function_registry import FunctionRegistry
+from app.services.response_cache import ResponseCache
+from app.services.request_log import RequestLogMiddleware, RequestLogWriter
+from app.services.metrics import Metrics
+from app.services.execution_plan import PlanCache
+from app.services.function_registry import PureFunctionCache
+from app.services.external_db import ExternalDbService
 
 
 app = FastAPI(title="Visual Backend Platform API")
@@ -12,8 +24,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+# Only invoked routes are logged; the record is queued and written in the background
+app.add_middleware(RequestLogMiddleware, prefix="/api/v1/invoke")
+
 # Include Routers
 app.include_router(workflows.router, prefix="/api/v1/workflows", tags=["Workflows"])
 from app.api.v1 import dashboard
@@ -31,9 +47,52 @@ app.include_router(projects.router, prefix="/api/v1/projects", tags=["Projects"]
 async def root():
     return {"message": "Visual Backend Platform API is running"}
 
+def _metrics_access(request: Request):
+    # Pool and route labels describe customers' setups, so scrapers must be trusted
+    if settings.METRICS_TOKEN:
+        if not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {settings.METRICS_TOKEN}"):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+        return
+    allowed = {ip.strip() for ip in settings.METRICS_ALLOWED_IPS.split(",") if ip.strip()}
+    if not request.client or request.client.host not in allowed:
+        raise HTTPException(status_code=403, detail="Metrics are not available to this client")
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(_metrics_access)])
+async def metrics():
+    # Per-worker numbers; Prometheus scrapes each worker and aggregates
+    caches = {
+        "plans": PlanCache.stats(),
+        "functions": FunctionRegistry.stats(),
+        "pure_functions": PureFunctionCache.stats(),
+        "responses": ResponseCache.stats(),
+    }
+    pools = {"platform": engine.sync_engine.pool, **ExternalDbService.pools()}
+    return PlainTextResponse(Metrics.render(caches, pools), media_type="text/plain; version=0.0.4")
+
 # Startup event to create tables (for dev only - use Alembic for prod)
 @app.on_event("startup")
 async def startup():
     async with engine.begin() as conn:
         # Create tables if they don't exist. Removed drop_all to persist data.
         await conn.run_sync(Base.metadata.create_all)
+
+    # Build the invoke route table and keep it in sync with other workers
+    await RouteRegistry.load()
+    RouteRegistry.add_reload_listener(FunctionRegistry.clear)
+    # A function edited through another worker can change any cached route's response
+    RouteRegistry.add_reload_listener(ResponseCache.clear)
+    app.state.background_tasks = [asyncio.create_task(RouteRegistry.run_refresher())]
+    if settings.REQUEST_LOG_ENABLED:
+        RequestLogWriter.start()
+        app.state.background_tasks.append(asyncio.create_task(RequestLogWriter.run()))
+        app.state.background_tasks.append(asyncio.create_task(RequestLogWriter.run_pruner()))
+    app.state.background_tasks.append(asyncio.create_task(ExternalDbService.run_idle_reaper()))
+    CodeExecutionPool.start(settings.CODE_THREAD_WORKERS, settings.CODE_PROCESS_WORKERS)
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in getattr(app.state, "background_tasks", []):
+        task.cancel()
+    await RequestLogWriter.flush()
+    await ExternalDbService.dispose_all()
+    CodeExecutionPool.shutdown()
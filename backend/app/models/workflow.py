@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, JSON, DateTime, ForeignKey, Text
+from sqlalchemy import Column, String, JSON, DateTime, ForeignKey, Text, Integer, Float, Index
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
@@ -55,3 +55,37 @@ class DatabaseConnection(Base):
     connection_string = Column(String, nullable=False)  # In real app, encrypt this!
     user_id = Column(String, nullable=True, index=True)  # Firebase UID
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RequestLog(Base):
+    """One invoked route call, written in batches by RequestLogWriter"""
+    __tablename__ = "request_logs"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    method = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    workflow_id = Column(UUID(as_uuid=True), nullable=True)
+    user_id = Column(String, nullable=True)  # Owner of the workflow
+    status_code = Column(Integer, nullable=False)
+    duration_ms = Column(Float, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+    __table_args__ = (Index("ix_request_logs_user_created", "user_id", "created_at"),)
+
+class RequestLogBucket(Base):
+    """Per-minute rollup of request logs; one row per (minute, workflow), upserted by every flush"""
+    __tablename__ = "request_log_buckets"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    minute = Column(DateTime(timezone=True), nullable=False)
+    workflow_id = Column(UUID(as_uuid=True), nullable=True)
+    user_id = Column(String, nullable=True)
+    count = Column(Integer, nullable=False, default=0)
+    error_count = Column(Integer, nullable=False, default=0)
+    total_ms = Column(Float, nullable=False, default=0.0)
+    max_ms = Column(Float, nullable=False, default=0.0)
+    histogram = Column(JSON, default=[])  # Counts per LATENCY_BUCKETS_MS bound
+
+    __table_args__ = (
+        Index("ix_request_log_buckets_user_minute", "user_id", "minute"),
+        Index("ux_request_log_buckets_minute_workflow", "minute", "workflow_id", unique=True),
+    )
@@ -15,3 +15,10 @@ class DashboardStats(BaseModel):
     db_connections: int
     avg_latency: str
     recent_activities: List[ActivityItem]
+    # Invoked-route traffic over the last 24 hours, from per-minute rollups
+    total_requests: int = 0
+    requests_per_minute: float = 0.0  # over the last hour
+    error_rate: float = 0.0
+    p50_latency: str = "-"
+    p95_latency: str = "-"
+    p99_latency: str = "-"
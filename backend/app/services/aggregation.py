@@ -0,0 +1,104 @@
+import json
+import math
+from array import array
+from typing import Any, Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # optional; the pure-Python reducers below give the same results
+    np = None
+
+NUMERIC_OPS = ('sum', 'avg', 'min', 'max', 'percentile')
+
+
+def _number(value: Any) -> Optional[float]:
+    kind = type(value)
+    if kind is float or kind is int:
+        return value
+    if kind is bool or value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _values(collection: Iterable[Any], field: Optional[str]) -> Iterable[Any]:
+    if not field:
+        return collection
+    return (row.get(field) if isinstance(row, dict) else None for row in collection)
+
+
+def numeric_column(values: Iterable[Any]) -> array:
+    """Pack the numeric values into a float64 array; anything that isn't a number is skipped."""
+    column = array('d')
+    append = column.append
+    for value in values:
+        number = _number(value)
+        if number is not None:
+            append(number)
+    return column
+
+
+def _percentile(sorted_column: List[float], pct: float) -> float:
+    # Linear interpolation between closest ranks, as numpy.percentile does by default
+    rank = (len(sorted_column) - 1) * pct / 100
+    low = math.floor(rank)
+    high = min(low + 1, len(sorted_column) - 1)
+    return sorted_column[low] + (sorted_column[high] - sorted_column[low]) * (rank - low)
+
+
+def reduce_column(column: array, op: str, pct: float = 50) -> Optional[float]:
+    if not column:
+        return None if op in ('min', 'max', 'percentile') else 0
+    if np is not None:
+        data = np.frombuffer(column, dtype=np.float64)  # shares the array's buffer
+        if op == 'sum': return float(data.sum())
+        if op == 'avg': return float(data.mean())
+        if op == 'min': return float(data.min())
+        if op == 'max': return float(data.max())
+        return float(np.percentile(data, pct))
+    if op == 'sum': return math.fsum(column)
+    if op == 'avg': return math.fsum(column) / len(column)
+    if op == 'min': return min(column)
+    if op == 'max': return max(column)
+    return _percentile(sorted(column), pct)
+
+
+def _key(value: Any) -> Any:
+    # Group and distinct keys must be hashable; lists and dicts are keyed by their JSON
+    try:
+        hash(value)
+        return value
+    except TypeError:
+        return json.dumps(value, sort_keys=True, default=str)
+
+
+def distinct(values: Iterable[Any]) -> List[Any]:
+    seen: Dict[Any, Any] = {}
+    for value in values:
+        seen.setdefault(_key(value), value)
+    return list(seen.values())
+
+
+def aggregate(collection: List[Any], op: str, field: Optional[str] = None, group_by: Optional[str] = None, pct: float = 50) -> Any:
+    """
+    One pass over `collection` (scalars, or row dicts when `field` is set). With `group_by`
+    the result maps each group value to the aggregate of its rows.
+    """
+    if group_by:
+        groups: Dict[Any, list] = {}
+        for row in collection:
+            is_row = isinstance(row, dict)
+            key = _key(row.get(group_by) if is_row else None)
+            value = (row.get(field) if is_row else None) if field else row
+            groups.setdefault(key, []).append(value)
+        return {key: aggregate(values, op, pct=pct) for key, values in groups.items()}
+
+    if op == 'count':
+        return len(collection)
+    if op == 'distinct':
+        return distinct(_values(collection, field))
+    if op in NUMERIC_OPS:
+        return reduce_column(numeric_column(_values(collection, field)), op, pct)
+    raise ValueError(f"Unknown data operation: {op}")
@@ -0,0 +1,158 @@
+import asyncio
+import multiprocessing
+import pickle
+import re
+from collections import ChainMap
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Dict, MutableMapping, Optional
+
+# Keep this module free of app imports: process-pool workers import it on spawn.
+
+ASYNC_FUNC_NAME = '_user_async_func'
+
+
+class CompiledCode:
+    """Code-node source compiled once; `await` snippets are wrapped in an async function."""
+    __slots__ = ('source', 'code', 'is_async', 'uses_db', 'error')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.is_async = 'await ' in source
+        # Only snippets that mention `db` get the invocation's session
+        self.uses_db = re.search(r'\bdb\b', source) is not None
+        self.code = None
+        self.error: Optional[str] = None
+        try:
+            if self.is_async:
+                indented_code = "\n".join(["    " + line for line in source.split("\n")])
+                wrapped_code = f"async def {ASYNC_FUNC_NAME}(context, db):\n{indented_code}"
+                self.code = compile(wrapped_code, '<code node>', 'exec')
+            else:
+                self.code = compile(source, '<code node>', 'exec')
+        except SyntaxError as e:
+            self.error = str(e)
+
+
+@lru_cache(maxsize=512)
+def compile_code(source: str) -> CompiledCode:
+    return CompiledCode(source)
+
+
+def _scope(context: MutableMapping[str, Any], db=None) -> ChainMap:
+    # Snippet locals land in the first map; the context itself is only changed through `context[...]`
+    return ChainMap({}, {'db': db, 'context': context}, context)
+
+
+def _changes(snapshot: Dict[str, Any], before: Dict[str, int]) -> Dict[str, Any]:
+    return {
+        "set": {k: v for k, v in snapshot.items() if before.get(k) != id(v)},
+        "deleted": [k for k in before if k not in snapshot],
+    }
+
+
+def _merge(context: MutableMapping[str, Any], delta: Dict[str, Any]):
+    context.update(delta["set"])
+    for k in delta["deleted"]:
+        context.pop(k, None)
+
+
+async def run_inline(compiled: CompiledCode, context: MutableMapping[str, Any], db=None):
+    if compiled.code is None:
+        raise SyntaxError(compiled.error)
+    if isinstance(context, ChainMap):
+        # Layered contexts (functions, map items, branches) reach the snippet as a plain dict,
+        # so `del`, `pop` and `json.dumps` behave as on the run's own context. Changes are copied
+        # back into the layer; a deleted key the layer inherited stays visible from the outer one.
+        snapshot = dict(context)
+        before = {k: id(v) for k, v in snapshot.items()}
+        await run_inline(compiled, snapshot, db)
+        _merge(context, _changes(snapshot, before))
+        return
+    scope = _scope(context, db)
+    exec(compiled.code, {}, scope)
+    if compiled.is_async:
+        await scope[ASYNC_FUNC_NAME](context, db)
+
+
+def _run_in_thread(compiled: CompiledCode, snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    before = {k: id(v) for k, v in snapshot.items()}
+    exec(compiled.code, {}, _scope(snapshot))
+    return _changes(snapshot, before)
+
+
+def _run_in_process(source: str, payload: bytes) -> Dict[str, Any]:
+    # Runs in a worker process: compiled code is cached per worker, the context arrives pickled
+    compiled = compile_code(source)
+    if compiled.code is None:
+        raise SyntaxError(compiled.error)
+    snapshot = pickle.loads(payload)
+    before = {}
+    for k, v in snapshot.items():
+        before[k] = pickle.dumps(v)
+    exec(compiled.code, {}, _scope(snapshot))
+    changed = {}
+    for k, v in snapshot.items():
+        try:
+            if before.get(k) != pickle.dumps(v):
+                changed[k] = v
+        except Exception:
+            pass
+    return {"set": changed, "deleted": [k for k in before if k not in snapshot]}
+
+
+def _warm():
+    return True
+
+
+class CodeExecutionPool:
+    """Warm thread/process pools for code nodes that opt out of running on the event loop."""
+    _threads: Optional[ThreadPoolExecutor] = None
+    _processes: Optional[ProcessPoolExecutor] = None
+
+    @classmethod
+    def start(cls, thread_workers: int, process_workers: int):
+        cls._threads = ThreadPoolExecutor(max_workers=thread_workers, thread_name_prefix="code-node")
+        if process_workers > 0:
+            cls._processes = ProcessPoolExecutor(
+                max_workers=process_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+            for _ in range(process_workers):
+                cls._processes.submit(_warm)
+
+    @classmethod
+    def shutdown(cls):
+        if cls._threads:
+            cls._threads.shutdown(wait=False, cancel_futures=True)
+            cls._threads = None
+        if cls._processes:
+            cls._processes.shutdown(wait=False, cancel_futures=True)
+            cls._processes = None
+
+    @classmethod
+    async def run(cls, compiled: CompiledCode, context: MutableMapping[str, Any], mode: str, timeout: float) -> str:
+        """
+        Run a synchronous snippet off the event loop and merge its context changes back.
+        Returns the mode actually used (falls back to threads when no process pool is up).
+        """
+        if compiled.code is None:
+            raise SyntaxError(compiled.error)
+        if cls._threads is None:
+            cls._threads = ThreadPoolExecutor(thread_name_prefix="code-node")
+        loop = asyncio.get_running_loop()
+
+        if mode == 'process' and cls._processes is not None:
+            picklable = {}
+            for k, v in context.items():
+                try:
+                    pickle.dumps(v)
+                    picklable[k] = v
+                except Exception:
+                    pass
+            future = loop.run_in_executor(cls._processes, _run_in_process, compiled.source, pickle.dumps(picklable))
+        else:
+            mode = 'thread'
+            future = loop.run_in_executor(cls._threads, _run_in_thread, compiled, dict(context))
+
+        _merge(context, await asyncio.wait_for(future, timeout))
+        return mode
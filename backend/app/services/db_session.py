@@ -0,0 +1,62 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.database import SessionLocal
+
+
+class InvocationSession:
+    """
+    Database session of one workflow invocation, shared with the functions it calls.
+    The session is only opened when a node first needs it, so compute-only routes
+    never take a pool slot. Writes stay in one transaction that the executor commits
+    at the end of the run, or rolls back if the run fails.
+    """
+
+    def __init__(self, session: Optional[AsyncSession] = None, bind: Optional[AsyncEngine] = None, connection_id: Optional[str] = None):
+        # A caller-provided session (e.g. from get_db) is used but not closed here
+        self._session = session
+        self._owned = session is None
+        # Engine and DatabaseConnection id of a user-configured database; None means the platform database
+        self.bind = bind
+        self.connection_id = connection_id
+        # An AsyncSession can't be used concurrently; every user of the session takes this lock
+        self.lock = asyncio.Lock()
+        # `batch` database nodes: key -> (statement, queued parameter sets)
+        self.pending: Dict[Any, Tuple[Any, List[Dict[str, Any]]]] = {}
+        self.dirty = False  # statements ran that the final commit has to cover
+        self.failed: Optional[str] = None  # a statement failed outside a savepoint after writes
+
+    @property
+    def acquired(self) -> bool:
+        return self._session is not None
+
+    @property
+    def has_writes(self) -> bool:
+        return bool(self.pending) or self.dirty
+
+    def get(self) -> AsyncSession:
+        if self._session is None:
+            self._session = self.new_session()
+        return self._session
+
+    def new_session(self) -> AsyncSession:
+        return SessionLocal() if self.bind is None else SessionLocal(bind=self.bind)
+
+    async def commit(self):
+        if self._session is not None and self.dirty:
+            await self._session.commit()
+        self.dirty = False
+
+    async def rollback(self):
+        self.pending.clear()
+        self.dirty = False
+        self.failed = None
+        if self._session is not None:
+            await self._session.rollback()
+
+    async def close(self):
+        if self._owned and self._session is not None:
+            session, self._session = self._session, None
+            await session.close()
@@ -0,0 +1,329 @@
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+from typing import Any, Dict, FrozenSet, Mapping, Optional, Tuple
+
+from app.core.database import settings
+from app.services.code_runner import compile_code
+from app.services.expressions import compile_condition, compile_expression
+from app.services.interface_schema import InterfaceValidator
+from app.services.templates import JsonTemplate, compile_sql, compile_template
+
+# Node types whose outgoing edges are selected by `sourceHandle`
+BRANCHING_TYPES = {'logic', 'loop', 'map'}
+
+# Node types that may end the run with a response; nothing after them shares their batch
+TERMINAL_TYPES = {'response', 'function_return', 'interface'}
+
+# Pseudo context key for database side effects: nodes that read the database list it in
+# `reads`, nodes that may write it in `reads` and `writes`, so a write never shares a batch
+# with anything else that touches a database
+DB_RESOURCE = '@db'
+
+
+@dataclass(frozen=True)
+class PlanNode:
+    id: str
+    type: str
+    data: Mapping[str, Any]
+    successors: Mapping[Optional[str], Tuple[str, ...]]  # sourceHandle -> targets
+    targets: Tuple[str, ...]  # every target, in edge order
+    compiled: Mapping[str, Any]  # data field -> parsed template / compiled expression
+    reads: Optional[FrozenSet[str]] = None  # context keys read; None = unknown (anything)
+    writes: Optional[FrozenSet[str]] = None  # context keys written; None = unknown (anything)
+    body: FrozenSet[str] = frozenset()  # loop/map: nodes reachable from the `do` handle
+
+    def next_ids(self, result=None) -> Tuple[str, ...]:
+        if self.type == 'logic':
+            return self.successors.get('true' if result is True else 'false', ())
+        if self.type in ('loop', 'map'):
+            return self.successors.get(result, ())
+        return self.targets
+
+
+@dataclass(frozen=True)
+class ExecutionPlan:
+    """Immutable, pre-analysed form of a workflow graph shared across invocations."""
+    nodes: Mapping[str, PlanNode]
+    start_id: Optional[str]
+    variable_ids: Tuple[str, ...]
+    forward_in: Mapping[str, int]  # incoming edges a join waits for (back edges excluded)
+    back_edges: FrozenSet[Tuple[str, str]]  # (source, target) pairs that close a cycle
+    entry_validators: Tuple[str, ...] = ()  # interface nodes every run passes through, checked before the run
+    reads: Optional[FrozenSet[str]] = None  # union of the nodes' reads; None if any node is opaque
+    writes: Optional[FrozenSet[str]] = None  # union of the nodes' writes; None if any node is opaque
+
+    @classmethod
+    def compile(cls, workflow_data: Dict[str, Any]) -> "ExecutionPlan":
+        raw_nodes = [n for n in workflow_data.get('nodes', []) if n]
+        edges = [e for e in workflow_data.get('edges', []) if e]
+
+        successors: Dict[str, Dict[Optional[str], list]] = {}
+        targets: Dict[str, list] = {}
+        incoming = set()
+        for edge in edges:
+            source, target = edge['source'], edge['target']
+            successors.setdefault(source, {}).setdefault(edge.get('sourceHandle'), []).append(target)
+            targets.setdefault(source, []).append(target)
+            incoming.add(target)
+
+        nodes = {}
+        for node in raw_nodes:
+            node_id = node['id']
+            data = node.get('data') or {}
+            compiled = _compile_fields(node['type'], data)
+            reads, writes = _data_access(node['type'], data, compiled)
+            nodes[node_id] = PlanNode(
+                id=node_id,
+                type=node['type'],
+                data=data,
+                successors=MappingProxyType({h: tuple(t) for h, t in successors.get(node_id, {}).items()}),
+                targets=tuple(targets.get(node_id, ())),
+                compiled=MappingProxyType(compiled),
+                reads=reads,
+                writes=writes,
+            )
+
+        for node_id, node in nodes.items():
+            if node.type in ('loop', 'map'):
+                nodes[node_id] = _with_body(nodes, node)
+
+        # Entry point priority: function_start, then api, then first node with no incoming edges
+        start = next((n for n in nodes.values() if n.type == 'function_start'), None)
+        if not start:
+            start = next((n for n in nodes.values() if n.type == 'api'), None)
+        if not start:
+            start = next((n for n in nodes.values() if n.id not in incoming and n.type != 'variable'), None)
+
+        forward_in, back_edges = _analyse_edges(nodes, start.id if start else None)
+        reads, writes = _union_access(nodes.values())
+
+        return cls(
+            nodes=MappingProxyType(nodes),
+            start_id=start.id if start else None,
+            variable_ids=tuple(n.id for n in nodes.values() if n.type == 'variable'),
+            forward_in=MappingProxyType(forward_in),
+            back_edges=frozenset(back_edges),
+            entry_validators=_entry_validators(nodes, start.id if start else None),
+            reads=reads,
+            writes=writes,
+        )
+
+
+def _union_access(nodes) -> Tuple[Optional[FrozenSet[str]], Optional[FrozenSet[str]]]:
+    reads, writes = frozenset(), frozenset()
+    for node in nodes:
+        reads = None if reads is None or node.reads is None else reads | node.reads
+        writes = None if writes is None or node.writes is None else writes | node.writes
+    return reads, writes
+
+
+def call_access(node: PlanNode, callee: Optional[ExecutionPlan]):
+    """
+    A `subworkflow` node's reads and writes once its function's plan is known. The body
+    runs in its own context layer, so only `func_result` and database writes escape it.
+    """
+    if callee is None or callee.reads is None or callee.writes is None:
+        return node.reads, node.writes
+    reads = _refs(*(node.data.get('paramMappings') or {}).values()) | callee.reads
+    return reads, frozenset(['func_result']) | (callee.writes & {DB_RESOURCE})
+
+
+def _entry_validators(nodes: Dict[str, PlanNode], start_id: Optional[str]) -> Tuple[str, ...]:
+    """Interface nodes on the unbranched path from the entry node, which every run must pass."""
+    found, seen, node_id = [], set(), start_id
+    while node_id in nodes and node_id not in seen:
+        seen.add(node_id)
+        node = nodes[node_id]
+        if node.type == 'interface':
+            found.append(node_id)
+        if node.type in BRANCHING_TYPES or len(node.targets) != 1:
+            break
+        node_id = node.targets[0]
+    return tuple(found)
+
+
+def _analyse_edges(nodes: Dict[str, PlanNode], start_id: Optional[str]):
+    """DFS from the entry node: edges into a node still on the stack are loop back edges."""
+    back_edges = set()
+    reachable = set()
+    if start_id:
+        on_stack = {start_id}
+        reachable.add(start_id)
+        stack = [(start_id, iter(nodes[start_id].targets))]
+        while stack:
+            node_id, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                on_stack.discard(node_id)
+            elif child not in nodes:
+                continue
+            elif child in on_stack:
+                back_edges.add((node_id, child))
+            elif child not in reachable:
+                reachable.add(child)
+                on_stack.add(child)
+                stack.append((child, iter(nodes[child].targets)))
+
+    forward_in: Dict[str, int] = {}
+    for node_id in reachable:
+        for target in nodes[node_id].targets:
+            if (node_id, target) not in back_edges:
+                forward_in[target] = forward_in.get(target, 0) + 1
+    return forward_in, back_edges
+
+
+def _with_body(nodes: Dict[str, PlanNode], node: PlanNode) -> PlanNode:
+    body, stack = set(), list(node.successors.get('do', ()))
+    while stack:
+        node_id = stack.pop()
+        if node_id in body or node_id == node.id or node_id not in nodes:
+            continue
+        body.add(node_id)
+        stack.extend(nodes[node_id].targets)
+    if node.type != 'map':
+        return replace(node, body=frozenset(body))
+    # A map runs its body inside the node, so it reads whatever the body reads;
+    # the body's context writes stay in per-item scopes, its database writes don't
+    reads, writes = node.reads, node.writes
+    for node_id in body:
+        inner = nodes[node_id]
+        reads = None if reads is None or inner.reads is None else reads | inner.reads
+        if inner.writes is None or DB_RESOURCE in inner.writes:
+            writes = writes | {DB_RESOURCE}
+    if writes != node.writes:
+        reads = None if reads is None else reads | {DB_RESOURCE}
+    return replace(node, body=frozenset(body), reads=reads, writes=writes)
+
+
+def _refs(*values) -> FrozenSet[str]:
+    names = set()
+    for value in values:
+        if isinstance(value, str):
+            names.update(ref[0] for ref in compile_template(value, bare_dollar=True).refs)
+        elif isinstance(value, dict):
+            names.update(_refs(*value.values()))
+    return frozenset(names)
+
+
+def _data_access(node_type: str, data: Dict[str, Any], compiled: Dict[str, Any]):
+    """
+    Context keys a node reads and writes, used by the scheduler to decide which
+    ready nodes may run concurrently. (None, None) means "treat as opaque".
+    """
+    if node_type == 'api':
+        return frozenset(), frozenset()
+    if node_type == 'variable':
+        return _refs(data.get('value')), frozenset([data.get('name')])
+    if node_type == 'math':
+        return _refs(data.get('valA'), data.get('valB')), frozenset([data.get('resultVar', 'result')])
+    if node_type == 'data_op':
+        collection = data.get('collection', '')
+        return _refs(collection) | {collection, 'body'}, frozenset([data.get('resultVar', 'summary')])
+    if node_type == 'logic':
+        return compiled['condition'].names, frozenset()
+    if node_type == 'expression':
+        return compiled['expression'].names, frozenset([data.get('resultVar', 'result')])
+    if node_type == 'loop':
+        collection = data.get('collection', '')
+        state = '_loop_states'
+        return _refs(collection) | {collection, state}, frozenset([data.get('variable', 'item'), state])
+    if node_type == 'map':
+        collection = data.get('collection', '')
+        return _refs(collection) | {collection}, frozenset([data.get('resultVar', 'results')])
+    if node_type == 'database':
+        reads = compiled['query'].names | {DB_RESOURCE}
+        writes = frozenset([data.get('resultVar', 'dbData')])
+        if data.get('queryType', 'read') not in ('read', 'stream'):
+            writes |= {DB_RESOURCE}
+        return reads, writes
+    if node_type == 'file':
+        return _refs(data.get('path'), data.get('content')), frozenset([data.get('resultVar', 'fileData')])
+    if node_type == 'function':
+        return frozenset(['input']), frozenset(['func_result'])
+    if node_type == 'subworkflow':
+        # The function body sees the caller's context through its ChainMap and may use any
+        # database; the runner narrows this with `call_access` once the function is loaded
+        return None, frozenset(['func_result', DB_RESOURCE])
+    if node_type == 'function_start':
+        names = [p.get('name') for p in data.get('parameters', []) if p.get('name')]
+        return frozenset(['_func_args']), frozenset(names)
+    if node_type == 'response':
+        body = data.get('body', '{}')
+        return (_refs(body) | {str(body).strip('{}$')}), frozenset()
+    if node_type == 'function_return':
+        value = data.get('returnValue', '')
+        return _refs(value) | {str(value)}, frozenset()
+    if node_type == 'interface':
+        return frozenset([data.get('transferMode', 'body')]), frozenset()
+    return None, None
+
+
+def _compile_fields(node_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    compiled = {}
+    if node_type == 'response' and data.get('responseType', 'json') != 'variable':
+        compiled['body'] = JsonTemplate(str(data.get('body', '{}')), bare_dollar=True)
+    elif node_type == 'function_return' and data.get('returnType') == 'json':
+        compiled['returnValue'] = JsonTemplate(str(data.get('returnValue', '')))
+    elif node_type == 'variable' and isinstance(data.get('value'), str):
+        compiled['value'] = compile_template(data['value'])
+    elif node_type == 'database':
+        compiled['query'] = compile_sql(str(data.get('query', '')))
+    elif node_type == 'logic':
+        compiled['condition'] = compile_condition(str(data.get('condition', 'False')))
+    elif node_type == 'expression':
+        compiled['expression'] = compile_expression(str(data.get('expression', '')))
+    elif node_type == 'code':
+        compiled['code'] = compile_code(data.get('code', ''))
+    elif node_type == 'interface':
+        compiled['validator'] = InterfaceValidator(data.get('fields') or [], data.get('transferMode', 'body'))
+    return compiled
+
+
+def workflow_version(workflow) -> str:
+    stamp = workflow.updated_at or workflow.created_at
+    return stamp.isoformat() if stamp else ""
+
+
+def content_hash(workflow_data: Dict[str, Any]) -> str:
+    payload = json.dumps(
+        {"nodes": workflow_data.get('nodes', []), "edges": workflow_data.get('edges', [])},
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+class PlanCache:
+    """LRU of compiled plans keyed by workflow id and version (updated_at, or a content hash)."""
+    _plans: "OrderedDict[Tuple[str, str], ExecutionPlan]" = OrderedDict()
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def get(cls, workflow_id: Any, version: Optional[str], workflow_data: Dict[str, Any]) -> ExecutionPlan:
+        key = (str(workflow_id), version or content_hash(workflow_data))
+        plan = cls._plans.get(key)
+        if plan is not None:
+            cls._plans.move_to_end(key)
+            cls.hits += 1
+            return plan
+
+        cls.misses += 1
+        plan = ExecutionPlan.compile(workflow_data)
+        cls._plans[key] = plan
+        while len(cls._plans) > settings.PLAN_CACHE_SIZE:
+            cls._plans.popitem(last=False)
+        return plan
+
+    @classmethod
+    def invalidate(cls, workflow_id: Any):
+        workflow_id = str(workflow_id)
+        for key in [k for k in cls._plans if k[0] == workflow_id]:
+            del cls._plans[key]
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {"size": len(cls._plans), "hits": cls.hits, "misses": cls.misses}
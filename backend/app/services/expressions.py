@@ -0,0 +1,296 @@
+import ast
+import math
+import operator
+import re
+from functools import lru_cache
+from typing import Any, Callable, FrozenSet, Mapping, Optional
+
+_ATTR_HELPER = '__attr__'
+
+# Conditions are limited to comparisons, boolean logic, arithmetic and
+# attribute/subscript access on context values - no calls, no lambdas.
+_CONDITION_NODES = (
+    ast.Expression, ast.BoolOp, ast.And, ast.Or, ast.UnaryOp, ast.Not, ast.USub, ast.UAdd,
+    ast.Compare, ast.Eq, ast.NotEq, ast.Lt, ast.LtE, ast.Gt, ast.GtE, ast.In, ast.NotIn, ast.Is, ast.IsNot,
+    ast.BinOp, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod,
+    ast.Name, ast.Load, ast.Constant, ast.Attribute, ast.Subscript, ast.Slice,
+    ast.List, ast.Tuple,
+)
+
+
+def _attr(obj, name):
+    # `body.name` reads dict keys as well as attributes, like the JS-style editor suggests
+    if isinstance(obj, Mapping) and name in obj:
+        return obj[name]
+    return getattr(obj, name)
+
+
+class _AttributeRewriter(ast.NodeTransformer):
+    def visit_Attribute(self, node: ast.Attribute):
+        value = self.visit(node.value)
+        call = ast.Call(
+            func=ast.Name(id=_ATTR_HELPER, ctx=ast.Load()),
+            args=[value, ast.Constant(value=node.attr)],
+            keywords=[],
+        )
+        return ast.copy_location(call, node)
+
+
+class CompiledCondition:
+    """A logic-node condition validated and compiled once; `names` lists the context keys it reads."""
+    __slots__ = ('source', 'code', 'names', 'error')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.code = None
+        self.names: FrozenSet[str] = frozenset()
+        self.error: Optional[str] = None
+        try:
+            tree = ast.parse(source.replace('===', '==').replace('!==', '!=').strip() or 'False', mode='eval')
+            for node in ast.walk(tree):
+                if not isinstance(node, _CONDITION_NODES):
+                    raise ValueError(f"Unsupported syntax in condition: {type(node).__name__}")
+                if isinstance(node, ast.Attribute) and node.attr.startswith('_'):
+                    raise ValueError(f"Access to private attribute '{node.attr}' is not allowed")
+            self.names = frozenset(n.id for n in ast.walk(tree) if isinstance(n, ast.Name))
+            tree = ast.fix_missing_locations(_AttributeRewriter().visit(tree))
+            self.code = compile(tree, '<condition>', 'eval')
+        except (SyntaxError, ValueError) as e:
+            self.error = str(e)
+
+    def evaluate(self, context: Mapping[str, Any]) -> bool:
+        if self.code is None:
+            raise ValueError(self.error)
+        return bool(eval(self.code, {"__builtins__": {}, _ATTR_HELPER: _attr}, context))
+
+
+@lru_cache(maxsize=1024)
+def compile_condition(source: str) -> CompiledCondition:
+    return CompiledCondition(source)
+
+
+def _number(value: Any) -> Any:
+    # Query strings and form values arrive as text; numeric text takes part in arithmetic as a number
+    if type(value) is str:
+        try:
+            return int(value)
+        except ValueError:
+            try:
+                return float(value)
+            except ValueError:
+                return value
+    return value
+
+
+def _add(a, b):
+    a, b = _number(a), _number(b)
+    if isinstance(a, str) or isinstance(b, str):
+        return f"{a}{b}"
+    return a + b
+
+
+def _div(a, b):
+    a, b = _number(a), _number(b)
+    result = a / b
+    # Keep whole results of integer division as ints, like the math node
+    if isinstance(a, int) and isinstance(b, int) and result.is_integer():
+        return int(result)
+    return result
+
+
+def _pow(a, b):
+    a, b = _number(a), _number(b)
+    # Formulas come from workflow authors; don't let one pin a worker on a giant result
+    if isinstance(b, (int, float)) and abs(b) > 1000:
+        raise ValueError("Exponent too large")
+    return a ** b
+
+
+def _mul(a, b):
+    a, b = _number(a), _number(b)
+    if isinstance(a, (str, list)) or isinstance(b, (str, list)):
+        seq, count = (a, b) if isinstance(a, (str, list)) else (b, a)
+        if isinstance(count, int) and len(seq) * count > 100_000:
+            raise ValueError("Repeated value too large")
+    return a * b
+
+
+_CONVERSIONS = {-1: None, ord('s'): str, ord('r'): repr, ord('a'): ascii}
+
+
+def _format(value, convert, spec: str) -> str:
+    if convert is not None:
+        value = convert(value)
+    if any(int(n) > 1000 for n in re.findall(r'\d+', spec)):
+        raise ValueError("Format width too large")
+    return format(value, spec)
+
+
+def _numeric(op):
+    return lambda a, b: op(_number(a), _number(b))
+
+
+_BINARY_OPS = {
+    ast.Add: _add,
+    ast.Sub: _numeric(operator.sub),
+    ast.Mult: _mul,
+    ast.Div: _div,
+    ast.FloorDiv: _numeric(operator.floordiv),
+    ast.Mod: _numeric(operator.mod),
+    ast.Pow: _pow,
+}
+_UNARY_OPS = {
+    ast.USub: lambda v: -_number(v),
+    ast.UAdd: lambda v: +_number(v),
+    ast.Not: operator.not_,
+}
+_COMPARE_OPS = {
+    ast.Eq: operator.eq, ast.NotEq: operator.ne,
+    ast.Lt: operator.lt, ast.LtE: operator.le, ast.Gt: operator.gt, ast.GtE: operator.ge,
+    ast.In: lambda a, b: a in b, ast.NotIn: lambda a, b: a not in b,
+    ast.Is: operator.is_, ast.IsNot: operator.is_not,
+}
+# The only callables an expression can reach
+EXPRESSION_FUNCTIONS = {
+    'abs': abs, 'round': round, 'min': min, 'max': max, 'sum': sum, 'len': len,
+    'int': int, 'float': float, 'str': str, 'bool': bool,
+    'upper': lambda s: str(s).upper(), 'lower': lambda s: str(s).lower(), 'trim': lambda s: str(s).strip(),
+    'floor': math.floor, 'ceil': math.ceil, 'sqrt': math.sqrt,
+}
+
+Evaluator = Callable[[Mapping[str, Any]], Any]
+
+
+class CompiledExpression:
+    """
+    An expression-node formula parsed once into a tree of closures; evaluating it is
+    plain function calls with no parsing or eval(). `names` lists the context keys it reads.
+    """
+    __slots__ = ('source', 'evaluate_tree', 'names', 'error')
+
+    def __init__(self, source: str):
+        self.source = source
+        self.evaluate_tree: Optional[Evaluator] = None
+        self.names: FrozenSet[str] = frozenset()
+        self.error: Optional[str] = None
+        names = set()
+        try:
+            tree = ast.parse(source.replace('===', '==').replace('!==', '!=').strip() or 'None', mode='eval')
+            self.evaluate_tree = _build(tree.body, names)
+            self.names = frozenset(names)
+        except (SyntaxError, ValueError) as e:
+            self.error = str(e)
+
+    def evaluate(self, context: Mapping[str, Any]) -> Any:
+        if self.evaluate_tree is None:
+            raise ValueError(self.error)
+        return self.evaluate_tree(context)
+
+
+def _build(node: ast.AST, names: set) -> Evaluator:
+    if isinstance(node, ast.Constant):
+        value = node.value
+        return lambda ctx: value
+
+    if isinstance(node, ast.Name):
+        name = node.id
+        names.add(name)
+
+        def load(ctx):
+            try:
+                return ctx[name]
+            except KeyError:
+                raise NameError(f"'{name}' is not defined") from None
+        return load
+
+    if isinstance(node, ast.Attribute):
+        if node.attr.startswith('_'):
+            raise ValueError(f"Access to private attribute '{node.attr}' is not allowed")
+        obj, attr = _build(node.value, names), node.attr
+        return lambda ctx: _attr(obj(ctx), attr)
+
+    if isinstance(node, ast.Subscript):
+        obj, index = _build(node.value, names), _build(node.slice, names)
+        return lambda ctx: obj(ctx)[index(ctx)]
+
+    if isinstance(node, ast.Slice):
+        parts = [_build(p, names) if p is not None else None for p in (node.lower, node.upper, node.step)]
+        return lambda ctx: slice(*(p(ctx) if p else None for p in parts))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        left, right, op = _build(node.left, names), _build(node.right, names), _BINARY_OPS[type(node.op)]
+        return lambda ctx: op(left(ctx), right(ctx))
+
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        operand, op = _build(node.operand, names), _UNARY_OPS[type(node.op)]
+        return lambda ctx: op(operand(ctx))
+
+    if isinstance(node, ast.BoolOp):
+        values = [_build(v, names) for v in node.values]
+        if isinstance(node.op, ast.And):
+            def all_of(ctx):
+                result = True
+                for value in values:
+                    result = value(ctx)
+                    if not result:
+                        return result
+                return result
+            return all_of
+
+        def any_of(ctx):
+            result = False
+            for value in values:
+                result = value(ctx)
+                if result:
+                    return result
+            return result
+        return any_of
+
+    if isinstance(node, ast.Compare):
+        if any(type(op) not in _COMPARE_OPS for op in node.ops):
+            raise ValueError("Unsupported comparison")
+        left = _build(node.left, names)
+        steps = [(_COMPARE_OPS[type(op)], _build(c, names)) for op, c in zip(node.ops, node.comparators)]
+
+        def compare(ctx):
+            current = left(ctx)
+            for op, comparator in steps:
+                following = comparator(ctx)
+                if not op(current, following):
+                    return False
+                current = following
+            return True
+        return compare
+
+    if isinstance(node, ast.IfExp):
+        test, body, orelse = _build(node.test, names), _build(node.body, names), _build(node.orelse, names)
+        return lambda ctx: body(ctx) if test(ctx) else orelse(ctx)
+
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in EXPRESSION_FUNCTIONS or node.keywords:
+            raise ValueError(f"Unsupported function call: {ast.unparse(node.func)}")
+        func = EXPRESSION_FUNCTIONS[node.func.id]
+        args = [_build(a, names) for a in node.args]
+        return lambda ctx: func(*[a(ctx) for a in args])
+
+    if isinstance(node, (ast.List, ast.Tuple)):
+        items = [_build(e, names) for e in node.elts]
+        return lambda ctx: [item(ctx) for item in items]
+
+    if isinstance(node, ast.JoinedStr):
+        parts = [_build(v, names) for v in node.values]
+        return lambda ctx: ''.join(str(p(ctx)) for p in parts)
+
+    if isinstance(node, ast.FormattedValue):
+        # f"{x!r:>10.2f}": conversion first, then the (possibly templated) format spec
+        value = _build(node.value, names)
+        convert = _CONVERSIONS[node.conversion]
+        spec = _build(node.format_spec, names) if node.format_spec is not None else None
+        return lambda ctx: _format(value(ctx), convert, spec(ctx) if spec else '')
+
+    raise ValueError(f"Unsupported syntax in expression: {type(node).__name__}")
+
+
+@lru_cache(maxsize=1024)
+def compile_expression(source: str) -> CompiledExpression:
+    return CompiledExpression(source)
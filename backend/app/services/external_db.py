@@ -1,13 +1,73 @@
+import asyncio
+import base64
+import datetime
+import decimal
+import hashlib
 import json
 import os
-from typing import List, Dict, Any, Optional
+import time
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, List, Dict, Any, Optional, Tuple
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine
-from sqlalchemy import text, inspect
+from sqlalchemy import column, inspect, literal, select, table, text, tuple_
+from sqlalchemy.types import TypeEngine
 from pydantic import BaseModel
+from app.core.database import SessionLocal, driver_connect_args, settings
+from app.models.workflow import DatabaseConnection
+
+def encode_cursor(values: List[Any]) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, default=str).encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> List[Any]:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+    return values
+
+
+def _coerce(type_: TypeEngine, value: Any) -> Any:
+    # Filter values arrive as query strings and cursor values as JSON; drivers like asyncpg
+    # only accept the Python type of the column (int, UUID, datetime, Decimal, ...)
+    try:
+        python_type = type_.python_type
+    except NotImplementedError:
+        return value
+    if value is None or isinstance(value, python_type):
+        return value
+    try:
+        if python_type is bool:
+            return str(value).lower() in ("1", "true", "t", "yes")
+        if python_type in (int, float, decimal.Decimal):
+            return python_type(str(value)) if python_type is decimal.Decimal else python_type(value)
+        if python_type is uuid.UUID:
+            return uuid.UUID(str(value))
+        if python_type in (datetime.datetime, datetime.date, datetime.time):
+            return python_type.fromisoformat(str(value))
+    except (TypeError, ValueError, decimal.InvalidOperation):
+        raise ValueError(f"Invalid {python_type.__name__} value: {value!r}")
+    return value
+
 
 class ExternalDbService:
-    # Cache engines by URL
-    _engines: Dict[str, AsyncEngine] = {}
+    # Engines by normalized URL, least recently used first
+    _engines: "OrderedDict[str, AsyncEngine]" = OrderedDict()
+    _last_used: Dict[str, float] = {}
+    # DatabaseConnection id -> (url, owner, expires at)
+    _connections: Dict[str, Tuple[str, Optional[str], float]] = {}
+    # Normalized URL -> (reflected at, schema, column types by table); see get_schema
+    _schemas: Dict[str, Tuple[float, Dict[str, Dict[str, Any]], Dict[str, Dict[str, TypeEngine]]]] = {}
+    _schema_tasks: Dict[str, "asyncio.Task"] = {}
+
+    @staticmethod
+    def normalize_url(url: str) -> str:
+        if url.startswith("postgresql://") and "asyncpg" not in url:
+             url = url.replace("postgresql://", "postgresql+asyncpg://")
+        return url
 
     @classmethod
     async def get_engine(cls, url: str) -> Optional[AsyncEngine]:
@@ -15,53 +75,218 @@ class ExternalDbService:
             return None
         
         # Normalize
-        if url.startswith("postgresql://") and "asyncpg" not in url:
-             url = url.replace("postgresql://", "postgresql+asyncpg://")
+        url = cls.normalize_url(url)
         
         if url in cls._engines:
+            cls._engines.move_to_end(url)
+            cls._last_used[url] = time.monotonic()
             return cls._engines[url]
         
         try:
-            engine = create_async_engine(url, echo=False)
+            engine = create_async_engine(url, echo=False, connect_args=driver_connect_args(url), **cls._pool_options(url))
             cls._engines[url] = engine
+            cls._last_used[url] = time.monotonic()
+            await cls._evict_over_limit()
             return engine
         except Exception as e:
             print(f"Failed to create engine: {e}")
             return None
 
+    @staticmethod
+    def _pool_options(url: str) -> Dict[str, Any]:
+        if url.startswith("sqlite"):
+            return {}
+        return {
+            "pool_size": settings.EXTERNAL_DB_POOL_SIZE,
+            "max_overflow": settings.EXTERNAL_DB_MAX_OVERFLOW,
+            "pool_pre_ping": settings.EXTERNAL_DB_POOL_PRE_PING,
+            "pool_recycle": settings.EXTERNAL_DB_POOL_RECYCLE,
+        }
+
     @classmethod
-    async def test_connection(cls, url: str) -> Dict[str, Any]:
-        test_url = url
-        if test_url.startswith("postgresql://") and "asyncpg" not in test_url:
-             test_url = test_url.replace("postgresql://", "postgresql+asyncpg://")
+    async def _dispose(cls, url: str):
+        engine = cls._engines.pop(url, None)
+        cls._last_used.pop(url, None)
+        if engine is not None:
+            await engine.dispose()
+
+    @staticmethod
+    def _in_use(engine: AsyncEngine) -> bool:
+        checkedout = getattr(engine.sync_engine.pool, "checkedout", None)
+        return bool(checkedout and checkedout())
+
+    @classmethod
+    async def _evict_over_limit(cls):
+        # Least recently used engines go first; engines with checked-out connections are kept
+        for url in list(cls._engines):
+            if len(cls._engines) <= settings.EXTERNAL_DB_MAX_ENGINES:
+                break
+            if not cls._in_use(cls._engines[url]):
+                await cls._dispose(url)
+
+    @classmethod
+    async def dispose_idle(cls):
+        cutoff = time.monotonic() - settings.EXTERNAL_DB_IDLE_SECONDS
+        for url in [u for u, used in cls._last_used.items() if used < cutoff]:
+            if not cls._in_use(cls._engines[url]):
+                await cls._dispose(url)
+
+    @classmethod
+    async def dispose_all(cls):
+        for url in list(cls._engines):
+            await cls._dispose(url)
+
+    @classmethod
+    async def run_idle_reaper(cls):
+        # Background loop: close pools of customer databases nobody has used for a while
+        while True:
+            await asyncio.sleep(max(settings.EXTERNAL_DB_IDLE_SECONDS / 4, 5))
+            try:
+                await cls.dispose_idle()
+            except Exception as e:
+                print(f"External engine cleanup failed: {e}")
+
+    @classmethod
+    async def engine_for_connection(cls, connection_id: str, owner_id: Optional[str]) -> AsyncEngine:
+        """Engine for a saved DatabaseConnection; the connection must belong to the workflow's owner."""
+        connection_id = str(connection_id)
+        cached = cls._connections.get(connection_id)
+        if cached is None or cached[2] < time.monotonic():
+            async with SessionLocal() as session:
+                result = await session.execute(
+                    select(DatabaseConnection.connection_string, DatabaseConnection.user_id)
+                    .filter(DatabaseConnection.id == connection_id)
+                )
+                row = result.first()
+            if row is None:
+                cls._connections.pop(connection_id, None)
+                raise LookupError(f"Database connection {connection_id} not found")
+            cached = (row[0], row[1], time.monotonic() + settings.EXTERNAL_DB_CONNECTION_TTL)
+            cls._connections[connection_id] = cached
+
+        url, owner, _ = cached
+        if owner != owner_id:
+            raise PermissionError(f"Database connection {connection_id} belongs to another user")
+        engine = await cls.get_engine(url)
+        if engine is None:
+            raise ConnectionError(f"Could not create an engine for connection {connection_id}")
+        return engine
 
+    @classmethod
+    def invalidate_connection(cls, connection_id: Any):
+        cls._connections.pop(str(connection_id), None)
+
+    @classmethod
+    def pools(cls) -> Dict[str, Any]:
+        """Pools of the open engines, labelled by connection id (or a hash of the URL), never by host."""
+        labels = {url: connection_id for connection_id, (url, _, _) in list(cls._connections.items())}
+        pools = {}
+        for url, engine in list(cls._engines.items()):
+            label = labels.get(url) or "url-" + hashlib.sha1(url.encode()).hexdigest()[:12]
+            pools[label] = engine.sync_engine.pool
+        return pools
+
+    @classmethod
+    async def test_connection(cls, url: str) -> Dict[str, Any]:
+        # Goes through the pooled engine, so saving the connection afterwards reuses it
         try:
-            engine = create_async_engine(test_url)
+            engine = await cls.get_engine(url)
+            if engine is None:
+                return {"success": False, "message": "Invalid connection string"}
             async with engine.connect() as conn:
                 await conn.execute(text("SELECT 1"))
-            await engine.dispose()
             return {"success": True, "message": "Connection successful"}
         except Exception as e:
+            await cls._dispose(cls.normalize_url(url))
             return {"success": False, "message": str(e)}
 
+    @staticmethod
+    def _reflect(connection) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, TypeEngine]]]:
+        inspector = inspect(connection)
+        schema, types = {}, {}
+        for table in inspector.get_table_names():
+            columns = inspector.get_columns(table)
+            types[table] = {col["name"]: col["type"] for col in columns}
+            schema[table] = {
+                "columns": [
+                    {
+                        "name": col["name"],
+                        "type": str(col["type"]),
+                        "nullable": col.get("nullable", True),
+                        "default": None if col.get("default") is None else str(col["default"]),
+                    }
+                    for col in columns
+                ],
+                "primary_key": inspector.get_pk_constraint(table).get("constrained_columns") or [],
+                "indexes": [
+                    {"name": idx.get("name"), "columns": idx.get("column_names") or [], "unique": bool(idx.get("unique"))}
+                    for idx in inspector.get_indexes(table)
+                ],
+            }
+        return schema, types
+
     @classmethod
-    async def get_tables(cls, url: str) -> List[str]:
+    async def _load_schema(cls, url: str) -> Dict[str, Dict[str, Any]]:
         engine = await cls.get_engine(url)
         if not engine:
-            return []
-        
+            raise Exception("Could not connect to database")
+        async with engine.connect() as conn:
+            schema, types = await conn.run_sync(cls._reflect)
+        cls._schemas[url] = (time.monotonic(), schema, types)
+        return schema
+
+    @classmethod
+    def _reload_schema(cls, url: str) -> "asyncio.Task":
+        # One reflection per URL at a time; concurrent callers await the same task
+        task = cls._schema_tasks.get(url)
+        if task is None:
+            task = asyncio.create_task(cls._load_schema(url))
+            cls._schema_tasks[url] = task
+            task.add_done_callback(lambda _: cls._schema_tasks.pop(url, None))
+        return task
+
+    @classmethod
+    async def get_schema(cls, url: str, refresh: bool = False) -> Dict[str, Dict[str, Any]]:
+        """Reflected tables, columns, primary keys and indexes, cached for SCHEMA_CACHE_TTL seconds."""
+        url = cls.normalize_url(url)
+        cached = cls._schemas.get(url)
+        if cached is None or refresh:
+            return await cls._reload_schema(url)
+        fetched_at, schema, _ = cached
+        if time.monotonic() - fetched_at > settings.SCHEMA_CACHE_TTL:
+            # Stale: answer from memory and revalidate in the background
+            task = cls._reload_schema(url)
+            task.add_done_callback(cls._log_reload_error)
+        return schema
+
+    @staticmethod
+    def _log_reload_error(task: "asyncio.Task"):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Schema refresh failed: {task.exception()}")
+
+    @classmethod
+    def invalidate_schema(cls, url: str):
+        cls._schemas.pop(cls.normalize_url(url), None)
+
+    @classmethod
+    async def get_tables(cls, url: str) -> List[str]:
         try:
-            async with engine.connect() as conn:
-                def get_names(connection):
-                    inspector = inspect(connection)
-                    return inspector.get_table_names()
-                
-                tables = await conn.run_sync(get_names)
-                return tables
+            return sorted(await cls.get_schema(url))
         except Exception as e:
             print(f"Error fetching tables: {e}")
             raise e
 
+    @classmethod
+    async def get_columns(cls, url: str, table: str) -> Optional[Dict[str, Any]]:
+        return (await cls.get_schema(url)).get(table)
+
+    @classmethod
+    async def get_column_types(cls, url: str, table: str) -> Dict[str, TypeEngine]:
+        """Reflected SQLAlchemy types of a table's columns, from the same cache as get_schema."""
+        await cls.get_schema(url)
+        cached = cls._schemas.get(cls.normalize_url(url))
+        return cached[2].get(table, {}) if cached else {}
+
     @classmethod
     async def execute_query(cls, query: str, params: dict = None, url: str = None) -> Any:
         if not url:
@@ -76,3 +301,105 @@ class ExternalDbService:
             if result.returns_rows:
                 return [dict(row) for row in result.mappings().all()]
             return {"rowcount": result.rowcount}
+
+    @classmethod
+    async def stream_query(cls, query: str, params: dict = None, url: str = None, fetch_size: int = None) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """Yield (columns, rows) chunks of at most fetch_size rows from a server-side cursor."""
+        if not url:
+            raise Exception("No URL provided")
+
+        engine = await cls.get_engine(url)
+        if not engine:
+            raise Exception("Could not connect to database")
+
+        fetch_size = fetch_size or settings.DB_STREAM_FETCH_SIZE
+        async with engine.connect() as conn:
+            result = await conn.stream(text(query), params or {}, execution_options={"yield_per": fetch_size})
+            columns = list(result.keys())
+            # Always yield once so callers can emit a header for empty results
+            yield columns, []
+            async for partition in result.partitions(fetch_size):
+                yield columns, partition
+
+    @classmethod
+    async def fetch_page(
+        cls,
+        url: str,
+        table_name: str,
+        limit: int,
+        columns: Optional[List[str]] = None,
+        order_by: Optional[str] = None,
+        filters: Optional[Dict[str, str]] = None,
+        after: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """
+        One page of a table in key order, continuing after an opaque cursor. The key is the
+        primary key, or an indexed NOT NULL column with the primary key as tie-breaker, so
+        every page is an index seek no matter how deep it is. A table without a primary key
+        and no order_by only gets its first `limit` rows, with no cursor. Raises ValueError
+        for invalid input.
+        """
+        meta = await cls.get_columns(url, table_name)
+        if meta is None:
+            raise LookupError(f"Table {table_name} not found")
+        types = await cls.get_column_types(url, table_name)
+        primary_key = list(meta["primary_key"])
+        indexed = set(primary_key[:1]) | {idx["columns"][0] for idx in meta["indexes"] if idx["columns"]}
+
+        if order_by:
+            if order_by not in indexed:
+                raise ValueError(f"Column {order_by} is not the leading column of an index")
+            # `key > NULL` is never true, so rows with a NULL key would drop out of every page
+            nullable = any(col["nullable"] for col in meta["columns"] if col["name"] == order_by)
+            if nullable and order_by not in primary_key:
+                raise ValueError(f"Column {order_by} is nullable; order by a NOT NULL column")
+            key = [order_by] + [c for c in primary_key if c != order_by]
+        else:
+            key = primary_key
+        if not key and after:
+            raise ValueError("Table has no primary key; pass an indexed order_by column to page further")
+
+        selected = columns or list(types)
+        filters = filters or {}
+        for name in [*selected, *filters]:
+            if name not in types:
+                raise ValueError(f"Unknown column {name}")
+        for name in filters:
+            if name not in indexed:
+                raise ValueError(f"Column {name} is not indexed")
+
+        # Key columns are always fetched so the next cursor can be built, then dropped if not asked for.
+        # Columns carry their reflected types so binds go out as the column's type, not VARCHAR.
+        fetched = list(dict.fromkeys([*selected, *key]))
+        tbl = table(table_name, *[column(c, types[c]) for c in dict.fromkeys([*fetched, *filters])])
+        stmt = select(*[tbl.c[c] for c in fetched])
+        for name, value in filters.items():
+            stmt = stmt.where(tbl.c[name] == _coerce(types[name], value))
+        if after:
+            values = decode_cursor(after)
+            if len(values) != len(key):
+                raise ValueError("Cursor does not match the sort key")
+            key_cols = [tbl.c[c] for c in key]
+            bounds = [literal(_coerce(col.type, v), col.type) for col, v in zip(key_cols, values)]
+            if len(key) == 1:
+                stmt = stmt.where(key_cols[0] > bounds[0])
+            else:
+                stmt = stmt.where(tuple_(*key_cols) > tuple_(*bounds))
+        if key:
+            stmt = stmt.order_by(*[tbl.c[c] for c in key]).limit(limit + 1)
+        else:
+            stmt = stmt.limit(limit)
+
+        engine = await cls.get_engine(url)
+        if not engine:
+            raise ConnectionError("Could not connect to database")
+        async with engine.connect() as conn:
+            rows = [dict(row) for row in (await conn.execute(stmt)).mappings().all()]
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor([rows[-1][c] for c in key])
+        if len(fetched) != len(selected):
+            rows = [{c: row[c] for c in selected} for row in rows]
+        return rows, next_cursor
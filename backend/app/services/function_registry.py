@@ -0,0 +1,142 @@
+import copy
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Set, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+from app.core.database import settings
+from app.models.workflow import Workflow
+from app.services.execution_plan import ExecutionPlan, workflow_version
+
+
+@dataclass(frozen=True)
+class FunctionEntry:
+    id: str
+    name: str
+    project_id: Optional[str]
+    version: str
+    plan: ExecutionPlan
+    pure: bool = False  # function_start marked pure: results depend only on the arguments
+
+
+class FunctionRegistry:
+    """
+    Compiled `function` workflows for `subworkflow` nodes. A project's functions are
+    loaded in one query the first time any of them is called; edits evict entries.
+    """
+    _functions: Dict[str, FunctionEntry] = {}
+    _loaded_projects: Set[str] = set()
+    hits: int = 0
+    misses: int = 0
+
+    @classmethod
+    def _store(cls, workflow: Workflow) -> FunctionEntry:
+        plan = ExecutionPlan.compile({"nodes": workflow.nodes or [], "edges": workflow.edges or []})
+        start = plan.nodes.get(plan.start_id) if plan.start_id else None
+        entry = FunctionEntry(
+            id=str(workflow.id),
+            name=workflow.name,
+            project_id=str(workflow.project_id) if workflow.project_id else None,
+            version=workflow_version(workflow),
+            plan=plan,
+            pure=bool(start and start.type == 'function_start' and start.data.get('pure')),
+        )
+        cls._functions[entry.id] = entry
+        return entry
+
+    @classmethod
+    def lookup(cls, func_id: str) -> Optional[FunctionEntry]:
+        entry = cls._functions.get(str(func_id))
+        if entry is not None:
+            cls.hits += 1
+        return entry
+
+    @classmethod
+    def peek(cls, func_id: str) -> Optional[FunctionEntry]:
+        """Like `lookup`, without counting a hit (for scheduling decisions)."""
+        return cls._functions.get(str(func_id))
+
+    @classmethod
+    async def load(cls, db: AsyncSession, func_id: str, project_id: Optional[str] = None) -> Optional[FunctionEntry]:
+        """Cache miss path: preload the caller's project, then fall back to a single fetch."""
+        cls.misses += 1
+        if project_id and project_id not in cls._loaded_projects:
+            result = await db.execute(
+                select(Workflow).filter(Workflow.project_id == project_id, Workflow.category == 'function')
+            )
+            for workflow in result.scalars().all():
+                cls._store(workflow)
+            cls._loaded_projects.add(project_id)
+            entry = cls._functions.get(str(func_id))
+            if entry is not None:
+                return entry
+
+        result = await db.execute(select(Workflow).filter(Workflow.id == func_id))
+        workflow = result.scalars().first()
+        return cls._store(workflow) if workflow else None
+
+    @classmethod
+    def invalidate(cls, workflow_id: str):
+        cls._functions.pop(str(workflow_id), None)
+        PureFunctionCache.invalidate(workflow_id)
+
+    @classmethod
+    def clear(cls):
+        cls._functions = {}
+        cls._loaded_projects = set()
+        PureFunctionCache.clear()
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {"size": len(cls._functions), "hits": cls.hits, "misses": cls.misses}
+
+
+class PureFunctionCache:
+    """Bounded LRU/TTL cache of pure function results keyed by function, version and arguments."""
+    _results: "OrderedDict[Tuple[str, str, str], Tuple[float, Any]]" = OrderedDict()
+    hits: int = 0
+    misses: int = 0
+
+    @staticmethod
+    def key(func: FunctionEntry, func_args: Dict[str, Any]) -> Tuple[str, str, str]:
+        payload = json.dumps(func_args, sort_keys=True, default=str)
+        return (func.id, func.version, hashlib.sha1(payload.encode()).hexdigest())
+
+    @classmethod
+    def get(cls, key: Tuple[str, str, str]) -> Tuple[bool, Any]:
+        cached = cls._results.get(key)
+        if cached is None or cached[0] < time.monotonic():
+            if cached is not None:
+                del cls._results[key]
+            cls.misses += 1
+            return False, None
+        cls._results.move_to_end(key)
+        cls.hits += 1
+        # Callers may mutate what they get back
+        return True, copy.deepcopy(cached[1])
+
+    @classmethod
+    def put(cls, key: Tuple[str, str, str], result: Any):
+        cls._results[key] = (time.monotonic() + settings.PURE_FUNCTION_CACHE_TTL, copy.deepcopy(result))
+        cls._results.move_to_end(key)
+        while len(cls._results) > settings.PURE_FUNCTION_CACHE_SIZE:
+            cls._results.popitem(last=False)
+
+    @classmethod
+    def invalidate(cls, func_id: str):
+        func_id = str(func_id)
+        for key in [k for k in cls._results if k[0] == func_id]:
+            del cls._results[key]
+
+    @classmethod
+    def clear(cls):
+        cls._results = OrderedDict()
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {"size": len(cls._results), "hits": cls.hits, "misses": cls.misses}
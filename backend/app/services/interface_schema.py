@@ -0,0 +1,94 @@
+from typing import Any, Dict, List, Literal, Mapping, Optional, Tuple
+
+from pydantic import ConfigDict, Field, ValidationError, create_model
+from pydantic_core import SchemaError
+
+_SCALARS = {'string': str, 'number': float, 'integer': int, 'boolean': bool}
+
+
+def _enum_values(field: Mapping[str, Any], py_type) -> Tuple[Any, ...]:
+    raw = field.get('enum')
+    if isinstance(raw, str):
+        raw = [v.strip() for v in raw.split(',') if v.strip()]
+    if not raw:
+        return ()
+    try:
+        return tuple(py_type(v) for v in raw) if py_type in (int, float) else tuple(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"Enum values of '{field.get('name')}' don't match its type")
+
+
+def _field_type(field: Mapping[str, Any], path: str):
+    kind = field.get('type', 'string')
+    constraints: Dict[str, Any] = {}
+    if kind == 'object':
+        children = [c for c in field.get('children') or [] if c.get('name')]
+        return (_model(path, children) if children else Dict[str, Any]), constraints
+    if kind == 'array':
+        py_type = List[Any]
+    else:
+        py_type = _SCALARS.get(kind, Any)
+        values = _enum_values(field, py_type)
+        if values:
+            return Literal[values], constraints
+    if kind in ('string', 'array'):
+        if field.get('minLength') not in (None, ''): constraints['min_length'] = int(field['minLength'])
+        if field.get('maxLength') not in (None, ''): constraints['max_length'] = int(field['maxLength'])
+    if kind == 'string' and field.get('pattern'):
+        constraints['pattern'] = field['pattern']
+    if kind in ('number', 'integer'):
+        if field.get('minimum') not in (None, ''): constraints['ge'] = float(field['minimum'])
+        if field.get('maximum') not in (None, ''): constraints['le'] = float(field['maximum'])
+    return py_type, constraints
+
+
+def _model(name: str, fields: List[Mapping[str, Any]]) -> type:
+    definitions = {}
+    for i, field in enumerate(fields):
+        key = field.get('name')
+        if not key:
+            continue
+        py_type, constraints = _field_type(field, f"{name}_{key}")
+        # Positional attribute names with the field name as alias, so any key is allowed
+        if field.get('required'):
+            definitions[f"f{i}"] = (py_type, Field(alias=key, **constraints))
+        else:
+            definitions[f"f{i}"] = (Optional[py_type], Field(None, alias=key, **constraints))
+    return create_model(name, __config__=ConfigDict(extra='allow'), **definitions)
+
+
+class InterfaceValidator:
+    """
+    An interface node's `fields` compiled once into a pydantic model: types, nested
+    objects, enums, lengths, ranges and patterns. Extra keys are allowed.
+    """
+    __slots__ = ('mode', 'model', 'error')
+
+    def __init__(self, fields: List[Mapping[str, Any]], mode: str = 'body'):
+        self.mode = mode
+        self.model: Optional[type] = None
+        self.error: Optional[str] = None
+        try:
+            self.model = _model('Interface', [f for f in fields or [] if isinstance(f, Mapping)])
+        except (TypeError, ValueError, SchemaError) as e:
+            self.error = f"Invalid interface definition: {e}"
+
+    def validate(self, data: Any) -> Optional[Dict[str, Any]]:
+        """The error payload for invalid data, or None."""
+        if self.model is None:
+            return {"error": "Validation Failed", "missing": [], "detail": self.error, "errors": []}
+        try:
+            self.model.model_validate(data if isinstance(data, Mapping) else {})
+            return None
+        except ValidationError as e:
+            raw = e.errors(include_url=False)
+            errors = [{"loc": ".".join(str(p) for p in err["loc"]), "msg": err["msg"]} for err in raw]
+            missing = [out["loc"] for err, out in zip(raw, errors) if err["type"] == "missing"]
+            if missing:
+                detail = f"Missing required fields: {', '.join(missing)}"
+            else:
+                detail = "; ".join(f"{err['loc']}: {err['msg']}" for err in errors)
+            return {"error": "Validation Failed", "missing": missing, "detail": detail, "errors": errors}
+
+    def validate_request(self, input_data: Mapping[str, Any]) -> Optional[Dict[str, Any]]:
+        return self.validate(input_data.get(self.mode))
@@ -0,0 +1,115 @@
+from typing import Dict, Iterable, List, Tuple
+
+from app.services.request_log import LATENCY_BUCKETS_MS
+
+# Node handlers are mostly sub-millisecond; routes use the request-log buckets
+NODE_BUCKETS_MS: Tuple[float, ...] = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+
+class _Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'sum')
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value_ms: float):
+        # Non-cumulative counts; rendering accumulates them
+        for i, bound in enumerate(self.bounds):
+            if value_ms <= bound:
+                self.counts[i] += 1
+                break
+        self.total += 1
+        self.sum += value_ms
+
+
+def _label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(pairs: Iterable[Tuple[str, object]]) -> str:
+    return ','.join(f'{k}="{_label(v)}"' for k, v in pairs)
+
+
+class Metrics:
+    """
+    Per-process counters for the /metrics endpoint. Updates are plain attribute
+    writes from the event loop thread, so the hot path takes no locks.
+    """
+    routes: Dict[Tuple[str, str], _Histogram] = {}
+    nodes: Dict[str, _Histogram] = {}
+
+    @classmethod
+    def observe_route(cls, method: str, route: str, duration_ms: float):
+        hist = cls.routes.get((method, route))
+        if hist is None:
+            hist = cls.routes[(method, route)] = _Histogram(LATENCY_BUCKETS_MS)
+        hist.observe(duration_ms)
+
+    @classmethod
+    def observe_node(cls, node_type: str, duration_ms: float):
+        hist = cls.nodes.get(node_type)
+        if hist is None:
+            hist = cls.nodes[node_type] = _Histogram(NODE_BUCKETS_MS)
+        hist.observe(duration_ms)
+
+    @staticmethod
+    def _histogram(lines: List[str], name: str, labels: str, hist: _Histogram):
+        sep = ',' if labels else ''
+        cumulative = 0
+        for bound, count in zip(hist.bounds, hist.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{sep}le="{bound / 1000:g}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{{labels}{sep}le="+Inf"}} {hist.total}')
+        lines.append(f'{name}_sum{{{labels}}} {hist.sum / 1000:.6f}')
+        lines.append(f'{name}_count{{{labels}}} {hist.total}')
+
+    @classmethod
+    def render(cls, caches: Dict[str, Dict[str, int]], pools: Dict[str, object]) -> str:
+        """Prometheus text exposition format (0.0.4)."""
+        lines: List[str] = []
+
+        lines.append('# HELP workflow_route_duration_seconds Time spent in invoke_workflow per route.')
+        lines.append('# TYPE workflow_route_duration_seconds histogram')
+        for (method, route), hist in list(cls.routes.items()):
+            cls._histogram(lines, 'workflow_route_duration_seconds', _labels([('method', method), ('route', route)]), hist)
+
+        lines.append('# HELP workflow_node_duration_seconds Node handler execution time by node type.')
+        lines.append('# TYPE workflow_node_duration_seconds histogram')
+        for node_type, hist in list(cls.nodes.items()):
+            cls._histogram(lines, 'workflow_node_duration_seconds', _labels([('node_type', node_type)]), hist)
+
+        lines.append('# HELP workflow_cache_hits_total Cache hits by cache.')
+        lines.append('# TYPE workflow_cache_hits_total counter')
+        for name, stats in caches.items():
+            lines.append(f'workflow_cache_hits_total{{{_labels([("cache", name)])}}} {stats.get("hits", 0)}')
+        lines.append('# HELP workflow_cache_misses_total Cache misses by cache.')
+        lines.append('# TYPE workflow_cache_misses_total counter')
+        for name, stats in caches.items():
+            lines.append(f'workflow_cache_misses_total{{{_labels([("cache", name)])}}} {stats.get("misses", 0)}')
+        lines.append('# HELP workflow_cache_entries Entries currently held by each cache.')
+        lines.append('# TYPE workflow_cache_entries gauge')
+        for name, stats in caches.items():
+            lines.append(f'workflow_cache_entries{{{_labels([("cache", name)])}}} {stats.get("size", 0)}')
+
+        gauges = (
+            ('db_pool_size', 'size', 'Configured pool size.'),
+            ('db_pool_checked_out', 'checkedout', 'Connections currently checked out.'),
+            ('db_pool_checked_in', 'checkedin', 'Idle connections in the pool.'),
+            ('db_pool_overflow', 'overflow', 'Connections opened beyond the pool size.'),
+        )
+        for metric, method, help_text in gauges:
+            lines.append(f'# HELP {metric} {help_text}')
+            lines.append(f'# TYPE {metric} gauge')
+            for name, pool in pools.items():
+                # Only QueuePool-style pools report these; NullPool/StaticPool are skipped
+                reader = getattr(pool, method, None)
+                if callable(reader):
+                    value = reader()
+                    if method == 'overflow':
+                        value = max(value, 0)  # QueuePool counts down from -pool_size
+                    lines.append(f'{metric}{{{_labels([("engine", name)])}}} {value}')
+
+        return '\n'.join(lines) + '\n'
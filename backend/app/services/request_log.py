@@ -0,0 +1,263 @@
+import asyncio
+import bisect
+import time
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import SessionLocal, settings
+from app.models.workflow import RequestLog, RequestLogBucket
+
+# Upper bounds (ms) of the latency histogram; the last bucket catches everything slower
+LATENCY_BUCKETS_MS: Tuple[float, ...] = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+def latency_bucket(duration_ms: float) -> int:
+    return bisect.bisect_left(LATENCY_BUCKETS_MS, duration_ms)
+
+
+def histogram_percentile(histogram: Sequence[int], pct: float) -> Optional[float]:
+    """Estimate a percentile from bucket counts, interpolating inside the bucket it falls in."""
+    total = sum(histogram)
+    if not total:
+        return None
+    rank = pct / 100 * total
+    seen = 0
+    for i, count in enumerate(histogram):
+        if count and seen + count >= rank:
+            lower = LATENCY_BUCKETS_MS[i - 1] if i else 0.0
+            upper = LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else lower * 2
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return float(LATENCY_BUCKETS_MS[-1])
+
+
+@dataclass(frozen=True)
+class RequestRecord:
+    method: str
+    path: str
+    workflow_id: Optional[str]
+    user_id: Optional[str]
+    status_code: int
+    duration_ms: float
+    created_at: datetime
+
+
+class RequestLogWriter:
+    """
+    Invoke calls are queued in memory and written by a background task in
+    multi-row INSERTs, and folded into their per-minute rollups, so the request
+    path never waits on logging. When the queue is full new records are dropped.
+    """
+    _queue: Optional[asyncio.Queue] = None
+    _pending: List[RequestRecord] = []
+    dropped: int = 0
+    written: int = 0
+
+    @classmethod
+    def record(cls, method: str, path: str, workflow_id: Optional[str], user_id: Optional[str], status_code: int, duration_ms: float):
+        if cls._queue is None:
+            return
+        try:
+            cls._queue.put_nowait(RequestRecord(
+                method, path, workflow_id, user_id, status_code, duration_ms, datetime.now(timezone.utc),
+            ))
+        except asyncio.QueueFull:
+            cls.dropped += 1
+
+    @classmethod
+    def start(cls):
+        cls._queue = asyncio.Queue(maxsize=settings.REQUEST_LOG_QUEUE_SIZE)
+
+    @classmethod
+    async def run(cls):
+        while True:
+            cls._pending.append(await cls._queue.get())
+            # Give the batch a moment to fill up, then write everything queued
+            await asyncio.sleep(settings.REQUEST_LOG_FLUSH_SECONDS)
+            await cls.flush()
+
+    @classmethod
+    async def flush(cls):
+        """Write every queued record in chunks of REQUEST_LOG_BATCH_SIZE; also used on shutdown."""
+        while cls._queue is not None and (cls._pending or not cls._queue.empty()):
+            batch, cls._pending = cls._pending, []
+            while len(batch) < settings.REQUEST_LOG_BATCH_SIZE and not cls._queue.empty():
+                batch.append(cls._queue.get_nowait())
+            try:
+                await cls._write(batch)
+            except Exception as e:
+                print(f"Request log flush failed ({len(batch)} records dropped): {e}")
+
+    @classmethod
+    async def _write(cls, batch: List[RequestRecord]):
+        rows = [
+            {
+                "id": uuid.uuid4(),
+                "method": r.method,
+                "path": r.path,
+                "workflow_id": uuid.UUID(r.workflow_id) if r.workflow_id else None,
+                "user_id": r.user_id,
+                "status_code": r.status_code,
+                "duration_ms": r.duration_ms,
+                "created_at": r.created_at,
+            }
+            for r in batch
+        ]
+        buckets = cls._rollup(batch)
+        async with SessionLocal() as session:
+            # A list of parameter sets is sent as batched multi-row INSERTs
+            await session.execute(insert(RequestLog), rows)
+            if buckets:
+                upsert = _bucket_upsert(session.bind.dialect.name)
+                if upsert is not None:
+                    await session.execute(upsert, buckets)
+                else:
+                    await _merge_buckets(session, buckets)
+            await session.commit()
+        cls.written += len(batch)
+
+    @classmethod
+    async def run_pruner(cls):
+        while True:
+            try:
+                await cls.prune()
+            except Exception as e:
+                print(f"Request log pruning failed: {e}")
+            await asyncio.sleep(settings.REQUEST_LOG_PRUNE_SECONDS)
+
+    @staticmethod
+    async def prune():
+        """Delete raw logs and rollups older than their retention."""
+        now = datetime.now(timezone.utc)
+        async with SessionLocal() as session:
+            await session.execute(
+                delete(RequestLog).where(RequestLog.created_at < now - timedelta(days=settings.REQUEST_LOG_RETENTION_DAYS))
+            )
+            await session.execute(
+                delete(RequestLogBucket)
+                .where(RequestLogBucket.minute < now - timedelta(days=settings.REQUEST_LOG_ROLLUP_RETENTION_DAYS))
+            )
+            await session.commit()
+
+    @staticmethod
+    def _rollup(batch: List[RequestRecord]) -> List[Dict]:
+        buckets: Dict[tuple, Dict] = {}
+        for r in batch:
+            if not r.workflow_id:
+                continue  # unmatched paths have no owner, so no dashboard shows them
+            minute = r.created_at.replace(second=0, microsecond=0)
+            bucket = buckets.get((minute, r.workflow_id))
+            if bucket is None:
+                bucket = buckets[(minute, r.workflow_id)] = {
+                    "id": uuid.uuid4(),
+                    "minute": minute,
+                    "workflow_id": uuid.UUID(r.workflow_id),
+                    "user_id": r.user_id,
+                    "count": 0,
+                    "error_count": 0,
+                    "total_ms": 0.0,
+                    "max_ms": 0.0,
+                    "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+                }
+            bucket["count"] += 1
+            bucket["error_count"] += r.status_code >= 500
+            bucket["total_ms"] += r.duration_ms
+            bucket["max_ms"] = max(bucket["max_ms"], r.duration_ms)
+            bucket["histogram"][latency_bucket(r.duration_ms)] += 1
+        return list(buckets.values())
+
+
+def _bucket_upsert(dialect: str):
+    """
+    INSERT ... ON CONFLICT (minute, workflow_id) DO UPDATE that adds a flush's
+    rollups to the rows earlier flushes (from any worker) wrote for the same minute.
+    None for dialects without ON CONFLICT; those use `_merge_buckets`.
+    """
+    if dialect == 'postgresql':
+        stmt, json_array = postgresql.insert(RequestLogBucket), func.json_build_array
+    elif dialect == 'sqlite':
+        stmt, json_array = sqlite.insert(RequestLogBucket), func.json_array
+    else:
+        return None
+    row, new = RequestLogBucket.__table__.c, stmt.excluded
+    return stmt.on_conflict_do_update(
+        index_elements=[row.minute, row.workflow_id],
+        set_={
+            "count": row.count + new.count,
+            "error_count": row.error_count + new.error_count,
+            "total_ms": row.total_ms + new.total_ms,
+            "max_ms": case((new.max_ms > row.max_ms, new.max_ms), else_=row.max_ms),
+            "histogram": json_array(*(
+                row.histogram[i].as_integer() + new.histogram[i].as_integer()
+                for i in range(len(LATENCY_BUCKETS_MS) + 1)
+            )),
+        },
+    )
+
+
+async def _merge_buckets(session: AsyncSession, buckets: List[Dict]):
+    """Portable upsert: lock each existing rollup row, add to it, insert the rest."""
+    for bucket in buckets:
+        result = await session.execute(
+            select(RequestLogBucket)
+            .where(RequestLogBucket.minute == bucket["minute"], RequestLogBucket.workflow_id == bucket["workflow_id"])
+            .with_for_update()
+        )
+        row = result.scalars().first()
+        if row is None:
+            session.add(RequestLogBucket(**bucket))
+            continue
+        row.count += bucket["count"]
+        row.error_count += bucket["error_count"]
+        row.total_ms += bucket["total_ms"]
+        row.max_ms = max(row.max_ms, bucket["max_ms"])
+        histogram = list(row.histogram or [])
+        histogram += [0] * (len(bucket["histogram"]) - len(histogram))
+        row.histogram = [a + b for a, b in zip(histogram, bucket["histogram"])]
+    await session.flush()
+
+
+class RequestLogMiddleware:
+    """
+    Pure ASGI middleware that times calls under `prefix` and hands them to
+    RequestLogWriter once the response is sent. Every other request, including
+    streamed exports, passes straight through.
+    """
+
+    def __init__(self, app, prefix: str = "/api/v1/invoke"):
+        self.app = app
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.REQUEST_LOG_ENABLED or not scope["path"].startswith(self.prefix + "/"):
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        # invoke stores the matched route on request.state, which lives in this dict
+        state = scope.setdefault("state", {})
+
+        async def send_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_status)
+        finally:
+            RequestLogWriter.record(
+                scope["method"],
+                scope["path"][len(self.prefix):],
+                state.get("workflow_id"),
+                state.get("workflow_owner"),
+                status_code,
+                (time.perf_counter() - started) * 1000,
+            )
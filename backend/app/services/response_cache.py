@@ -0,0 +1,106 @@
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, Mapping, Optional, Tuple
+
+from app.core.database import settings
+
+
+def etag_for(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == '*':
+        return True
+    # Weak comparison, as RFC 9110 asks for If-None-Match
+    candidates = [tag.strip() for tag in if_none_match.split(',')]
+    return etag in candidates or f'W/{etag}' in candidates
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+    expires: float
+    body: bytes
+    etag: str
+
+
+class ResponseCache:
+    """
+    Rendered responses of `api` nodes that enable caching (`cacheTtl` seconds), in a
+    per-process LRU bounded by entry count and total bytes. The key holds the route's
+    version; any workflow change seen by the route table refresh (including function
+    edits made through another worker) clears the whole cache.
+    """
+    _entries: "OrderedDict[Tuple, CachedResponse]" = OrderedDict()
+    _bytes: int = 0
+    hits: int = 0
+    misses: int = 0
+
+    @staticmethod
+    def key(
+        workflow_id: str,
+        version: Optional[str],
+        method: str,
+        path: str,
+        query: Mapping[str, Any],
+        options: Mapping[str, Any],
+        authorization: Optional[str],
+    ) -> Tuple:
+        selected = options.get('cacheQuery')
+        if isinstance(selected, str):
+            selected = [name.strip() for name in selected.split(',') if name.strip()]
+        if selected is not None:
+            query = {name: query[name] for name in selected if name in query}
+        user = None
+        if options.get('cacheVaryUser'):
+            user = hashlib.sha1((authorization or '').encode()).hexdigest()
+        return (str(workflow_id), version, method, '/' + path.strip('/'), tuple(sorted(query.items())), user)
+
+    @classmethod
+    def get(cls, key: Tuple) -> Optional[CachedResponse]:
+        entry = cls._entries.get(key)
+        if entry is None or entry.expires < time.monotonic():
+            if entry is not None:
+                cls._remove(key)
+            cls.misses += 1
+            return None
+        cls._entries.move_to_end(key)
+        cls.hits += 1
+        return entry
+
+    @classmethod
+    def put(cls, key: Tuple, body: bytes, etag: str, ttl: float):
+        if len(body) > settings.RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            return
+        cls._remove(key)
+        cls._entries[key] = CachedResponse(time.monotonic() + ttl, body, etag)
+        cls._bytes += len(body)
+        while cls._entries and (
+            len(cls._entries) > settings.RESPONSE_CACHE_SIZE or cls._bytes > settings.RESPONSE_CACHE_MAX_BYTES
+        ):
+            cls._remove(next(iter(cls._entries)))
+
+    @classmethod
+    def _remove(cls, key: Tuple):
+        entry = cls._entries.pop(key, None)
+        if entry is not None:
+            cls._bytes -= len(entry.body)
+
+    @classmethod
+    def invalidate(cls, workflow_id: Any):
+        workflow_id = str(workflow_id)
+        for key in [k for k in cls._entries if k[0] == workflow_id]:
+            cls._remove(key)
+
+    @classmethod
+    def clear(cls):
+        cls._entries = OrderedDict()
+        cls._bytes = 0
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {"size": len(cls._entries), "bytes": cls._bytes, "hits": cls.hits, "misses": cls.misses}
@@ -0,0 +1,249 @@
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.future import select
+
+from app.core.database import SessionLocal, settings
+from app.models.workflow import Workflow
+from app.services.execution_plan import workflow_version
+
+
+@dataclass(frozen=True, eq=False)
+class RouteEntry:
+    """Snapshot of an `api` node and the workflow it belongs to."""
+    workflow_id: str
+    method: str
+    path: str
+    param_names: Tuple[str, ...]
+    nodes: List[Dict[str, Any]]
+    edges: List[Dict[str, Any]]
+    user_id: Optional[str] = None
+    project_id: Optional[str] = None
+    version: str = ""
+
+
+@dataclass
+class _TrieNode:
+    children: Dict[str, "_TrieNode"] = field(default_factory=dict)
+    param_child: Optional["_TrieNode"] = None
+    entries: List[RouteEntry] = field(default_factory=list)
+
+
+def split_path(path: str) -> List[str]:
+    return [p for p in (path or '').strip('/').split('/') if p]
+
+
+class RouteRegistry:
+    """
+    In-memory table of every `api` node, keyed by HTTP method and stored as a
+    segment trie so a lookup costs O(path length) and never touches the DB.
+    Other workers pick up changes through a periodic version check; this worker's
+    own edits are applied in place and don't count as a change.
+    """
+    _tries: Dict[str, _TrieNode] = {}
+    _by_workflow: Dict[str, List[Tuple[str, List[str], RouteEntry]]] = {}
+    _version: Optional[tuple] = None
+    _loaded: bool = False
+    _load_lock: Optional[asyncio.Lock] = None
+    # Workflow id -> (version, or None once deleted; created here) for edits made by this
+    # worker since `_version` was read
+    _local_edits: Dict[str, Tuple[Optional[str], bool]] = {}
+    _reload_listeners: List[Callable[[], None]] = []
+
+    @staticmethod
+    def _entries_for(workflow: Workflow) -> List[Tuple[str, List[str], RouteEntry]]:
+        nodes = [n for n in (workflow.nodes or []) if n]
+        edges = [e for e in (workflow.edges or []) if e]
+        routes = []
+        for node in nodes:
+            if node.get('type') != 'api':
+                continue
+            data = node.get('data', {})
+            method = data.get('method', 'GET').upper()
+            parts = split_path(data.get('path', '/'))
+            entry = RouteEntry(
+                workflow_id=str(workflow.id),
+                method=method,
+                path='/'.join(parts),
+                param_names=tuple(p[1:] for p in parts if p.startswith(':')),
+                nodes=nodes,
+                edges=edges,
+                user_id=workflow.user_id,
+                project_id=str(workflow.project_id) if workflow.project_id else None,
+                version=workflow_version(workflow),
+            )
+            routes.append((method, parts, entry))
+        return routes
+
+    @staticmethod
+    def _insert(tries: Dict[str, _TrieNode], method: str, parts: List[str], entry: RouteEntry):
+        node = tries.setdefault(method, _TrieNode())
+        for part in parts:
+            if part.startswith(':'):
+                if node.param_child is None:
+                    node.param_child = _TrieNode()
+                node = node.param_child
+            else:
+                node = node.children.setdefault(part, _TrieNode())
+        node.entries.append(entry)
+
+    @staticmethod
+    def _remove(tries: Dict[str, _TrieNode], method: str, parts: List[str], entry: RouteEntry):
+        node = tries.get(method)
+        for part in parts:
+            if node is None:
+                return
+            node = node.param_child if part.startswith(':') else node.children.get(part)
+        if node is not None and entry in node.entries:
+            node.entries.remove(entry)
+
+    @classmethod
+    async def load(cls):
+        """Rebuild the whole table from the DB and swap it in."""
+        async with SessionLocal() as db:
+            version = await cls._fetch_version(db)
+            result = await db.execute(select(Workflow).order_by(Workflow.created_at))
+            workflows = result.scalars().all()
+
+        tries: Dict[str, _TrieNode] = {}
+        by_workflow = {}
+        for workflow in workflows:
+            routes = cls._entries_for(workflow)
+            for method, parts, entry in routes:
+                cls._insert(tries, method, parts, entry)
+            if routes:
+                by_workflow[str(workflow.id)] = routes
+
+        cls._tries = tries
+        cls._by_workflow = by_workflow
+        cls._version = version
+        cls._local_edits = {}
+        cls._loaded = True
+
+    @classmethod
+    async def ensure_loaded(cls):
+        if cls._loaded:
+            return
+        # Concurrent first requests on a cold worker share one load
+        if cls._load_lock is None:
+            cls._load_lock = asyncio.Lock()
+        async with cls._load_lock:
+            if not cls._loaded:
+                await cls.load()
+
+    @classmethod
+    def register(cls, workflow: Workflow):
+        """Add or replace the routes of a workflow after it was created/updated."""
+        cls._remove_routes(str(workflow.id))
+        routes = cls._entries_for(workflow)
+        for method, parts, entry in routes:
+            cls._insert(cls._tries, method, parts, entry)
+        if routes:
+            cls._by_workflow[str(workflow.id)] = routes
+        # A workflow that was never updated was just created
+        created = cls._local_edits.get(str(workflow.id), (None, workflow.updated_at is None))[1]
+        cls._local_edits[str(workflow.id)] = (workflow_version(workflow), created)
+
+    @classmethod
+    def unregister(cls, workflow_id: str):
+        """Drop the routes of a deleted workflow."""
+        cls._remove_routes(str(workflow_id))
+        cls._local_edits[str(workflow_id)] = (None, cls._local_edits.get(str(workflow_id), (None, False))[1])
+
+    @classmethod
+    def _remove_routes(cls, workflow_id: str):
+        for method, parts, entry in cls._by_workflow.pop(workflow_id, []):
+            cls._remove(cls._tries, method, parts, entry)
+
+    @classmethod
+    def match(cls, method: str, path: str) -> Optional[Tuple[RouteEntry, Dict[str, str]]]:
+        root = cls._tries.get(method.upper())
+        if root is None:
+            return None
+        parts = split_path(path)
+        values: List[str] = []
+
+        # Static segments win over `:param` segments; backtrack only on a dead end.
+        def walk(node: _TrieNode, i: int) -> Optional[RouteEntry]:
+            if i == len(parts):
+                return node.entries[0] if node.entries else None
+            child = node.children.get(parts[i])
+            if child is not None:
+                found = walk(child, i + 1)
+                if found:
+                    return found
+            if node.param_child is not None:
+                values.append(parts[i])
+                found = walk(node.param_child, i + 1)
+                if found:
+                    return found
+                values.pop()
+            return None
+
+        entry = walk(root, 0)
+        if entry is None:
+            return None
+        return entry, dict(zip(entry.param_names, values))
+
+    @staticmethod
+    async def _fetch_version(db) -> tuple:
+        result = await db.execute(
+            select(func.count(Workflow.id), func.max(func.coalesce(Workflow.updated_at, Workflow.created_at)))
+        )
+        count, latest = result.one()
+        return (count, latest)
+
+    @classmethod
+    def add_reload_listener(cls, listener: Callable[[], None]):
+        """Called when another worker's edit is detected, so dependent caches can drop entries."""
+        cls._reload_listeners.append(listener)
+
+    @classmethod
+    async def _only_local_edits(cls, db, version: tuple) -> bool:
+        """Whether the DB moved from `_version` to `version` through this worker's edits alone."""
+        if not cls._local_edits or cls._version is None:
+            return False
+        count, latest = cls._version
+        stamp = func.coalesce(Workflow.updated_at, Workflow.created_at)
+        query = select(Workflow.id, Workflow.created_at, Workflow.updated_at)
+        if latest is not None:
+            # >= because some databases keep whole seconds only
+            query = query.where(stamp >= latest)
+        for workflow in (await db.execute(query)).all():
+            edit = cls._local_edits.get(str(workflow.id))
+            if edit is None:
+                if (workflow.updated_at or workflow.created_at) == latest:
+                    continue  # already counted when `_version` was read
+                return False
+            if edit[0] != workflow_version(workflow):
+                return False
+        created = sum(1 for v, new in cls._local_edits.values() if new and v is not None)
+        deleted = sum(1 for v, new in cls._local_edits.values() if not new and v is None)
+        return version[0] == count + created - deleted
+
+    @classmethod
+    async def refresh_if_stale(cls):
+        async with SessionLocal() as db:
+            version = await cls._fetch_version(db)
+            if version == cls._version:
+                return
+            if await cls._only_local_edits(db, version):
+                # Already applied in place, and the caches were invalidated by the edit itself
+                cls._version = version
+                cls._local_edits = {}
+                return
+        await cls.load()
+        for listener in cls._reload_listeners:
+            listener()
+
+    @classmethod
+    async def run_refresher(cls):
+        # Background loop so workers notice edits made through other processes
+        while True:
+            await asyncio.sleep(settings.ROUTE_TABLE_REFRESH_SECONDS)
+            try:
+                await cls.refresh_if_stale()
+            except Exception as e:
+                print(f"Route table refresh failed: {e}")
@@ -0,0 +1,67 @@
+import asyncio
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.ext.asyncio.result import AsyncMappingResult
+
+
+class LazyRows:
+    """
+    Rows of a `stream` database read, fetched from a server-side cursor `yield_per`
+    rows at a time. Loop nodes pull one row per iteration, so only the current
+    batch is ever held in memory. A stream can be consumed once; it owns its own
+    session, which is closed when the rows run out or the run ends.
+    """
+    __slots__ = ('_session', '_result', '_rows', '_all', '_all_lock', 'consumed', 'closed')
+
+    def __init__(self, session: AsyncSession, result: AsyncMappingResult):
+        self._session = session
+        self._result = result
+        self._rows = result.__aiter__()
+        self._all: Optional[List[Dict[str, Any]]] = None
+        self._all_lock = asyncio.Lock()
+        self.consumed = 0
+        self.closed = False
+
+    async def next(self) -> Tuple[bool, Dict[str, Any]]:
+        if self.closed:
+            return False, None
+        try:
+            row = await self._rows.__anext__()
+        except StopAsyncIteration:
+            await self.aclose()
+            return False, None
+        self.consumed += 1
+        return True, dict(row)
+
+    async def all(self) -> List[Dict[str, Any]]:
+        """
+        The rows not read yet, as a list, for consumers that need every row at once.
+        Read once; nodes running side by side on the same stream get the same list.
+        """
+        async with self._all_lock:
+            if self._all is None:
+                self._all = [row async for row in self]
+        return self._all
+
+    async def aclose(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            await self._result.close()
+        finally:
+            await self._session.close()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        found, row = await self.next()
+        if not found:
+            raise StopAsyncIteration
+        return row
+
+    def __repr__(self):
+        state = "closed" if self.closed else "open"
+        return f"<LazyRows {state}, {self.consumed} rows read>"
@@ -0,0 +1,339 @@
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Dict, FrozenSet, List, Mapping, NamedTuple, Optional, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+# `{var}` / `{$var}` everywhere, bare `$var` only where a node supports it (response bodies)
+_BRACE_REF = r'\{\$?([^{}\s"$]+)\}'
+_DOLLAR_REF = r'\$([A-Za-z_]\w*)'
+_BRACE_PATTERN = re.compile(_BRACE_REF)
+_ANY_PATTERN = re.compile(f'{_BRACE_REF}|{_DOLLAR_REF}')
+
+# Private-use code points used to mark references while parsing JSON bodies
+_MARK_OPEN, _MARK_CLOSE = '\ue000', '\ue001'
+_MARK_PATTERN = re.compile(f'{_MARK_OPEN}(\\d+){_MARK_CLOSE}')
+
+Ref = Tuple[str, str]  # (context key, original placeholder text)
+
+
+def json_text(value: Any) -> str:
+    if isinstance(value, (dict, list)):
+        return json.dumps(value)
+    return str(value)
+
+
+class Template:
+    """A string parsed once into literal chunks and context references."""
+    __slots__ = ('source', 'parts', 'refs')
+
+    def __init__(self, source: str, bare_dollar: bool = False):
+        pattern = _ANY_PATTERN if bare_dollar else _BRACE_PATTERN
+        parts: List[Union[str, Ref]] = []
+        pos = 0
+        for m in pattern.finditer(source):
+            if m.start() > pos:
+                parts.append(source[pos:m.start()])
+            parts.append((m.group(1) or m.group(2), m.group(0)))
+            pos = m.end()
+        if pos < len(source):
+            parts.append(source[pos:])
+        self.source = source
+        self.parts = tuple(parts)
+        self.refs = tuple(p for p in parts if isinstance(p, tuple))
+
+    def render(self, context: Mapping[str, Any], encode: Callable[[Any], str] = str) -> str:
+        if not self.refs:
+            return self.source
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            elif part[0] in context:
+                out.append(encode(context[part[0]]))
+            else:
+                out.append(part[1])
+        return ''.join(out)
+
+    def resolve(self, context: Mapping[str, Any]) -> Any:
+        """A lone `{var}` yields the raw context value; anything else renders to text."""
+        if len(self.parts) == 1 and self.refs:
+            return context.get(self.refs[0][0], self.source)
+        return self.render(context)
+
+
+@lru_cache(maxsize=2048)
+def compile_template(source: str, bare_dollar: bool = False) -> Template:
+    return Template(source, bare_dollar)
+
+
+class JsonTemplate:
+    """
+    JSON body with placeholders. When the body is valid JSON once references are
+    taken as values, it is kept as a tree and rendered straight to Python objects;
+    otherwise it falls back to text substitution followed by `json.loads`.
+    """
+    __slots__ = ('text', 'tree')
+
+    def __init__(self, source: str, bare_dollar: bool = False):
+        self.text = Template(source, bare_dollar)
+        self.tree = self._build_tree() if self.text.refs else None
+
+    def _build_tree(self):
+        chunks = []
+        refs = []
+        in_string = escaped = False
+        for part in self.text.parts:
+            if isinstance(part, str):
+                for ch in part:
+                    if escaped:
+                        escaped = False
+                    elif ch == '\\':
+                        escaped = in_string
+                    elif ch == '"':
+                        in_string = not in_string
+                chunks.append(part)
+            else:
+                marker = f'{_MARK_OPEN}{len(refs)}{_MARK_CLOSE}'
+                chunks.append(marker if in_string else f'"{marker}"')
+                refs.append((part, not in_string))
+        try:
+            parsed = json.loads(''.join(chunks))
+        except ValueError:
+            return None
+        return _compile_tree(parsed, refs)
+
+    def render(self, context: Mapping[str, Any]) -> Any:
+        if self.tree is not None:
+            try:
+                return self.tree(context)
+            except _MissingRef:
+                pass
+        final_body = self.text.render(context, json_text)
+        try:
+            return json.loads(final_body)
+        except ValueError:
+            return final_body
+
+
+class _MissingRef(Exception):
+    pass
+
+
+def _value_ref(name: str):
+    def render(context):
+        if name not in context:
+            raise _MissingRef(name)
+        value = context[name]
+        if isinstance(value, (dict, list, int, float)) and not isinstance(value, bool):
+            return value
+        # Scalars keep their old text-substitution meaning ("12" -> 12)
+        if isinstance(value, str):
+            try:
+                return json.loads(value)
+            except ValueError:
+                return value
+        return value
+    return render
+
+
+def _compile_tree(obj, refs, as_text=False):
+    if isinstance(obj, str):
+        pieces = _MARK_PATTERN.split(obj)
+        if len(pieces) == 1:
+            return lambda context: obj
+        if not as_text and len(pieces) == 3 and not pieces[0] and not pieces[2] and refs[int(pieces[1])][1]:
+            return _value_ref(refs[int(pieces[1])][0][0])
+        # Odd positions are reference indexes, even positions literal text
+        parts = tuple(refs[int(p)][0] if i % 2 else p for i, p in enumerate(pieces) if p or i % 2)
+
+        def render_text(context):
+            return ''.join(
+                p if isinstance(p, str) else (json_text(context[p[0]]) if p[0] in context else p[1])
+                for p in parts
+            )
+        return render_text
+    if isinstance(obj, dict):
+        items = tuple((_compile_tree(k, refs, as_text=True), _compile_tree(v, refs)) for k, v in obj.items())
+        return lambda context: {k(context): v(context) for k, v in items}
+    if isinstance(obj, list):
+        items = tuple(_compile_tree(v, refs) for v in obj)
+        return lambda context: [v(context) for v in items]
+    return lambda context: obj
+
+
+_SQL_QUOTED = re.compile(r"'(?:[^']|'')*'")
+_SQL_IDENT = re.compile(r'^[A-Za-z_]\w*(\.[A-Za-z_]\w*)?$')
+_VAR_NAME = re.compile(r'^[A-Za-z_]\w*$')
+_TRUE_WORDS = {'1', 'true', 'yes', 'on'}
+_CASTS = ('int', 'float', 'bool', 'str', 'json', 'ident')
+
+
+def _cast_sql_value(value: Any, cast: Optional[str]) -> Any:
+    if cast is None:
+        if isinstance(value, (dict, list)):
+            return json.dumps(value)
+        return value
+    if cast == 'str':
+        return json_text(value)
+    if cast == 'int':
+        try:
+            return int(value)
+        except ValueError:
+            return int(float(value))
+    if cast == 'float':
+        return float(value)
+    if cast == 'bool':
+        return value if isinstance(value, bool) else str(value).strip().lower() in _TRUE_WORDS
+    if cast == 'json':
+        return json.dumps(value)
+    raise ValueError(f"Unknown placeholder cast '{cast}'")
+
+
+def _split_cast(placeholder: str) -> Tuple[str, Optional[str]]:
+    if ':' in placeholder and placeholder.rsplit(':', 1)[1] in _CASTS:
+        name, cast = placeholder.rsplit(':', 1)
+        return name, cast
+    return placeholder, None
+
+
+class _Quoted(NamedTuple):
+    """A string literal with placeholders: literal text chunks and (context key, bind name, placeholder) refs."""
+    segments: Tuple[Union[str, Tuple[str, str, str]], ...]
+    names: FrozenSet[str]
+    before_cast: bool  # followed by `::type`
+
+    def sql(self, context: Optional[Mapping[str, Any]] = None) -> str:
+        # Refs missing from `context` stay in the literal as their placeholder text
+        pieces: List[str] = []  # literal bodies, and bind markers starting with ':'
+        text_run = ''
+        for segment in self.segments:
+            if isinstance(segment, tuple) and (context is None or segment[0] in context):
+                if text_run:
+                    pieces.append(text_run)
+                    text_run = ''
+                pieces.append(':' + segment[1])
+            else:
+                text_run += segment if isinstance(segment, str) else segment[2]
+        if text_run or not pieces:
+            pieces.append(text_run)
+        sql = [p if p.startswith(':') else f"'{p}'" for p in pieces]
+        if len(sql) > 1:
+            return '(' + ' || '.join(sql) + ')'
+        if sql[0].startswith(':') and self.before_cast:
+            # `'{x}'::type` converts text the way the literal would have been
+            return f"CAST({sql[0]} AS TEXT)"
+        return sql[0]
+
+
+class SqlTemplate:
+    """
+    SQL with `{var}` placeholders compiled once into bind parameters, so the statement
+    text stays the same for every value and the driver can reuse its prepared plan.
+
+    - `{var}` binds the raw context value (dicts and lists as JSON; text stays text)
+    - `{var:int}`, `:float`, `:bool`, `:str`, `:json` convert the value first, e.g. a
+      numeric path or query param compared with a number column needs `{id:int}`
+    - inside a quoted literal, `'%{q}%'` becomes `('%' || :_p0 || '%')` and `'{d}'::date`
+      becomes `CAST(:_p0 AS TEXT)::date`; quoted placeholders always bind text
+    - `{var:ident}` splices a validated, quoted identifier (table or column name)
+
+    Brace text in a literal that isn't a variable name (`'{a,b}'`), or whose variable
+    is missing from the context, is left in the literal as written.
+    """
+    __slots__ = ('source', 'parts', 'binds', 'names', 'quoted_names', 'statement')
+
+    def __init__(self, source: str):
+        binds: Dict[Tuple[str, Optional[str]], Tuple[str, str]] = {}
+        # SQL text chunks, (context key, placeholder) identifiers and quoted literals
+        parts: List[Union[str, Ref, _Quoted]] = []
+
+        def bind(name: str, cast: Optional[str], placeholder: str) -> str:
+            key = (name, cast)
+            if key not in binds:
+                binds[key] = (f"_p{len(binds)}", placeholder)
+            return binds[key][0]
+
+        pos = 0
+        for quoted in _SQL_QUOTED.finditer(source):
+            self._outside(source[pos:quoted.start()], parts, bind)
+            literal = quoted.group(0)
+            segments: List[Union[str, Tuple[str, str, str]]] = []
+            lpos = 0
+            body = literal[1:-1]
+            for m in _BRACE_PATTERN.finditer(body):
+                name = _split_cast(m.group(1))[0]
+                if not _VAR_NAME.match(name):
+                    continue  # array literals and the like
+                if m.start() > lpos:
+                    segments.append(body[lpos:m.start()])
+                # Concatenated into a string literal: always bound as text
+                segments.append((name, bind(name, 'str', m.group(0)), m.group(0)))
+                lpos = m.end()
+            if lpos == 0:
+                parts.append(literal)
+            else:
+                if lpos < len(body):
+                    segments.append(body[lpos:])
+                names = frozenset(s[0] for s in segments if isinstance(s, tuple))
+                parts.append(_Quoted(tuple(segments), names, source.startswith('::', quoted.end())))
+            pos = quoted.end()
+        self._outside(source[pos:], parts, bind)
+
+        self.source = source
+        self.parts = tuple(parts)
+        self.binds = tuple((bind_name, name, cast, placeholder) for (name, cast), (bind_name, placeholder) in binds.items())
+        idents = [p[0] for p in parts if type(p) is tuple]
+        self.names = frozenset([name for name, _ in binds] + idents)  # context keys read
+        self.quoted_names = frozenset().union(*(p.names for p in parts if isinstance(p, _Quoted)))
+        self.statement: Optional[TextClause] = None if idents else text(self._sql())
+
+    @staticmethod
+    def _outside(chunk: str, parts: List, bind):
+        pos = 0
+        for m in _BRACE_PATTERN.finditer(chunk):
+            if m.start() > pos:
+                parts.append(chunk[pos:m.start()])
+            name, cast = _split_cast(m.group(1))
+            if cast == 'ident':
+                parts.append((name, m.group(0)))
+            elif chunk.startswith('::', m.end()):
+                # `:_p0::int` would parse as a bind named `_p`
+                parts.append(f"(:{bind(name, cast, m.group(0))})")
+            else:
+                parts.append(':' + bind(name, cast, m.group(0)))
+            pos = m.end()
+        if pos < len(chunk):
+            parts.append(chunk[pos:])
+
+    def _sql(self, context: Optional[Mapping[str, Any]] = None) -> str:
+        sql = []
+        for part in self.parts:
+            if isinstance(part, str):
+                sql.append(part)
+            elif isinstance(part, _Quoted):
+                sql.append(part.sql(context))
+            else:
+                value = str(context.get(part[0], ''))
+                if not _SQL_IDENT.match(value):
+                    raise ValueError(f"Invalid identifier for {part[1]}: {value!r}")
+                sql.append('.'.join(f'"{piece}"' for piece in value.split('.')))
+        return ''.join(sql)
+
+    def render(self, context: Mapping[str, Any]) -> Tuple[TextClause, Dict[str, Any]]:
+        params = {}
+        for bind_name, name, cast, placeholder in self.binds:
+            if name in context:
+                params[bind_name] = _cast_sql_value(context[name], cast)
+            else:
+                params[bind_name] = placeholder
+        if self.statement is not None and all(name in context for name in self.quoted_names):
+            return self.statement, params
+        return text(self._sql(context)), params
+
+
+@lru_cache(maxsize=1024)
+def compile_sql(source: str) -> SqlTemplate:
+    return SqlTemplate(source)
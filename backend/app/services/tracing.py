@@ -0,0 +1,157 @@
+import enum
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+
+class TraceLevel(enum.IntEnum):
+    OFF = 0
+    SUMMARY = 1  # node steps, row counts and errors
+    DEBUG = 2  # everything, including resolved values and response bodies
+
+    @classmethod
+    def parse(cls, value: Any) -> "TraceLevel":
+        if isinstance(value, cls):
+            return value
+        try:
+            return cls[str(value).strip().upper()]
+        except KeyError:
+            return cls.OFF
+
+
+def _format(message: str, args: Tuple[Any, ...]) -> str:
+    return message % args if args else message
+
+
+class TraceRecorder:
+    """
+    Execution log of one workflow run. SUMMARY keeps the last `capacity` entries and
+    formats them only when read; DEBUG keeps every entry, formatted as it is recorded.
+    """
+    __slots__ = ('level', '_entries')
+
+    def __init__(self, level: Union[TraceLevel, str] = TraceLevel.DEBUG, capacity: int = 200):
+        self.level = TraceLevel.parse(level)
+        self._entries: deque = deque(maxlen=None if self.level >= TraceLevel.DEBUG else capacity)
+
+    @property
+    def enabled(self) -> bool:
+        return self.level > TraceLevel.OFF
+
+    @property
+    def debug_enabled(self) -> bool:
+        return self.level >= TraceLevel.DEBUG
+
+    def summary(self, message: str, *args: Any):
+        if self.level >= TraceLevel.DEBUG:
+            self._entries.append(_format(message, args))
+        elif self.level:
+            self._entries.append((message, args))
+
+    def debug(self, message: str, *args: Any):
+        if self.level >= TraceLevel.DEBUG:
+            self._entries.append(_format(message, args))
+
+    def lines(self) -> List[str]:
+        return [e if isinstance(e, str) else _format(*e) for e in self._entries]
+
+
+class ExecutionHooks:
+    """Callbacks around every node execution. The executor skips them entirely when none are set."""
+
+    def node_started(self, node) -> Any:
+        return None
+
+    def node_finished(self, node, token: Any, writes: Dict[str, Any], error: Optional[BaseException]):
+        pass
+
+
+# Span of the node running in the current task; database nodes add their query time to it
+_current_span: ContextVar[Optional["Span"]] = ContextVar('_current_span', default=None)
+
+
+@dataclass(eq=False)
+class Span:
+    node_id: str
+    node_type: str
+    stack: Tuple[str, ...]  # frames from the outermost workflow down to this node
+    parent: Optional["Span"]
+    start_ms: float
+    wall_ms: float = 0.0
+    child_ms: float = 0.0  # wall time of nested spans (function calls)
+    db_ms: float = 0.0
+    bytes: int = 0  # JSON size of the context values the node wrote
+    queries: List[Tuple[Any, Dict[str, Any], Optional[str]]] = field(default_factory=list)  # (statement, bind params, connection id)
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "node_id": self.node_id,
+            "type": self.node_type,
+            "stack": ";".join(self.stack),
+            "start_ms": round(self.start_ms, 3),
+            "wall_ms": round(self.wall_ms, 3),
+            "self_ms": round(self.wall_ms - self.child_ms, 3),
+            "db_ms": round(self.db_ms, 3),
+            "bytes": self.bytes,
+            "error": self.error,
+        }
+
+
+def record_db_time(started: float, statement: Any, params: Dict[str, Any], connection_id: Optional[str] = None):
+    span = _current_span.get()
+    if span is not None:
+        span.db_ms += (time.perf_counter() - started) * 1000
+        span.queries.append((statement, params, connection_id))
+
+
+def _json_size(values: Dict[str, Any]) -> int:
+    size = 0
+    for value in values.values():
+        try:
+            size += len(json.dumps(value, default=str))
+        except (TypeError, ValueError):
+            pass
+    return size
+
+
+class SpanRecorder(ExecutionHooks):
+    """Records a timing span for every node, including nodes of called functions."""
+
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._origin = time.perf_counter()
+
+    def node_started(self, node):
+        parent = _current_span.get()
+        frame = f"{node.type}:{node.id}"
+        span = Span(
+            node_id=node.id,
+            node_type=node.type,
+            stack=(parent.stack if parent else ()) + (frame,),
+            parent=parent,
+            start_ms=(time.perf_counter() - self._origin) * 1000,
+        )
+        self.spans.append(span)
+        return span, _current_span.set(span)
+
+    def node_finished(self, node, token, writes, error):
+        span, reset_token = token
+        span.wall_ms = (time.perf_counter() - self._origin) * 1000 - span.start_ms
+        span.bytes = _json_size(writes)
+        if error is not None:
+            span.error = str(error)
+        if span.parent is not None:
+            span.parent.child_ms += span.wall_ms
+        _current_span.reset(reset_token)
+
+    def folded(self) -> List[str]:
+        """Collapsed stacks with self time in microseconds, as flame graph tools expect."""
+        totals: Dict[str, int] = {}
+        for span in self.spans:
+            key = ";".join(span.stack)
+            totals[key] = totals.get(key, 0) + int((span.wall_ms - span.child_ms) * 1000)
+        return [f"{stack} {micros}" for stack, micros in totals.items()]
@@ -1,12 +1,25 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+from collections import ChainMap
+from contextvars import ContextVar
 import json
 import asyncio
 import os
+import time
 import uuid
 import datetime
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 import aiofiles
+from app.core.database import settings
+from app.services.aggregation import aggregate
+from app.services.code_runner import CodeExecutionPool, run_inline
+from app.services.templates import compile_template
+from app.services.function_registry import FunctionRegistry, PureFunctionCache
+from app.services.metrics import Metrics
+from app.services.row_stream import LazyRows
+from app.services.db_session import InvocationSession
+from app.services.external_db import ExternalDbService
+from app.services.tracing import ExecutionHooks, TraceLevel, TraceRecorder, record_db_time
+from app.services.execution_plan import ExecutionPlan, PlanNode, BRANCHING_TYPES, TERMINAL_TYPES, call_access
 
 class StandardLibrary:
     @staticmethod
@@ -30,61 +43,57 @@ class StandardLibrary:
         if hasattr(l, '__len__'): return len(l)
         return 0
 
+# Set inside tasks that run alongside other nodes of the same batch
+_in_concurrent_batch: ContextVar[bool] = ContextVar('_in_concurrent_batch', default=False)
+
+async def _aiter(items):
+    for item in items:
+        yield item
+
 class WorkflowExecutor:
-    def __init__(self, workflow_data: Dict[str, Any], db_session: AsyncSession = None):
-        self.nodes = {node['id']: node for node in workflow_data.get('nodes', [])}
-        self.edges = workflow_data.get('edges', [])
-        self.adjacency = {}
-        for edge in self.edges:
-            source = edge['source']
-            target = edge['target']
-            handle = edge.get('sourceHandle')
-            
-            if source not in self.adjacency:
-                self.adjacency[source] = []
-            self.adjacency[source].append({'target': target, 'handle': handle})
-            
+    def __init__(self, workflow_data: Dict[str, Any] = None, db_session: AsyncSession = None, plan: ExecutionPlan = None, project_id: str = None, trace: TraceRecorder = None, hooks: Tuple[ExecutionHooks, ...] = (), owner_id: str = None):
+        # Prefer a cached plan (see PlanCache); compiling here keeps ad-hoc callers working
+        self.plan = plan or ExecutionPlan.compile(workflow_data or {})
         self.context = {} 
-        self.execution_log = []
-        self.db = db_session
+        self.trace = trace or TraceRecorder(TraceLevel.DEBUG)
+        self.hooks = tuple(hooks)
+        # Opened lazily; sub-executors share their caller's session and transaction
+        self.session = InvocationSession(db_session)
+        self._owns_session = True
+        # Sessions on user-configured databases, by DatabaseConnection id
+        self._external: Dict[str, InvocationSession] = {}
+        self.project_id = project_id
+        self.owner_id = owner_id  # database nodes may only use this user's connections
+        self._streams: List[LazyRows] = []
+        self._stop: Optional[str] = None  # map node whose body this executor runs for one item
 
     async def run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            result = await self._run(input_data)
+            if self._owns_session:
+                result = await self._finish_transaction(result)
+            return result
+        finally:
+            # Streamed reads hold a connection until they are drained or the run ends
+            for rows in self._streams:
+                await rows.aclose()
+            if self._owns_session:
+                await self.session.close()
+                for session in self._external.values():
+                    await session.close()
+
+    async def _run(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        plan = self.plan
+
         # 1. Initialize Variables
-        for node_id, node in self.nodes.items():
-            if node['type'] == 'variable':
-                await self.execute_node(node)
+        for node_id in plan.variable_ids:
+            await self.execute_node(plan.nodes[node_id])
                 
-        # Find start node
-        start_node = None
-        
-        # Priority 1: Look for function_start node (for reusable functions)
-        for node_id, node in self.nodes.items():
-            if node['type'] == 'function_start':
-                start_node = node
-                break
-        
-        # Priority 2: Look for api node (for routes)
-        if not start_node:
-            for node_id, node in self.nodes.items():
-                if node['type'] == 'api':
-                    start_node = node
-                    break
-        
-        # Priority 3: Fallback - find node with no incoming edges
-        if not start_node:
-            incoming = set()
-            for edge in self.edges:
-                incoming.add(edge['target'])
-            
-            for node_id, node in self.nodes.items():
-                if node_id not in incoming and node['type'] != 'variable':
-                    start_node = node
-                    break
-                    
-        if not start_node:
+        if not plan.start_id:
             return {"error": "No Entry Point found (Add API Node or Function Start Node)"}
+        start_node = plan.nodes[plan.start_id]
 
-        self.execution_log.append(f"Started execution at {start_node['data'].get('label', 'API Entry')}")
+        self.trace.summary("Started execution at %s", start_node.data.get('label', 'API Entry'))
         
         # Context Init
         self.context['request'] = input_data
@@ -97,485 +106,779 @@ class WorkflowExecutor:
         if input_data.get('user'):
             self.context['user'] = input_data['user']
         
-        # Traverse
-        current_nodes = [start_node['id']]
-        entry_count = 0 
-        
-        while current_nodes and entry_count < 1000:
-            entry_count += 1
-            next_layer = []
-            
-            for node_id in current_nodes:
-                node = self.nodes[node_id]
-                node_type = node['type']
-                self.execution_log.append(f"Executing Node: {node_type} ({node_id})")
+        return self._result(**await self._traverse([start_node.id], settings.WORKFLOW_MAX_STEPS))
 
-                try:
-                    res = await self.execute_node(node)
-                    
+    async def _traverse(self, ready: List[str], budget: int) -> Dict[str, Any]:
+        # Ready queue of activated nodes; joins wait for every incoming branch.
+        # Loop iterations add to the step budget, so it grows with the collection.
+        plan = self.plan
+        self._arrivals: Dict[str, List[bool]] = {}
+        self._semaphore = asyncio.Semaphore(settings.WORKFLOW_MAX_CONCURRENCY)
+        self._budget = budget
+        steps = 0
+
+        while True:
+            if not ready:
+                ready = self._release_waiting_joins()
+                if not ready:
+                    break
+            if steps >= self._budget:
+                self.trace.summary("Step budget of %d exhausted", self._budget)
+                return {"status": "error", "error": f"Workflow exceeded its step budget ({self._budget} steps)"}
+            steps += 1
+            wave = [plan.nodes[node_id] for node_id in dict.fromkeys(ready)]
+            ready = []
+            if len(wave) > 1:
+                # Functions called side by side are loaded first, so their plans can tell
+                # the scheduler whether the calls may run concurrently
+                for node in wave:
+                    if node.type == 'subworkflow' and node.data.get('functionId') \
+                            and FunctionRegistry.peek(node.data['functionId']) is None:
+                        await self._function(node.data['functionId'])
+
+            for batch in self._batches(wave):
+                results = await self._run_batch(batch)
+
+                for node, res in results:
+                    if isinstance(res, Exception):
+                        self.trace.summary("Error executing node %s: %s", node.id, res)
+                        return {"status": "error", "error": str(res)}
                     if res and res.get('type') == 'response':
-                        return {
-                            "status": "success",
-                            "response": res.get('data'),
-                            "logs": self.execution_log,
-                            "context": self.context
-                        }
-                    
-                    node_result = None
-                    if res and res.get('type') in ['logic', 'loop']:
-                        node_result = res.get('result')
+                        if res.get('status_code'):
+                            return {"status": "success", "response": res.get('data'), "status_code": res['status_code']}
+                        return {"status": "success", "response": res.get('data')}
 
-                except Exception as e:
-                    self.execution_log.append(f"Error executing node {node_id}: {str(e)}")
-                    return {
-                        "status": "error",
-                        "error": str(e),
-                        "logs": self.execution_log
-                    }
-
-                if node_id in self.adjacency:
-                    edges = self.adjacency[node_id]
-                    for edge in edges:
-                        target_id = edge['target']
-                        handle = edge['handle']
-                        
-                        if node_type == 'logic':
-                            if node_result is True and handle == 'true': next_layer.append(target_id)
-                            elif node_result is False and handle == 'false': next_layer.append(target_id)
-                        elif node_type == 'loop':
-                            if node_result == 'do' and handle == 'do': next_layer.append(target_id)
-                            elif node_result == 'done' and handle == 'done': next_layer.append(target_id)
-                        else:
-                            next_layer.append(target_id)
-            
-            current_nodes = list(set(next_layer))
+                for node, res in results:
+                    node_result = res.get('result') if res and res.get('type') in BRANCHING_TYPES else None
+                    chosen = node.next_ids(node_result)
+                    for target in chosen:
+                        self._signal(node.id, target, True, ready)
+                    if node.type == 'logic':
+                        # Tell joins behind the branch not taken not to wait for it
+                        for target in node.targets:
+                            if target not in chosen:
+                                self._signal(node.id, target, False, ready)
         
-        return {
-            "status": "success",
-            "message": "Workflow completed",
-            "logs": self.execution_log,
-            "context": self.context
-        }
-
-    def _resolve_val(self, val):
-        if not isinstance(val, str): return val
-        if val.startswith('{') and val.endswith('}') and val.count('{') == 1:
-            return self.context.get(val[1:-1], val)
-        if '{' in val and '}' in val:
-            for k, v in self.context.items():
-                if f"{{{k}}}" in val: val = val.replace(f"{{{k}}}", str(v))
-        return val
-
-    async def execute_node(self, node: Dict[str, Any]):
-        node_type = node['type']
-        data = node.get('data', {})
-
-        if node_type == 'api':
-            pass
-        
-        elif node_type == 'function_start':
-            # Function Start Node: Initialize function parameters into context
-            # The parameters are defined in node data.parameters, values come from caller
-            parameters = data.get('parameters', [])
-            func_name = data.get('functionName', 'anonymous')
-            
-            self.execution_log.append(f"Function Start: {func_name}")
-            
-            # If this function was called with arguments (via subworkflow),
-            # they would be in context['_func_args']
-            func_args = self.context.get('_func_args', {})
-            
-            for param in parameters:
-                param_name = param.get('name')
-                if param_name:
-                    # Get value from passed arguments or default to None
-                    self.context[param_name] = func_args.get(param_name)
-                    self.execution_log.append(f"  Param '{param_name}' = {self.context.get(param_name)}")
-        
-        elif node_type == 'function_return':
-            # Function Return Node: Return value to caller
-            return_type = data.get('returnType', 'variable')
-            return_value = data.get('returnValue', '')
-            
-            result = None
-            if return_type == 'variable':
-                # First try to get as variable from context
-                result = self.context.get(return_value)
-                # If not found, check if it's a literal value (number, string, etc)
-                if result is None:
-                    # Try to parse as number
-                    try:
-                        if '.' in str(return_value):
-                            result = float(return_value)
-                        else:
-                            result = int(return_value)
-                    except (ValueError, TypeError):
-                        # Use the raw value as string
-                        result = return_value if return_value else None
-            elif return_type == 'json':
-                # Resolve placeholders in JSON
-                final_body = return_value
-                for key, val in self.context.items():
-                    # Handle {$varName} format
-                    placeholder_dollar = f"{{${key}}}"
-                    if placeholder_dollar in final_body:
-                        if isinstance(val, (dict, list)):
-                            final_body = final_body.replace(placeholder_dollar, json.dumps(val))
-                        else:
-                            final_body = final_body.replace(placeholder_dollar, str(val))
-                    # Handle {varName} format
-                    placeholder = f"{{{key}}}"
-                    if placeholder in final_body:
-                        if isinstance(val, (dict, list)):
-                            final_body = final_body.replace(placeholder, json.dumps(val))
-                        else:
-                            final_body = final_body.replace(placeholder, str(val))
+        return {"status": "success", "message": "Workflow completed"}
+
+    def _result(self, **result) -> Dict[str, Any]:
+        # Logs and the final context are only built for traced runs
+        if self.trace.enabled:
+            result["logs"] = self.trace.lines()
+        if self.trace.debug_enabled and result["status"] == "success":
+            # Open streams can't be serialised; show their state instead
+            result["context"] = {k: repr(v) if isinstance(v, LazyRows) else v for k, v in self.context.items()}
+        return result
+
+    @property
+    def execution_log(self) -> List[str]:
+        return self.trace.lines()
+
+    async def _flush_writes(self, session: InvocationSession, key=None):
+        # Caller holds session.lock
+        pending = session.pending
+        for k in ([key] if key is not None else list(pending)):
+            statement, param_sets = pending.pop(k)
+            started = time.perf_counter()
+            await session.get().execute(statement, param_sets)
+            record_db_time(started, statement, param_sets[0], session.connection_id)
+            session.dirty = True
+            self.trace.summary("DB Batch: flushed %d rows", len(param_sets))
+
+    async def _finish_transaction(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        # Everything the invocation wrote commits together, and only if the run succeeded.
+        # Each database commits separately, so a failed commit can't undo earlier ones.
+        sessions = [s for s in (self.session, *self._external.values()) if s.has_writes]
+        failed = next((s.failed for s in sessions if s.failed), None)
+        if failed and result.get('status') != 'error':
+            result = self._result(status="error", error=f"Rolled back after a failed statement: {failed}")
+        for session in sessions:
+            async with session.lock:
                 try:
-                    result = json.loads(final_body)
-                except:
-                    result = final_body
-            elif return_type == 'expression':
-                # Simple expression evaluation
-                result = self._resolve_val(return_value)
-            
-            self.execution_log.append(f"Function Return: {result}")
-            return {"type": "response", "data": result}
-        
-        elif node_type == 'variable':
-            var_name = data.get('name')
-            var_value = data.get('value')
-            var_type = data.get('type', 'string')
-
-            if var_name:
-                if isinstance(var_value, str):
-                    if var_value.startswith('{') and var_value.endswith('}') and var_value.count('{') == 1:
-                        key = var_value[1:-1]
-                        if key in self.context: var_value = self.context[key]
-                    else:
-                        for key, val in self.context.items():
-                            placeholder = f"{{{key}}}"
-                            if placeholder in var_value: var_value = var_value.replace(placeholder, str(val))
-                
-                if var_type in ['json', 'array'] and isinstance(var_value, str):
-                    try: var_value = json.loads(var_value)
-                    except: pass
-                elif var_type == 'number':
-                    try:
-                        var_value = float(var_value)
-                        if var_value.is_integer(): var_value = int(var_value)
-                    except: pass
-
-                self.context[var_name] = var_value
-                self.execution_log.append(f"Set Variable '{var_name}' = {str(var_value)[:50]}...")
-
-        elif node_type == 'function':
-            func_name = data.get('name', '').strip()
-            # Standard Library Dispatch
-            res = None
+                    if result.get('status') == 'error':
+                        await session.rollback()
+                        continue
+                    await self._flush_writes(session)
+                    await session.commit()
+                except Exception as e:
+                    await session.rollback()
+                    self.trace.summary("DB Commit Error: %s", e)
+                    result = self._result(status="error", error=str(e))
+        return result
+
+    def _signal(self, source: str, target: str, live: bool, ready: List[str]):
+        plan = self.plan
+        if target not in plan.nodes or target == self._stop:
+            return
+        if (source, target) in plan.back_edges:
+            if live: ready.append(target)
+            return
+        expected = plan.forward_in.get(target, 0)
+        if expected <= 1:
+            if live: ready.append(target)
+            else: self._skip(target, ready)
+            return
+        arrivals = self._arrivals.setdefault(target, [])
+        arrivals.append(live)
+        if len(arrivals) >= expected:
+            del self._arrivals[target]
+            if any(arrivals): ready.append(target)
+            else: self._skip(target, ready)
+
+    def _skip(self, node_id: str, ready: List[str]):
+        # Dead-path elimination: a node on an untaken branch passes the news downstream
+        for target in self.plan.nodes[node_id].targets:
+            self._signal(node_id, target, False, ready)
+
+    def _release_waiting_joins(self) -> List[str]:
+        # Nothing else can run: let joins go with the branches that did arrive
+        released = [node_id for node_id, arrivals in self._arrivals.items() if any(arrivals)]
+        self._arrivals = {}
+        return released
+
+    def _batches(self, wave: List[PlanNode]) -> List[List[PlanNode]]:
+        """
+        Split a wave into batches that can run concurrently: a node joins the current
+        batch unless it may read something an earlier member writes, or write something
+        an earlier member reads (database side effects count as the DB_RESOURCE key).
+        Nodes that can end the run close their batch so nothing after them starts.
+        """
+        batches, batch, written, read = [], [], set(), set()
+        for node in wave:
+            reads, writes = node.reads, node.writes
+            if node.type == 'subworkflow':
+                reads, writes = call_access(node, self._callee_plan(node))
+            conflict = bool(batch) and (
+                written is None or reads is None or not written.isdisjoint(reads)
+                or writes is None or (bool(writes) and (read is None or not read.isdisjoint(writes)))
+            )
+            if conflict:
+                batches.append(batch)
+                batch, written, read = [], set(), set()
+            batch.append(node)
+            written = None if (written is None or writes is None) else written | writes
+            read = None if (read is None or reads is None) else read | reads
+            if node.type in TERMINAL_TYPES:
+                batches.append(batch)
+                batch, written, read = [], set(), set()
+        if batch:
+            batches.append(batch)
+        return batches
+
+    @staticmethod
+    def _callee_plan(node: PlanNode) -> Optional[ExecutionPlan]:
+        func = FunctionRegistry.peek(node.data.get('functionId')) if node.data.get('functionId') else None
+        return func.plan if func else None
+
+    async def _run_batch(self, batch: List[PlanNode]) -> List[tuple]:
+        if len(batch) == 1:
+            node = batch[0]
             try:
-                if func_name == 'uuid': res = StandardLibrary.get_uuid()
-                elif func_name == 'now' or func_name == 'timestamp': res = StandardLibrary.get_timestamp()
-                elif func_name == 'upper': res = StandardLibrary.text_upper(self.context.get('input', '')) # Naive input expectation
-                # For more complex functions, we might need Input Variables in the Function Node.
-                # For now, let's allow 'resultVar' to store the output.
+                return [(node, await self._run_node(node, self.context))]
             except Exception as e:
-                self.execution_log.append(f"Function Error {func_name}: {e}")
-            
-            # If function node has a property to store result
-            # We don't have 'resultVar' in FunctionNode schema explicitly yet, but let's assume standard
-            # Actually, standard FunctionNode usually just runs. 
-            # Let's check context for args? 
-            # Simplified: result is stored in 'last_result' or specific var if we add it.
-            # Let's auto-store in 'func_result' for now.
-            if res is not None:
-                self.context['func_result'] = res
-                self.execution_log.append(f"Function {func_name} -> {res}")
-
-
-
-        elif node_type == 'subworkflow':
-            func_id = data.get('functionId')
-            if not func_id or not self.db:
-                self.execution_log.append("Subworkflow Error: Missing ID or DB")
-                return
+                return [(node, e)]
+
+        # Each branch writes into its own scope; scopes merge back in wave order
+        scopes = [ChainMap({}, self.context) for _ in batch]
+
+        async def run_branch(node, scope):
+            async with self._semaphore:
+                _in_concurrent_batch.set(True)
+                return await self._run_node(node, scope)
+
+        results = await asyncio.gather(*(run_branch(n, s) for n, s in zip(batch, scopes)), return_exceptions=True)
+        for scope in scopes:
+            self.context.update(scope.maps[0])
+        return list(zip(batch, results))
+
+    async def _run_node(self, node: PlanNode, ctx):
+        self.trace.summary("Executing Node: %s (%s)", node.type, node.id)
+        if not self.hooks:
+            return await self.execute_node(node, ctx)
+
+        # Hooked runs write through an overlay so hooks can see what the node produced
+        tokens = [hook.node_started(node) for hook in self.hooks]
+        overlay = ChainMap({}, ctx)
+        error = None
+        try:
+            return await self.execute_node(node, overlay)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            for hook, token in zip(self.hooks, tokens):
+                hook.node_finished(node, token, overlay.maps[0], error)
+            ctx.update(overlay.maps[0])
+
+    async def _materialise(self, ctx, names):
+        # Streamed rows reaching a node that needs all of them (aggregates, JSON bodies)
+        # are read into a list, which replaces the stream in the context
+        for name in names:
+            value = ctx.get(name)
+            if isinstance(value, LazyRows):
+                ctx[name] = await value.all()
+                self.trace.summary("DB Stream: read %d rows into '%s'", len(ctx[name]), name)
+
+    def _resolve_val(self, ctx, val):
+        if not isinstance(val, str): return val
+        return compile_template(val).resolve(ctx)
+
+    async def execute_node(self, node: PlanNode, ctx=None):
+        handler = self._handlers.get(node.type)
+        if handler is None:
+            return None
+        started = time.perf_counter()
+        try:
+            return await handler(self, node, node.data, self.context if ctx is None else ctx)
+        finally:
+            Metrics.observe_node(node.type, (time.perf_counter() - started) * 1000)
+
+    async def _api_node(self, node: PlanNode, data, ctx):
+        pass
+
+    async def _function_start_node(self, node: PlanNode, data, ctx):
+        # Function Start Node: Initialize function parameters into context
+        # The parameters are defined in node data.parameters, values come from caller
+        parameters = data.get('parameters', [])
+        func_name = data.get('functionName', 'anonymous')
+
+        self.trace.summary("Function Start: %s", func_name)
+
+        # If this function was called with arguments (via subworkflow),
+        # they would be in context['_func_args']
+        func_args = ctx.get('_func_args', {})
+
+        for param in parameters:
+            param_name = param.get('name')
+            if param_name:
+                # Get value from passed arguments or default to None
+                ctx[param_name] = func_args.get(param_name)
+                self.trace.debug("  Param '%s' = %s", param_name, ctx.get(param_name))
+
+    async def _function_return_node(self, node: PlanNode, data, ctx):
+        # Function Return Node: Return value to caller
+        return_type = data.get('returnType', 'variable')
+        return_value = data.get('returnValue', '')
+
+        result = None
+        await self._materialise(ctx, node.reads or ())
+        if return_type == 'variable':
+            # First try to get as variable from context
+            result = ctx.get(return_value)
+            # If not found, check if it's a literal value (number, string, etc)
+            if result is None:
+                # Try to parse as number
+                try:
+                    if '.' in str(return_value):
+                        result = float(return_value)
+                    else:
+                        result = int(return_value)
+                except (ValueError, TypeError):
+                    # Use the raw value as string
+                    result = return_value if return_value else None
+        elif return_type == 'json':
+            # Resolve placeholders in JSON
+            result = node.compiled['returnValue'].render(ctx)
+        elif return_type == 'expression':
+            # Simple expression evaluation
+            result = self._resolve_val(ctx, return_value)
+
+        self.trace.debug("Function Return: %s", result)
+        return {"type": "response", "data": result}
+
+    async def _variable_node(self, node: PlanNode, data, ctx):
+        var_name = data.get('name')
+        var_value = data.get('value')
+        var_type = data.get('type', 'string')
+
+        if var_name:
+            if isinstance(var_value, str):
+                var_value = node.compiled['value'].resolve(ctx)
+
+            if var_type in ['json', 'array'] and isinstance(var_value, str):
+                try: var_value = json.loads(var_value)
+                except: pass
+            elif var_type == 'number':
+                try:
+                    var_value = float(var_value)
+                    if var_value.is_integer(): var_value = int(var_value)
+                except: pass
+
+            ctx[var_name] = var_value
+            self.trace.debug("Set Variable '%s' = %.50s...", var_name, var_value)
+
+    async def _function_node(self, node: PlanNode, data, ctx):
+        func_name = data.get('name', '').strip()
+        # Standard Library Dispatch
+        res = None
+        try:
+            if func_name == 'uuid': res = StandardLibrary.get_uuid()
+            elif func_name == 'now' or func_name == 'timestamp': res = StandardLibrary.get_timestamp()
+            elif func_name == 'upper': res = StandardLibrary.text_upper(ctx.get('input', '')) # Naive input expectation
+            # For more complex functions, we might need Input Variables in the Function Node.
+            # For now, let's allow 'resultVar' to store the output.
+        except Exception as e:
+            self.trace.summary("Function Error %s: %s", func_name, e)
+
+        # If function node has a property to store result
+        # We don't have 'resultVar' in FunctionNode schema explicitly yet, but let's assume standard
+        # Actually, standard FunctionNode usually just runs. 
+        # Let's check context for args? 
+        # Simplified: result is stored in 'last_result' or specific var if we add it.
+        # Let's auto-store in 'func_result' for now.
+        if res is not None:
+            ctx['func_result'] = res
+            self.trace.debug("Function %s -> %s", func_name, res)
+
+    async def _function(self, func_id):
+        # Compiled functions come from the registry; only a miss touches the DB
+        func = FunctionRegistry.lookup(func_id)
+        if func is None:
+            async with self.session.lock:
+                func = await FunctionRegistry.load(self.session.get(), func_id, self.project_id)
+        return func
+
+    async def _subworkflow_node(self, node: PlanNode, data, ctx):
+        func_id = data.get('functionId')
+        if not func_id:
+            self.trace.summary("Subworkflow Error: Missing ID or DB")
+            return
 
-            # Fetch sub-workflow
-            from sqlalchemy.future import select
-            from app.models.workflow import Workflow
-            
-            result = await self.db.execute(select(Workflow).filter(Workflow.id == func_id))
-            sub_wf = result.scalars().first()
-            
-            if not sub_wf:
-                self.execution_log.append(f"Subworkflow Not Found: {func_id}")
+        func = await self._function(func_id)
+        if not func:
+            self.trace.summary("Subworkflow Not Found: %s", func_id)
+            return
+
+        self.trace.summary("Calling Function: %s", func.name)
+
+        # Get parameter mappings from node data
+        param_mappings = data.get('paramMappings', {})
+
+        # Resolve each parameter value
+        func_args = {}
+        for param_name, param_value in param_mappings.items():
+            resolved = self._resolve_val(ctx, param_value)
+            func_args[param_name] = resolved
+            self.trace.debug("  Passing %s = %s", param_name, resolved)
+
+        memo_key = PureFunctionCache.key(func, func_args) if func.pure else None
+        if memo_key:
+            found, cached = PureFunctionCache.get(memo_key)
+            if found:
+                ctx['func_result'] = cached
+                self.trace.debug("Function %s (cached) -> func_result = %s", func.name, cached)
                 return
 
-            self.execution_log.append(f"Calling Function: {sub_wf.name}")
-            
-            # Get parameter mappings from node data
-            param_mappings = data.get('paramMappings', {})
-            
-            # Resolve each parameter value
-            func_args = {}
-            for param_name, param_value in param_mappings.items():
-                resolved = self._resolve_val(param_value)
-                func_args[param_name] = resolved
-                self.execution_log.append(f"  Passing {param_name} = {resolved}")
-            
-            # Prepare data
-            sub_data = {
-                "nodes": sub_wf.nodes,
-                "edges": sub_wf.edges
-            }
-            
-            # Create sub-executor
-            sub_executor = WorkflowExecutor(sub_data, db_session=self.db)
-            
-            # Pre-seed context with parent context and function arguments
-            sub_executor.context = self.context.copy()
-            sub_executor.context['_func_args'] = func_args  # Special key for FunctionStartNode
-            
-            sub_res = await sub_executor.run({})
-            
-            if sub_res.get('status') == 'success':
-                self.context['func_result'] = sub_res.get('response')
-                self.execution_log.append(f"Function {sub_wf.name} Completed -> func_result = {sub_res.get('response')}")
+        # Create sub-executor
+        sub_executor = WorkflowExecutor(plan=func.plan, project_id=func.project_id, trace=self.trace, hooks=self.hooks, owner_id=self.owner_id)
+        sub_executor.session = self.session
+        sub_executor._external = self._external
+        sub_executor._owns_session = False
+
+        # Copy-on-write view of the parent context: the function's writes stay in its own layer
+        sub_executor.context = ChainMap({'_func_args': func_args, '_loop_states': {}}, ctx)
+
+        sub_res = await sub_executor.run({})
+
+        if sub_res.get('status') == 'success':
+            ctx['func_result'] = sub_res.get('response')
+            if memo_key and not sub_res.get('status_code'):
+                PureFunctionCache.put(memo_key, sub_res.get('response'))
+            self.trace.debug("Function %s Completed -> func_result = %s", func.name, sub_res.get('response'))
+        else:
+            self.trace.summary("Function %s Failed: %s", func.name, sub_res.get('error'))
+
+    async def _database_node(self, node: PlanNode, data, ctx):
+        query_type = data.get('queryType', 'read')
+        result_var = data.get('resultVar', 'dbData')
+
+        try:
+            statement, params = node.compiled['query'].render(ctx)
+        except (TypeError, ValueError) as e:
+            self.trace.summary("DB Error: %s", e)
+            return
+
+        try:
+            session = await self._db_target(data)
+        except (LookupError, PermissionError, ConnectionError) as e:
+            self.trace.summary("DB Error: %s", e)
+            return
+
+        if query_type == 'batch':
+            # Queue the parameter set; full batches go out as one executemany, the commit waits for the run to end
+            template = node.compiled['query']
+            key = node.id if statement is template.statement else (node.id, str(statement))
+            batch_size = int(data.get('batchSize') or settings.DB_WRITE_BATCH_SIZE)
+            async with session.lock:
+                queued = session.pending.setdefault(key, (statement, []))[1]
+                queued.append(params)
+                ctx[result_var] = {"queued": len(queued)}
+                if len(queued) >= batch_size:
+                    await self._flush_writes(session, key)
+            return
+
+        def read_rows(result):
+            if result.returns_rows:
+                rows = result.mappings().all()
+                res_data = [dict(row) for row in rows]
+                ctx[result_var] = res_data
+                self.trace.summary("DB Read: %d rows", len(res_data))
             else:
-                self.execution_log.append(f"Function {sub_wf.name} Failed: {sub_res.get('error')}")
-
-
-        elif node_type == 'database':
-            query = data.get('query', '')
-            query_type = data.get('queryType', 'read')
-            result_var = data.get('resultVar', 'dbData')
-            
-            if not self.db: return
-            
-            final_query = query
-            for key, val in self.context.items():
-                if f"{{{key}}}" in final_query:
-                    val_str = str(val)
-                    if isinstance(val, str): val_str = f"'{val_str}'"
-                    final_query = final_query.replace(f"{{{key}}}", str(val_str))
-            
-            try:
-                result = await self.db.execute(text(final_query))
-                if query_type == 'read':
-                    if result.returns_rows:
-                        rows = result.mappings().all()
-                        res_data = [dict(row) for row in rows]
-                        self.context[result_var] = res_data
-                        self.execution_log.append(f"DB Read: {len(res_data)} rows")
-                    else:
-                        self.context[result_var] = []
-                else:
-                    await self.db.commit()
-                    self.context[result_var] = {"affected": result.rowcount}
-                    self.execution_log.append(f"DB Write: {result.rowcount} rows affected")
-            except Exception as e:
-                self.execution_log.append(f"DB Error: {str(e)}")
-                # self.context[result_var] = {"error": str(e)} # Optional
+                ctx[result_var] = []
 
-        elif node_type == 'code':
-            user_code = data.get('code', '')
+        try:
+            if query_type == 'stream':
+                # Server-side cursor on its own session, so writes elsewhere in the run can't end it
+                stream_session = session.new_session()
+                try:
+                    started = time.perf_counter()
+                    result = await stream_session.stream(
+                        statement, params,
+                        execution_options={"yield_per": int(data.get('fetchSize') or settings.DB_STREAM_FETCH_SIZE)},
+                    )
+                    record_db_time(started, statement, params, session.connection_id)
+                except Exception:
+                    await stream_session.close()
+                    raise
+                rows = LazyRows(stream_session, result.mappings())
+                self._streams.append(rows)
+                ctx[result_var] = rows
+                self.trace.summary("DB Stream: opened")
+            elif query_type == 'read' and _in_concurrent_batch.get() and not session.has_writes:
+                # Reads running alongside other nodes use their own pooled session
+                async with session.new_session() as read_session:
+                    started = time.perf_counter()
+                    result = await read_session.execute(statement, params)
+                    record_db_time(started, statement, params, session.connection_id)
+                    read_rows(result)
+            else:
+                await self._execute_on_session(session, data, statement, params, query_type, result_var, ctx, read_rows)
+        except Exception as e:
+            self.trace.summary("DB Error: %s", e)
+            # ctx[result_var] = {"error": str(e)} # Optional
+
+    async def _db_target(self, data) -> InvocationSession:
+        # connectionId selects one of the owner's saved databases; otherwise the platform database
+        connection_id = data.get('connectionId')
+        if not connection_id:
+            return self.session
+        session = self._external.get(connection_id)
+        if session is None:
+            engine = await ExternalDbService.engine_for_connection(connection_id, self.owner_id)
+            session = self._external.setdefault(connection_id, InvocationSession(bind=engine, connection_id=connection_id))
+        return session
+
+    async def _execute_on_session(self, session: InvocationSession, data, statement, params, query_type, result_var, ctx, read_rows):
+        # transaction: 'run' (commit with the invocation), 'savepoint' (a failure only undoes
+        # this node) or 'commit' (durable right away, together with everything before it)
+        mode = data.get('transaction', 'run')
+        async with session.lock:
+            db = session.get()
             try:
-                local_scope = self.context.copy()
-                local_scope['db'] = self.db
-                local_scope['context'] = self.context
-                
-                if 'await ' in user_code:
-                     indented_code = "\n".join(["    " + line for line in user_code.split("\n")])
-                     wrapped_code = f"async def _user_async_func(context, db):\n{indented_code}"
-                     exec(wrapped_code, {}, local_scope)
-                     await local_scope['_user_async_func'](self.context, self.db)
+                # Reads and writes see queued batch rows
+                if session.pending:
+                    await self._flush_writes(session)
+                started = time.perf_counter()
+                if mode == 'savepoint':
+                    async with db.begin_nested():
+                        result = await db.execute(statement, params)
                 else:
-                    exec(user_code, {}, local_scope)
-                self.execution_log.append(f"Executed Python Code")
+                    result = await db.execute(statement, params)
+                record_db_time(started, statement, params, session.connection_id)
             except Exception as e:
-                self.execution_log.append(f"Code Error: {str(e)}")
-
-        elif node_type == 'file':
-            operation = data.get('operation', 'read')
-            path = self._resolve_val(data.get('path', ''))
-            content = data.get('content', '')
-            result_var = data.get('resultVar', 'fileData')
-            
-            try:
-                if operation == 'read':
-                    if os.path.exists(path):
-                        async with aiofiles.open(path, mode='r') as f:
-                            data = await f.read()
-                        self.context[result_var] = data
+                if mode != 'savepoint':
+                    if session.dirty:
+                        # The transaction is unusable now; the run's writes will be rolled back
+                        session.failed = str(e)
                     else:
-                        self.context[result_var] = None
-                        self.execution_log.append(f"File Read Error: Not found {path}")
-                elif operation == 'write':
-                    final_content = self._resolve_val(content)
-                    os.makedirs(os.path.dirname(path), exist_ok=True)
-                    async with aiofiles.open(path, mode='w') as f:
-                        await f.write(str(final_content))
-                    self.context[result_var] = True
-                elif operation == 'delete':
-                    if os.path.exists(path):
-                        os.remove(path)
-                        self.context[result_var] = True
-                    else: self.context[result_var] = False
-                elif operation == 'list':
-                     if os.path.isdir(path):
-                         files = os.listdir(path)
-                         self.context[result_var] = files
-                     else: self.context[result_var] = []
-            except Exception as e:
-                self.execution_log.append(f"File Error: {str(e)}")
+                        await session.rollback()
+                raise
 
-        elif node_type == 'logic':
-            raw_condition = data.get('condition', 'False')
-            condition = raw_condition.replace('===', '==').replace('!==', '!=')
-            try:
-                result = eval(condition, {"__builtins__": {}}, self.context)
-                self.execution_log.append(f"Logic: '{raw_condition}' -> {bool(result)}")
-                return {"type": "logic", "result": bool(result)}
-            except Exception as e:
-                self.execution_log.append(f"Logic Error: {e}")
-                return {"type": "logic", "result": False}
-
-        elif node_type == 'math':
-            val_a = self._resolve_val(data.get('valA'))
-            val_b = self._resolve_val(data.get('valB'))
-            op = data.get('op', '+')
-            result_var = data.get('resultVar', 'result')
-            try:
-                num_a = float(val_a)
-                num_b = float(val_b)
-                res = 0
-                if op == '+': res = num_a + num_b
-                elif op == '-': res = num_a - num_b
-                elif op == '*': res = num_a * num_b
-                elif op == '/': res = num_a / num_b if num_b != 0 else 0
-                elif op == '%': res = num_a % num_b
-                
-                if num_a.is_integer() and num_b.is_integer():
-                     if int(res) == res: res = int(res)
-                self.context[result_var] = res
-            except:
-                if op == '+':
-                    self.context[result_var] = str(val_a) + str(val_b)
-
-        elif node_type == 'data_op':
-            collection = self._resolve_val(data.get('collection', ''))
-            op = data.get('op', 'sum')
-            result_var = data.get('resultVar', 'summary')
-            
-            if isinstance(collection, str):
-                if collection in self.context: collection = self.context[collection]
-                elif collection == 'body': collection = self.context.get('body', [])
-            if not isinstance(collection, list): collection = []
-
-            nums = []
-            for x in collection:
-                try: nums.append(float(x))
-                except: pass
-            
+            if query_type == 'read':
+                read_rows(result)
+                return
+            session.dirty = True
+            if mode == 'commit':
+                await session.commit()
+            ctx[result_var] = {"affected": result.rowcount}
+            self.trace.summary("DB Write: %s rows affected", result.rowcount)
+
+    async def _code_node(self, node: PlanNode, data, ctx):
+        compiled = node.compiled['code']
+        mode = data.get('executionMode', 'inline')
+        timeout = float(data.get('timeout') or settings.CODE_NODE_TIMEOUT)
+        try:
+            # Synchronous snippets may opt into a worker pool so CPU-heavy code doesn't block the loop
+            if mode in ('thread', 'process') and not compiled.is_async:
+                used = await CodeExecutionPool.run(compiled, ctx, mode, timeout)
+                self.trace.summary("Executed Python Code (%s pool)", used)
+            elif compiled.uses_db:
+                # Snippets that touch `db` share the invocation's session and see queued batch rows.
+                # They hold its lock while they run, so concurrent map items and branches take turns.
+                async with self.session.lock:
+                    if self.session.pending:
+                        await self._flush_writes(self.session)
+                    self.session.dirty = True
+                    await run_inline(compiled, ctx, self.session.get())
+                self.trace.summary("Executed Python Code")
+            else:
+                await run_inline(compiled, ctx, None)
+                self.trace.summary("Executed Python Code")
+        except asyncio.TimeoutError:
+            self.trace.summary("Code Error: timed out after %ss", timeout)
+        except Exception as e:
+            self.trace.summary("Code Error: %s", e)
+
+    async def _file_node(self, node: PlanNode, data, ctx):
+        operation = data.get('operation', 'read')
+        path = self._resolve_val(ctx, data.get('path', ''))
+        content = data.get('content', '')
+        result_var = data.get('resultVar', 'fileData')
+
+        try:
+            if operation == 'read':
+                if os.path.exists(path):
+                    async with aiofiles.open(path, mode='r') as f:
+                        data = await f.read()
+                    ctx[result_var] = data
+                else:
+                    ctx[result_var] = None
+                    self.trace.summary("File Read Error: Not found %s", path)
+            elif operation == 'write':
+                final_content = self._resolve_val(ctx, content)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                async with aiofiles.open(path, mode='w') as f:
+                    await f.write(str(final_content))
+                ctx[result_var] = True
+            elif operation == 'delete':
+                if os.path.exists(path):
+                    os.remove(path)
+                    ctx[result_var] = True
+                else: ctx[result_var] = False
+            elif operation == 'list':
+                 if os.path.isdir(path):
+                     files = os.listdir(path)
+                     ctx[result_var] = files
+                 else: ctx[result_var] = []
+        except Exception as e:
+            self.trace.summary("File Error: %s", e)
+
+    async def _logic_node(self, node: PlanNode, data, ctx):
+        condition = node.compiled['condition']
+        try:
+            result = condition.evaluate(ctx)
+            self.trace.debug("Logic: '%s' -> %s", condition.source, result)
+            return {"type": "logic", "result": result}
+        except Exception as e:
+            self.trace.summary("Logic Error: %s", e)
+            return {"type": "logic", "result": False}
+
+    async def _math_node(self, node: PlanNode, data, ctx):
+        val_a = self._resolve_val(ctx, data.get('valA'))
+        val_b = self._resolve_val(ctx, data.get('valB'))
+        op = data.get('op', '+')
+        result_var = data.get('resultVar', 'result')
+        try:
+            num_a = float(val_a)
+            num_b = float(val_b)
             res = 0
-            if op == 'count': res = len(collection)
-            elif op == 'sum': res = sum(nums)
-            elif op == 'avg': res = sum(nums) / len(nums) if nums else 0
-            
-            self.context[result_var] = res
-
-        elif node_type == 'interface':
-            fields = data.get('fields', [])
-            mode = data.get('transferMode', 'body')
-            target_data = self.context.get(mode, {})
-            
-            missing = []
-            for field in fields:
-                if field.get('required') and field.get('name') not in target_data:
-                    missing.append(field.get('name'))
-            
-            if missing:
-                 self.execution_log.append(f"Validation Failed: Missing {missing}")
-                 return {
-                    "type": "response", 
-                    "data": {"error": "Validation Failed", "missing": missing, "detail": f"Missing required fields: {', '.join(missing)}"}
-                }
-
-        elif node_type == 'loop':
-            collection = self._resolve_val(data.get('collection', ''))
-            item_var = data.get('variable', 'item')
-            
-            if isinstance(collection, str):
-                collection = self.context.get(collection, [])
-            
-            if not isinstance(collection, list): collection = []
-
-            loop_states = self.context.setdefault('_loop_states', {})
-            state = loop_states.get(node.get('id'), {'index': 0})
-            idx = state['index']
-            
-            if idx < len(collection):
-                item = collection[idx]
-                if item_var: self.context[item_var] = item
-                state['index'] = idx + 1
-                loop_states[node.get('id')] = state
+            if op == '+': res = num_a + num_b
+            elif op == '-': res = num_a - num_b
+            elif op == '*': res = num_a * num_b
+            elif op == '/': res = num_a / num_b if num_b != 0 else 0
+            elif op == '%': res = num_a % num_b
+
+            if num_a.is_integer() and num_b.is_integer():
+                 if int(res) == res: res = int(res)
+            ctx[result_var] = res
+        except:
+            if op == '+':
+                ctx[result_var] = str(val_a) + str(val_b)
+
+    async def _expression_node(self, node: PlanNode, data, ctx):
+        expression = node.compiled['expression']
+        result_var = data.get('resultVar', 'result')
+        try:
+            ctx[result_var] = expression.evaluate(ctx)
+            self.trace.debug("Expression: '%s' -> %s = %s", expression.source, result_var, ctx[result_var])
+        except Exception as e:
+            self.trace.summary("Expression Error: %s", e)
+            ctx[result_var] = None
+
+    async def _data_op_node(self, node: PlanNode, data, ctx):
+        await self._materialise(ctx, node.reads or ())
+        collection = self._resolve_val(ctx, data.get('collection', ''))
+        op = data.get('op', 'sum')
+        result_var = data.get('resultVar', 'summary')
+
+        if isinstance(collection, str):
+            if collection in ctx: collection = ctx[collection]
+            elif collection == 'body': collection = ctx.get('body', [])
+        if not isinstance(collection, list): collection = []
+
+        try:
+            ctx[result_var] = aggregate(
+                collection, op,
+                field=data.get('field') or None,
+                group_by=data.get('groupBy') or None,
+                pct=float(data.get('percentile', 50)),
+            )
+        except ValueError as e:
+            self.trace.summary("Data Op Error: %s", e)
+            ctx[result_var] = None
+
+    async def _interface_node(self, node: PlanNode, data, ctx):
+        # Compiled with the plan; invoke already ran it if the node is on the entry path
+        error = node.compiled['validator'].validate(ctx.get(data.get('transferMode', 'body'), {}))
+        if error:
+            self.trace.summary("Validation Failed: %s", error['detail'])
+            # Same status as the entry validators in invoke
+            return {"type": "response", "data": error, "status_code": 422}
+
+    async def _loop_node(self, node: PlanNode, data, ctx):
+        collection = self._resolve_val(ctx, data.get('collection', ''))
+        item_var = data.get('variable', 'item')
+
+        if isinstance(collection, str):
+            collection = ctx.get(collection, [])
+
+        loop_states = ctx.setdefault('_loop_states', {})
+        state = loop_states.get(node.id, {'index': 0})
+
+        if isinstance(collection, LazyRows):
+            # Streamed rows are pulled one per iteration and never collected
+            found, item = await collection.next()
+            if found:
+                if item_var: ctx[item_var] = item
+                self._budget += len(node.body) + 1
+                state['index'] += 1
+                loop_states[node.id] = state
                 return {"type": "loop", "result": "do"}
-            else:
-                state['index'] = 0 
-                loop_states[node.get('id')] = state
-                return {"type": "loop", "result": "done"}
-
-        elif node_type == 'response':
-            resp_type = data.get('responseType', 'json')
-            body_def = data.get('body', '{}')
-            
-            if resp_type == 'variable':
-                var_name = body_def
-                # Handle $varName format
-                if isinstance(var_name, str) and var_name.startswith('$'):
-                    var_name = var_name[1:]
-                # Handle {varName} format  
-                if isinstance(var_name, str) and var_name.startswith('{') and var_name.endswith('}'):
-                    var_name = var_name[1:-1]
-                # Handle {$varName} format
-                if isinstance(var_name, str) and var_name.startswith('$'):
-                    var_name = var_name[1:]
-                val = self.context.get(var_name)
-                return {"type": "response", "data": val}
-            else:
-                final_body = body_def
-                # Replace all variable patterns in the body
-                for key, val in self.context.items():
-                    # Handle {$varName} format (common from autocomplete)
-                    placeholder_dollar_brace = f"{{${key}}}"
-                    if placeholder_dollar_brace in final_body:
-                        if isinstance(val, (dict, list)): 
-                            final_body = final_body.replace(placeholder_dollar_brace, json.dumps(val))
-                        else: 
-                            final_body = final_body.replace(placeholder_dollar_brace, str(val))
-                    
-                    # Handle {varName} format
-                    placeholder_brace = f"{{{key}}}"
-                    if placeholder_brace in final_body:
-                        if isinstance(val, (dict, list)): 
-                            final_body = final_body.replace(placeholder_brace, json.dumps(val))
-                        else: 
-                            final_body = final_body.replace(placeholder_brace, str(val))
-                    
-                    # Handle $varName format
-                    placeholder_dollar = f"${key}"
-                    # Only replace if not inside braces (avoid double replacement)
-                    if placeholder_dollar in final_body and f"{{{placeholder_dollar}}}" not in body_def:
-                        if isinstance(val, (dict, list)): 
-                            final_body = final_body.replace(placeholder_dollar, json.dumps(val))
-                        else: 
-                            final_body = final_body.replace(placeholder_dollar, str(val))
-                
-                self.execution_log.append(f"Response body after substitution: {final_body}")
-                try: 
-                    parsed = json.loads(final_body)
-                    return {"type": "response", "data": parsed}
-                except Exception as e: 
-                    self.execution_log.append(f"JSON parse error: {e}")
-                    return {"type": "response", "data": final_body}
-        
-        return None
+            state['index'] = 0
+            loop_states[node.id] = state
+            return {"type": "loop", "result": "done"}
+
+        if not isinstance(collection, list): collection = []
+        idx = state['index']
+
+        if idx < len(collection):
+            item = collection[idx]
+            if item_var: ctx[item_var] = item
+            self._budget += len(node.body) + 1
+            state['index'] = idx + 1
+            loop_states[node.id] = state
+            return {"type": "loop", "result": "do"}
+        else:
+            state['index'] = 0 
+            loop_states[node.id] = state
+            return {"type": "loop", "result": "done"}
+
+    async def _map_node(self, node: PlanNode, data, ctx):
+        collection = self._resolve_val(ctx, data.get('collection', ''))
+        if isinstance(collection, str):
+            collection = ctx.get(collection, [])
+        if not isinstance(collection, (list, LazyRows)):
+            collection = []
+        limit = max(int(data.get('concurrency') or settings.WORKFLOW_MAX_CONCURRENCY), 1)
+        result_var = data.get('resultVar', 'results')
+
+        # At most `limit` items run at once; streamed rows are pulled only as slots free up
+        slots = asyncio.Semaphore(limit)
+        tasks: List[asyncio.Task] = []
+
+        async def run_item(index, item):
+            try:
+                return await self._map_item(node, data, ctx, index, item, limit > 1)
+            finally:
+                slots.release()
+
+        try:
+            items = collection if isinstance(collection, LazyRows) else _aiter(collection)
+            index = 0
+            async for item in items:
+                await slots.acquire()
+                tasks.append(asyncio.create_task(run_item(index, item)))
+                index += 1
+            results = await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        ctx[result_var] = list(results)
+        self.trace.summary("Map: %d items, concurrency %d", len(results), limit)
+        return {"type": "map", "result": "done"}
+
+    async def _map_item(self, node: PlanNode, data, ctx, index: int, item, concurrent: bool):
+        item_var = data.get('variable', 'item')
+        index_var = data.get('indexVar')
+        output_var = data.get('outputVar')
+        if concurrent:
+            _in_concurrent_batch.set(True)
+
+        executor = WorkflowExecutor(plan=self.plan, project_id=self.project_id, trace=self.trace, hooks=self.hooks, owner_id=self.owner_id)
+        executor.session = self.session
+        executor._external = self._external
+        executor._streams = self._streams
+        executor._owns_session = False
+        executor._stop = node.id
+
+        # The item's writes stay in its own layer; the caller's context is read-only to it
+        scope = {'_loop_states': {}}
+        if item_var: scope[item_var] = item
+        if index_var: scope[index_var] = index
+        executor.context = ChainMap(scope, ctx)
+
+        outcome = await executor._traverse(list(node.successors.get('do', ())), len(node.body) + 1)
+        if outcome['status'] == 'error':
+            raise RuntimeError(f"Map item {index}: {outcome['error']}")
+        if 'response' in outcome:
+            return outcome['response']
+        if output_var:
+            return executor.context.get(output_var)
+        return {k: v for k, v in scope.items() if k not in ('_loop_states', item_var, index_var)}
+
+    async def _response_node(self, node: PlanNode, data, ctx):
+        resp_type = data.get('responseType', 'json')
+        body_def = data.get('body', '{}')
+        await self._materialise(ctx, node.reads or ())
+
+        if resp_type == 'variable':
+            var_name = body_def
+            # Handle $varName format
+            if isinstance(var_name, str) and var_name.startswith('$'):
+                var_name = var_name[1:]
+            # Handle {varName} format  
+            if isinstance(var_name, str) and var_name.startswith('{') and var_name.endswith('}'):
+                var_name = var_name[1:-1]
+            # Handle {$varName} format
+            if isinstance(var_name, str) and var_name.startswith('$'):
+                var_name = var_name[1:]
+            val = ctx.get(var_name)
+            return {"type": "response", "data": val}
+        else:
+            # Parsed once with the plan; pure JSON bodies render straight to Python objects
+            final_body = node.compiled['body'].render(ctx)
+            self.trace.debug("Response body after substitution: %s", final_body)
+            return {"type": "response", "data": final_body}
+
+    _handlers = {
+        'api': _api_node,
+        'function_start': _function_start_node,
+        'function_return': _function_return_node,
+        'variable': _variable_node,
+        'function': _function_node,
+        'subworkflow': _subworkflow_node,
+        'database': _database_node,
+        'code': _code_node,
+        'file': _file_node,
+        'logic': _logic_node,
+        'math': _math_node,
+        'expression': _expression_node,
+        'data_op': _data_op_node,
+        'interface': _interface_node,
+        'loop': _loop_node,
+        'map': _map_node,
+        'response': _response_node,
+    }
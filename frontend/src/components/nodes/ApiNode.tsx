@@ -12,6 +12,9 @@ export function ApiNode({ id, data }: { id: string, data: any }) {
     const { id: workflowId } = useParams<{ id: string }>();
     const [method, setMethod] = useState(data.method || 'GET');
     const [path, setPath] = useState(data.path || '/');
+    const [cacheTtl, setCacheTtl] = useState<number>(data.cacheTtl || 0);
+    const [cacheQuery, setCacheQuery] = useState<string>(data.cacheQuery || '');
+    const [cacheVaryUser, setCacheVaryUser] = useState<boolean>(!!data.cacheVaryUser);
     const [validation, setValidation] = useState<{ valid: boolean, message: string } | null>(null);
 
     // Schema Validation State (for body)
@@ -163,6 +166,53 @@ export function ApiNode({ id, data }: { id: string, data: any }) {
                         </div>
                     </div>
 
+                    {/* Response Cache (GET only) */}
+                    {method === 'GET' && (
+                        <div className="bg-slate-50 dark:bg-slate-950/50 p-2 rounded-lg border border-slate-200 dark:border-slate-800/50 flex flex-col gap-2">
+                            <label className="text-[10px] uppercase font-bold text-slate-500 dark:text-slate-600">Response Cache</label>
+                            <div className="flex items-center gap-2">
+                                <input
+                                    type="number"
+                                    min={0}
+                                    value={cacheTtl}
+                                    onChange={(e) => {
+                                        const ttl = Math.max(0, parseInt(e.target.value) || 0);
+                                        setCacheTtl(ttl);
+                                        data.cacheTtl = ttl;
+                                    }}
+                                    className="nodrag w-20 bg-white dark:bg-slate-900 border border-slate-200 dark:border-slate-800 rounded px-2 py-1 text-xs font-mono text-slate-900 dark:text-white focus:outline-none focus:border-indigo-500"
+                                />
+                                <span className="text-[10px] text-slate-500">seconds (0 = off)</span>
+                            </div>
+                            {cacheTtl > 0 && (
+                                <>
+                                    <input
+                                        type="text"
+                                        value={cacheQuery}
+                                        onChange={(e) => {
+                                            setCacheQuery(e.target.value);
+                                            data.cacheQuery = e.target.value || undefined;
+                                        }}
+                                        className="nodrag w-full bg-white dark:bg-slate-900 border border-slate-200 dark:border-slate-800 rounded px-2 py-1 text-xs font-mono text-slate-900 dark:text-white focus:outline-none focus:border-indigo-500"
+                                        placeholder="Query params in the key (default: all)"
+                                    />
+                                    <label className="flex items-center gap-2 text-[10px] text-slate-500 cursor-pointer">
+                                        <input
+                                            type="checkbox"
+                                            checked={cacheVaryUser}
+                                            onChange={(e) => {
+                                                setCacheVaryUser(e.target.checked);
+                                                data.cacheVaryUser = e.target.checked;
+                                            }}
+                                            className="nodrag"
+                                        />
+                                        Separate cache per caller (Authorization header)
+                                    </label>
+                                </>
+                            )}
+                        </div>
+                    )}
+
                     {/* Implicit Variables Info */}
                     <div className="bg-indigo-50 dark:bg-indigo-500/5 p-2 rounded-lg border border-indigo-100 dark:border-indigo-500/10">
                         <label className="text-[10px] uppercase font-bold text-indigo-500 dark:text-indigo-400/80 mb-1 block">Available Variables</label>
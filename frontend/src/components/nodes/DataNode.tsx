@@ -8,12 +8,18 @@ export function DataNode({ id, data }: { id: string, data: any }) {
     const [collection, setCollection] = useState(data.collection || '');
     const [op, setOp] = useState(data.op || 'sum');
     const [resultVar, setResultVar] = useState(data.resultVar || 'summary');
+    const [field, setField] = useState(data.field || '');
+    const [groupBy, setGroupBy] = useState(data.groupBy || '');
+    const [percentile, setPercentile] = useState(data.percentile ?? 50);
 
     useEffect(() => {
         data.collection = collection;
         data.op = op;
         data.resultVar = resultVar;
-    }, [collection, op, resultVar, data]);
+        data.field = field;
+        data.groupBy = groupBy;
+        data.percentile = percentile;
+    }, [collection, op, resultVar, field, groupBy, percentile, data]);
 
     const [expanded, setExpanded] = useState(false);
 
@@ -72,9 +78,49 @@ export function DataNode({ id, data }: { id: string, data: any }) {
                             <option value="count">Count (Length)</option>
                             <option value="min">Minimum Value</option>
                             <option value="max">Maximum Value</option>
+                            <option value="percentile">Percentile</option>
+                            <option value="distinct">Distinct Values</option>
                         </select>
                     </div>
 
+                    {op === 'percentile' && (
+                        <div>
+                            <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Percentile (0-100)</label>
+                            <input
+                                type="number"
+                                min={0}
+                                max={100}
+                                value={percentile}
+                                onChange={(e) => setPercentile(Math.min(100, Math.max(0, parseFloat(e.target.value) || 0)))}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-teal-500 font-mono"
+                            />
+                        </div>
+                    )}
+
+                    {/* Row fields, for lists of objects such as database results */}
+                    <div className="flex gap-2">
+                        <div className="flex-1">
+                            <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Field</label>
+                            <input
+                                type="text"
+                                value={field}
+                                onChange={(e) => setField(e.target.value)}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-teal-500 font-mono"
+                                placeholder="e.g. price"
+                            />
+                        </div>
+                        <div className="flex-1">
+                            <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Group By</label>
+                            <input
+                                type="text"
+                                value={groupBy}
+                                onChange={(e) => setGroupBy(e.target.value)}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-teal-500 font-mono"
+                                placeholder="optional"
+                            />
+                        </div>
+                    </div>
+
                     {/* Result Variable */}
                     <div className="pt-2 border-t border-slate-800">
                         <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Store Result In</label>
@@ -1,19 +1,30 @@
 import { Handle, Position } from '@xyflow/react';
 import { Database, GripHorizontal, Maximize2, Minimize2 } from 'lucide-react';
 import { useState, useEffect } from 'react';
+import { api } from '../../lib/api';
 
 export function DatabaseNode({ data }: { id: string, data: any }) {
 
     const [query, setQuery] = useState(data.query || 'SELECT * FROM users');
     const [queryType, setQueryType] = useState(data.queryType || 'read');
     const [resultVar, setResultVar] = useState(data.resultVar || 'dbData');
+    const [connectionId, setConnectionId] = useState(data.connectionId || '');
+    const [savedConnection, setSavedConnection] = useState<string | null>(null);
     const [expanded, setExpanded] = useState(false);
 
     useEffect(() => {
         data.query = query;
         data.queryType = queryType;
         data.resultVar = resultVar;
-    }, [query, queryType, resultVar, data]);
+        data.connectionId = connectionId || undefined;
+    }, [query, queryType, resultVar, connectionId, data]);
+
+    useEffect(() => {
+        if (!expanded) return;
+        api.get('/db/config')
+            .then((res) => setSavedConnection(res.data.id || null))
+            .catch(() => setSavedConnection(null));
+    }, [expanded]);
 
     return (
         <div
@@ -54,7 +65,22 @@ export function DatabaseNode({ data }: { id: string, data: any }) {
                                 className="nodrag bg-slate-800 border border-slate-700 rounded px-2 py-1.5 text-xs text-white w-full focus:outline-none focus:border-amber-500"
                             >
                                 <option value="read">Read (SELECT)</option>
+                                <option value="stream">Stream (SELECT, row by row for loops)</option>
                                 <option value="write">Write (INSERT, UPDATE, DELETE)</option>
+                                <option value="batch">Batch Write (bulk, commits at end)</option>
+                            </select>
+                        </div>
+                        <div className="flex-1">
+                            <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Database</label>
+                            <select
+                                value={connectionId}
+                                onChange={(e) => setConnectionId(e.target.value)}
+                                className="nodrag bg-slate-800 border border-slate-700 rounded px-2 py-1.5 text-xs text-white w-full focus:outline-none focus:border-amber-500"
+                            >
+                                <option value="">Platform</option>
+                                {(savedConnection || connectionId) && (
+                                    <option value={savedConnection || connectionId}>My Database</option>
+                                )}
                             </select>
                         </div>
                     </div>
@@ -0,0 +1,87 @@
+import { Handle, Position } from '@xyflow/react';
+import { Sigma, GripHorizontal, Maximize2, Minimize2 } from 'lucide-react';
+import { useState, useEffect } from 'react';
+
+export function ExpressionNode({ data }: { id: string, data: any }) {
+
+    const [expression, setExpression] = useState(data.expression || '');
+    const [resultVar, setResultVar] = useState(data.resultVar || 'result');
+
+    useEffect(() => {
+        data.expression = expression;
+        data.resultVar = resultVar;
+    }, [expression, resultVar, data]);
+
+    const [expanded, setExpanded] = useState(false);
+
+    return (
+        <div
+            onDoubleClick={() => setExpanded(!expanded)}
+            className={`bg-slate-900 border-2 border-slate-700 hover:border-blue-500 rounded-xl shadow-xl transition-all group ${expanded ? 'min-w-[320px]' : 'min-w-[200px]'}`}
+        >
+
+            <Handle type="target" position={Position.Top} className="!bg-blue-500 !w-3 !h-3 !border-2 !border-slate-900 !top-[-6px]" />
+
+            {/* Header */}
+            <div className="bg-slate-950 p-3 rounded-t-xl border-b border-slate-800 flex items-center justify-between">
+                <div className="flex items-center gap-2">
+                    <div className="p-1.5 bg-blue-500/20 text-blue-400 rounded-lg">
+                        <Sigma className="w-4 h-4" />
+                    </div>
+                    <span className="font-semibold text-white text-sm">Expression</span>
+                </div>
+                <div className="flex items-center gap-1">
+                    <button
+                        onClick={() => setExpanded(!expanded)}
+                        className="text-slate-500 hover:text-white transition-colors p-1"
+                    >
+                        {expanded ? <Minimize2 className="w-4 h-4" /> : <Maximize2 className="w-4 h-4" />}
+                    </button>
+                    <GripHorizontal className="text-slate-600 w-4 h-4" />
+                </div>
+            </div>
+
+            {expanded ? (
+                <div className="p-4 space-y-4">
+
+                    <div>
+                        <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Formula</label>
+                        <textarea
+                            value={expression}
+                            onChange={(e) => setExpression(e.target.value)}
+                            className="nodrag w-full h-20 bg-slate-950 border border-slate-800 rounded p-2 text-xs font-mono text-blue-200 focus:outline-none focus:border-blue-500 resize-y"
+                            placeholder="body.price * body.qty * (1 - discount)"
+                            spellCheck={false}
+                        />
+                        <p className="text-[10px] text-slate-500 mt-1">Variables by name; functions: round, min, max, abs, len, sum, upper, lower, trim.</p>
+                    </div>
+
+                    <div className="pt-2 border-t border-slate-800">
+                        <label className="text-[10px] font-semibold text-slate-500 mb-1 block uppercase">Store Result In</label>
+                        <div className="flex items-center gap-2 bg-slate-950 border border-slate-800 rounded px-2">
+                            <span className="text-slate-500 text-xs">var</span>
+                            <input
+                                type="text"
+                                value={resultVar}
+                                onChange={(e) => setResultVar(e.target.value)}
+                                className="nodrag flex-1 bg-transparent py-1.5 text-xs text-green-400 font-bold focus:outline-none placeholder:text-slate-700"
+                                placeholder="result"
+                            />
+                        </div>
+                    </div>
+
+                </div>
+            ) : (
+                <div className="p-3">
+                    <div className="text-xs font-mono text-slate-400 bg-slate-950 p-2 rounded truncate border border-slate-800 pointer-events-none">
+                        {expression || 'No formula'}
+                    </div>
+                </div>
+            )}
+
+            <Handle type="source" position={Position.Bottom} className="!bg-blue-500 !w-3 !h-3 !border-2 !border-slate-900 !bottom-[-6px]" />
+            <Handle type="source" position={Position.Right} className="!bg-blue-500 !w-3 !h-3 !border-2 !border-slate-900 !right-[-6px]" />
+
+        </div>
+    );
+}
@@ -17,6 +17,7 @@ export const FunctionStartNode = memo(({ data, isConnectable }: NodeProps) => {
         (data.parameters as Parameter[]) || []
     );
     const [newParamName, setNewParamName] = useState('');
+    const [pure, setPure] = useState<boolean>(Boolean(data.pure));
 
     const handleNameChange = useCallback((e: React.ChangeEvent<HTMLInputElement>) => {
         const value = e.target.value;
@@ -24,6 +25,11 @@ export const FunctionStartNode = memo(({ data, isConnectable }: NodeProps) => {
         data.functionName = value; // Persist to node data
     }, [data]);
 
+    const handlePureChange = useCallback((e: React.ChangeEvent<HTMLInputElement>) => {
+        setPure(e.target.checked);
+        data.pure = e.target.checked; // Results are cached per argument set
+    }, [data]);
+
     const addParameter = useCallback(() => {
         if (!newParamName.trim()) return;
         const newParams = [...params, { name: newParamName.trim(), type: 'any', required: true }];
@@ -66,6 +72,16 @@ export const FunctionStartNode = memo(({ data, isConnectable }: NodeProps) => {
                     />
                 </div>
 
+                <label className="flex items-center gap-2 text-xs text-slate-600 dark:text-slate-400">
+                    <input
+                        type="checkbox"
+                        className="accent-green-500"
+                        checked={pure}
+                        onChange={handlePureChange}
+                    />
+                    Pure (cache results by arguments)
+                </label>
+
                 <div>
                     <label className="text-xs font-medium text-slate-500 dark:text-slate-400 mb-2 block">
                         Parameters (Inputs)
@@ -0,0 +1,182 @@
+import { Handle, Position, useReactFlow } from '@xyflow/react';
+import { Layers, Trash2, Play, Maximize2, Minimize2 } from 'lucide-react';
+import { useState } from 'react';
+import { SuggestionInput } from '../ui/SuggestionInput';
+
+export function MapNode({ id, data }: { id: string, data: any }) {
+    const { deleteElements } = useReactFlow();
+    const [collection, setCollection] = useState(data.collection || '');
+    const [variable, setVariable] = useState(data.variable || '');
+    const [concurrency, setConcurrency] = useState(data.concurrency || 8);
+    const [outputVar, setOutputVar] = useState(data.outputVar || '');
+    const [resultVar, setResultVar] = useState(data.resultVar || 'results');
+
+    const handleDelete = () => {
+        deleteElements({ nodes: [{ id }] });
+    };
+
+    const [expanded, setExpanded] = useState(false);
+
+    return (
+        <div
+            onDoubleClick={() => setExpanded(!expanded)}
+            className={`bg-slate-900 border-2 border-slate-700 hover:border-purple-500 rounded-xl shadow-xl transition-all group relative ${expanded ? 'pb-8 pr-4 min-w-[280px]' : 'min-w-[200px]'}`}
+        >
+
+            {/* Input Handle */}
+            <Handle
+                type="target"
+                position={Position.Top}
+                className="!bg-purple-500 !w-3 !h-3 !border-2 !border-slate-900"
+            />
+
+            {/* Header */}
+            <div className="bg-slate-950 p-3 rounded-t-xl border-b border-slate-800 flex items-center justify-between">
+                <div className="flex items-center gap-2">
+                    <div className="p-1.5 rounded-lg bg-purple-500/20 text-purple-400">
+                        <Layers className="w-4 h-4" />
+                    </div>
+                    <div>
+                        <span className="font-semibold text-white text-sm block leading-none">Map</span>
+                        <span className="text-[10px] text-slate-500 font-medium">Parallel Over Collection</span>
+                    </div>
+                </div>
+                <div className="flex items-center gap-1">
+                    <button
+                        onClick={() => setExpanded(!expanded)}
+                        className="text-slate-500 hover:text-white transition-colors p-1"
+                    >
+                        {expanded ? <Minimize2 className="w-4 h-4" /> : <Maximize2 className="w-4 h-4" />}
+                    </button>
+                    <button
+                        onClick={handleDelete}
+                        className="text-slate-500 hover:text-red-400 transition-colors p-1 rounded-md hover:bg-slate-800"
+                    >
+                        <Trash2 className="w-4 h-4" />
+                    </button>
+                </div>
+            </div>
+
+            {expanded && (
+                <>
+                    {/* Body */}
+                    <div className="p-4 flex flex-col gap-4">
+
+                        {/* Collection Input */}
+                        <div>
+                            <label className="text-[10px] uppercase font-bold text-slate-500 mb-1 block">Collection (Array)</label>
+                            <SuggestionInput
+                                nodeId={id}
+                                value={collection}
+                                onValueChange={(val) => {
+                                    setCollection(val);
+                                    data.collection = val;
+                                }}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-purple-500 font-mono transition-colors"
+                                placeholder="e.g. body.items"
+                            />
+                        </div>
+
+                        {/* Variable Name Input */}
+                        <div>
+                            <label className="text-[10px] uppercase font-bold text-slate-500 mb-1 block">Item Variable Name</label>
+                            <input
+                                type="text"
+                                value={variable}
+                                onChange={(e) => {
+                                    setVariable(e.target.value);
+                                    data.variable = e.target.value;
+                                }}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-purple-500 font-mono transition-colors"
+                                placeholder="e.g. item"
+                            />
+                        </div>
+
+                        <div className="flex gap-2">
+                            <div className="flex-1">
+                                <label className="text-[10px] uppercase font-bold text-slate-500 mb-1 block">Concurrency</label>
+                                <input
+                                    type="number"
+                                    min={1}
+                                    value={concurrency}
+                                    onChange={(e) => {
+                                        const value = Math.max(1, parseInt(e.target.value) || 1);
+                                        setConcurrency(value);
+                                        data.concurrency = value;
+                                    }}
+                                    className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-purple-500 font-mono transition-colors"
+                                />
+                            </div>
+                            <div className="flex-1">
+                                <label className="text-[10px] uppercase font-bold text-slate-500 mb-1 block">Item Result</label>
+                                <input
+                                    type="text"
+                                    value={outputVar}
+                                    onChange={(e) => {
+                                        setOutputVar(e.target.value);
+                                        data.outputVar = e.target.value;
+                                    }}
+                                    className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-purple-500 font-mono transition-colors"
+                                    placeholder="all writes"
+                                />
+                            </div>
+                        </div>
+
+                        <div>
+                            <label className="text-[10px] uppercase font-bold text-slate-500 mb-1 block">Collect Results In</label>
+                            <input
+                                type="text"
+                                value={resultVar}
+                                onChange={(e) => {
+                                    setResultVar(e.target.value);
+                                    data.resultVar = e.target.value;
+                                }}
+                                className="nodrag w-full bg-slate-950 border border-slate-800 rounded px-2 py-1.5 text-xs text-white focus:outline-none focus:border-purple-500 font-mono transition-colors"
+                                placeholder="results"
+                            />
+                        </div>
+                    </div>
+
+                    {/* Footer / Status */}
+                    <div className="bg-slate-950/50 p-2 rounded-b-xl border-t border-slate-800 flex items-center justify-between">
+                        <span className="text-[10px] text-slate-500 uppercase font-bold tracking-wider">Items</span>
+                        <span className="text-[10px] font-mono text-purple-400">Up to {concurrency} at once</span>
+                    </div>
+                </>
+            )}
+
+
+            {/* 'Do' Handle (Right) */}
+            <div className={`absolute right-0 top-1/2 -translate-y-1/2 translate-x-1/2 flex items-center ${!expanded && 'translate-x-[4px]'}`}>
+                {expanded && (
+                    <div className="absolute right-4 flex items-center gap-1 pointer-events-none">
+                        <span className="text-[10px] uppercase font-bold text-purple-300 bg-slate-950/80 px-1 rounded shadow-sm">Each</span>
+                        <Play className="w-3 h-3 text-purple-400 fill-current" />
+                    </div>
+                )}
+                <Handle
+                    type="source"
+                    position={Position.Right}
+                    id="do"
+                    className="!bg-purple-500 !w-3 !h-3 !border-2 !border-slate-900"
+                />
+            </div>
+
+            {/* 'Done' Handle (Bottom) */}
+            <div className={`absolute bottom-0 left-1/2 -translate-x-1/2 translate-y-1/2 flex flex-col items-center ${!expanded && 'translate-y-[4px]'}`}>
+                <Handle
+                    type="source"
+                    position={Position.Bottom}
+                    id="done"
+                    className="!bg-slate-500 !w-3 !h-3 !border-2 !border-slate-900"
+                />
+                {expanded && (
+                    <div className="absolute top-4 flex items-center gap-1 pointer-events-none whitespace-nowrap">
+                        <span className="text-[10px] uppercase font-bold text-slate-500 bg-slate-950/80 px-1 rounded shadow-sm">Done</span>
+                    </div>
+                )}
+            </div>
+
+        </div>
+    );
+}
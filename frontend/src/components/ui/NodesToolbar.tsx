@@ -1,8 +1,8 @@
 import { useState } from 'react';
-import { Server, Code2, GitFork, Plus, Database, Braces, Send, FileJson, Repeat, Calculator, BarChart, ChevronDown, ChevronUp, FileCode, FileText, Play, CornerDownLeft } from 'lucide-react';
+import { Server, Code2, GitFork, Plus, Database, Braces, Send, FileJson, Repeat, Layers, Calculator, Sigma, BarChart, ChevronDown, ChevronUp, FileCode, FileText, Play, CornerDownLeft } from 'lucide-react';
 import { cn } from '../../lib/utils';
 
-type NodeType = 'api' | 'function' | 'logic' | 'variable' | 'response' | 'interface' | 'loop' | 'math' | 'data_op' | 'database' | 'code' | 'file' | 'subworkflow' | 'function_start' | 'function_return';
+type NodeType = 'api' | 'function' | 'logic' | 'variable' | 'response' | 'interface' | 'loop' | 'map' | 'math' | 'expression' | 'data_op' | 'database' | 'code' | 'file' | 'subworkflow' | 'function_start' | 'function_return';
 
 interface NodesToolbarProps {
     onAddNode: (type: NodeType) => void;
@@ -27,9 +27,11 @@ export function NodesToolbar({ onAddNode, category = 'route' }: NodesToolbarProp
 
         // Logic nodes (for functions)
         { type: 'loop', label: 'Iterator', icon: Repeat, color: 'text-purple-600 dark:text-purple-400', bg: 'bg-purple-100 dark:bg-purple-500/10', border: 'hover:border-purple-500/50' },
+        { type: 'map', label: 'Parallel Map', icon: Layers, color: 'text-purple-600 dark:text-purple-400', bg: 'bg-purple-100 dark:bg-purple-500/10', border: 'hover:border-purple-500/50' },
         { type: 'function', label: 'Logic Block', icon: Code2, color: 'text-pink-600 dark:text-pink-400', bg: 'bg-pink-100 dark:bg-pink-500/10', border: 'hover:border-pink-500/50' },
         { type: 'logic', label: 'Condition', icon: GitFork, color: 'text-yellow-600 dark:text-yellow-400', bg: 'bg-yellow-100 dark:bg-yellow-500/10', border: 'hover:border-yellow-500/50' },
         { type: 'math', label: 'Math / Op', icon: Calculator, color: 'text-blue-600 dark:text-blue-400', bg: 'bg-blue-100 dark:bg-blue-500/10', border: 'hover:border-blue-500/50' },
+        { type: 'expression', label: 'Expression', icon: Sigma, color: 'text-blue-600 dark:text-blue-400', bg: 'bg-blue-100 dark:bg-blue-500/10', border: 'hover:border-blue-500/50' },
         { type: 'data_op', label: 'Data / Stats', icon: BarChart, color: 'text-teal-600 dark:text-teal-400', bg: 'bg-teal-100 dark:bg-teal-500/10', border: 'hover:border-teal-500/50' },
         { type: 'variable', label: 'Variable', icon: Database, color: 'text-cyan-600 dark:text-cyan-400', bg: 'bg-cyan-100 dark:bg-cyan-500/10', border: 'hover:border-cyan-500/50' },
         { type: 'database', label: 'Database', icon: Database, color: 'text-amber-600 dark:text-amber-500', bg: 'bg-amber-100 dark:bg-amber-500/10', border: 'hover:border-amber-500/50' },
@@ -43,7 +45,7 @@ export function NodesToolbar({ onAddNode, category = 'route' }: NodesToolbarProp
             return ['api', 'subworkflow', 'response', 'logic'].includes(node.type);
         } else if (category === 'function') {
             // Functions: Start, Return + all logic nodes (no API, no subworkflow, no interface)
-            return ['function_start', 'function_return', 'loop', 'function', 'logic', 'math', 'data_op', 'variable', 'database', 'code', 'file'].includes(node.type);
+            return ['function_start', 'function_return', 'loop', 'map', 'function', 'logic', 'math', 'expression', 'data_op', 'variable', 'database', 'code', 'file'].includes(node.type);
         } else if (category === 'interface') {
             return ['interface'].includes(node.type);
         }
@@ -83,6 +83,10 @@ export function useAvailableVariables(currentNodeId: string) {
                     vars.push({ name: parent.data.resultVar as string, type: 'number', nodeType: 'Math' });
                 }
 
+                if (parent.type === 'expression' && parent.data?.resultVar) {
+                    vars.push({ name: parent.data.resultVar as string, type: 'any', nodeType: 'Expression' });
+                }
+
                 if (parent.type === 'data_op' && parent.data?.resultVar) {
                     vars.push({ name: parent.data.resultVar as string, type: 'number', nodeType: 'Data Op' });
                 }
@@ -91,6 +95,10 @@ export function useAvailableVariables(currentNodeId: string) {
                     vars.push({ name: parent.data.variable as string, type: 'any', nodeType: 'Loop Item' });
                 }
 
+                if (parent.type === 'map' && parent.data?.variable) {
+                    vars.push({ name: parent.data.variable as string, type: 'any', nodeType: 'Map Item' });
+                }
+
                 if (parent.type === 'interface' && parent.data?.fields) {
                     const prefix = (parent.data.transferMode as string) || 'body'; // default source is body like body.field
                     const fields = getInterfaceFields(parent.data.fields as any[]);
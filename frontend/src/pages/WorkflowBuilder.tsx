@@ -11,7 +11,9 @@ import { VariableNode } from '../components/nodes/VariableNode';
 import { ResponseNode } from '../components/nodes/ResponseNode';
 import { InterfaceNode } from '../components/nodes/InterfaceNode';
 import { LoopNode } from '../components/nodes/LoopNode';
+import { MapNode } from '../components/nodes/MapNode';
 import { MathNode } from '../components/nodes/MathNode';
+import { ExpressionNode } from '../components/nodes/ExpressionNode';
 import { DataNode } from '../components/nodes/DataNode';
 import { DatabaseNode } from '../components/nodes/DatabaseNode';
 import { CodeNode } from '../components/nodes/CodeNode';
@@ -54,7 +56,9 @@ function Flow() {
     response: ResponseNode,
     interface: InterfaceNode,
     loop: LoopNode,
+    map: MapNode,
     math: MathNode,
+    expression: ExpressionNode,
     data_op: DataNode,
     database: DatabaseNode,
     code: CodeNode,